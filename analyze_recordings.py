@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import sys
+
+from src.config import OFFLINE_WORK_DIR, OFFLINE_CHUNK_SECONDS, OFFLINE_FRAME_STRIDE, OFFLINE_WORKERS
+from src.core.offline_analysis import Recording, run_chunks, score_recording
+
+
+def print_summary(report):
+    print(f"\n{report['camera_id']}: {report['duration_s'] / 60:.1f} min, "
+          f"{report['frames_analyzed']} frames analyzed (every {report['stride']})")
+    if report["missing_chunks"]:
+        print(f"  WARNING: chunks {report['missing_chunks']} failed; their frames are not scored")
+    chunk_local = sum(1 for s in report["students"].values() if s["chunk_local"])
+    if chunk_local:
+        print(f"  {chunk_local} unenrolled track(s) are listed per chunk; they can't be joined across chunks")
+    print(f"  {'student':<24} {'peak':>6} {'at':>9}  {'transitions':>11}  time per risk level")
+    for student_id, s in report["students"].items():
+        levels = ", ".join(f"{level} {seconds:.0f}s" for level, seconds in s["seconds_by_level"].items())
+        print(f"  {student_id:<24} {s['peak_score']:>6.2f} {s['peak_at']:>8.0f}s  {len(s['transitions']):>11}  {levels}")
+
+
+def analyze_recordings():
+    parser = argparse.ArgumentParser(
+        description="Re-analyze recorded exam videos on all CPU cores and write per-student timelines."
+    )
+    parser.add_argument("videos", nargs="+", help="Video files; each one is scored as its own camera")
+    parser.add_argument("--output", default=None,
+                        help="Report path (default: report.json in each video's work directory)")
+    parser.add_argument("--session", default=None, help="Exam session id whose roster restricts face matching")
+    parser.add_argument("--stride", type=int, default=OFFLINE_FRAME_STRIDE,
+                        help="Analyze every Nth frame (0 = sample at FPS_TARGET)")
+    parser.add_argument("--chunk-seconds", type=float, default=OFFLINE_CHUNK_SECONDS,
+                        help="Video length per worker job")
+    parser.add_argument("--workers", type=int, default=OFFLINE_WORKERS, help="Worker processes (0 = CPU count)")
+    parser.add_argument("--start-time", type=float, default=0.0,
+                        help="Epoch seconds of the first frame (timestamps in the report stay video offsets)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Use the live adaptive scheduler (skips unchanged stages; faster, less thorough)")
+    parser.add_argument("--work-dir", default=OFFLINE_WORK_DIR, help="Where chunk results are kept for resuming")
+    parser.add_argument("--restart", action="store_true", help="Discard chunk results of an earlier run")
+    args = parser.parse_args()
+
+    recordings = []
+    for path in args.videos:
+        try:
+            recordings.append(Recording(path, session_id=args.session, stride=args.stride,
+                                        chunk_seconds=args.chunk_seconds, start_time=args.start_time,
+                                        work_dir=args.work_dir))
+        except ValueError as e:
+            print(f"Skipping {path}: {e}")
+    if not recordings:
+        return 1
+    for rec in recordings:
+        rec.prepare(restart=args.restart)
+        print(f"{rec.camera_id}: {rec.duration / 60:.1f} min at {rec.fps:.1f} fps, every {rec.stride} frame(s), "
+              f"{len(rec.chunks)} chunks -> {rec.dir}")
+
+    try:
+        run_chunks(recordings, workers=args.workers, adaptive=args.adaptive)
+    except KeyboardInterrupt:
+        print("\nInterrupted; run the same command again to resume.")
+        return 130
+
+    reports = []
+    for rec in recordings:
+        report = score_recording(rec).to_dict()
+        reports.append(report)
+        if args.output is None:
+            with open(os.path.join(rec.dir, "report.json"), "w") as f:
+                json.dump(report, f, indent=2)
+        print_summary(report)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"recordings": reports}, f, indent=2)
+    print(f"\nReport written to {args.output or ', '.join(os.path.join(r.dir, 'report.json') for r in recordings)}")
+    return 1 if any(r["missing_chunks"] for r in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(analyze_recordings())
@@ -0,0 +1,131 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# Allow running from the repository root without setting PYTHONPATH
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from src.config import DETECTOR_INPUT_SIZE
+from src.core.detection.object_detector import ObjectDetector
+
+PARITY_IOU = 0.5
+
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match(reference, candidate):
+    """Greedy same-label matching; returns (matched, max confidence delta)."""
+    used = set()
+    matched = 0
+    conf_delta = 0.0
+    for ref in sorted(reference, key=lambda d: -d["confidence"]):
+        best, best_iou = None, PARITY_IOU
+        for i, det in enumerate(candidate):
+            if i in used or det["label"] != ref["label"]:
+                continue
+            iou = box_iou(ref["bbox"], det["bbox"])
+            if iou >= best_iou:
+                best, best_iou = i, iou
+        if best is not None:
+            used.add(best)
+            matched += 1
+            conf_delta = max(conf_delta, abs(ref["confidence"] - candidate[best]["confidence"]))
+    return matched, conf_delta
+
+
+def load_frames(path, count, seed):
+    if path:
+        files = sorted(glob.glob(os.path.join(path, "*.jpg")) + glob.glob(os.path.join(path, "*.png")))
+        frames = [cv2.imread(f) for f in files[:count]]
+        return [f for f in frames if f is not None]
+    # Without real images only latency is meaningful (there is nothing to detect)
+    from benchmark_pipeline import synthetic_hall_frame
+    rng = np.random.default_rng(seed)
+    return [synthetic_hall_frame(1280, 720, 30, rng) for _ in range(count)]
+
+
+def run_backend(name, model_path, input_size, frames, repeats):
+    started = time.perf_counter()
+    detector = ObjectDetector(model_path=model_path, backend=name, input_size=input_size)
+    load_s = time.perf_counter() - started
+    detector.detect_prohibited_items(frames[0])  # warm-up
+
+    outputs = []
+    latencies = []
+    for _ in range(repeats):
+        for frame in frames:
+            t0 = time.perf_counter()
+            detections = detector.detect_prohibited_items(frame)
+            latencies.append(time.perf_counter() - t0)
+            if len(outputs) < len(frames):
+                outputs.append(detections)
+    ms = np.asarray(latencies) * 1000.0
+    return outputs, {
+        "load_s": load_s,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parity and latency of the detector backends against the PyTorch path.")
+    parser.add_argument("--images", help="Directory of .jpg/.png frames (synthetic halls if omitted)")
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", nargs="+", default=["onnx"], help="Candidates compared to ultralytics")
+    parser.add_argument("--onnx-model", help="Model file for the candidates (default ONNX_MODEL_PATH)")
+    parser.add_argument("--input-size", type=int, default=DETECTOR_INPUT_SIZE)
+    parser.add_argument("--min-recall", type=float, default=0.95, help="Required share of reference detections matched")
+    parser.add_argument("--output", default="detector_bench.json")
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.frames, args.seed)
+    if not frames:
+        parser.error("no frames to benchmark")
+
+    reference, ref_stats = run_backend("ultralytics", None, args.input_size, frames, args.repeats)
+    report = {"input_size": args.input_size, "frames": len(frames), "ultralytics": ref_stats}
+    failed = False
+    for name in args.backends:
+        outputs, stats = run_backend(name, args.onnx_model, args.input_size, frames, args.repeats)
+        total_ref = sum(len(d) for d in reference)
+        total_new = sum(len(d) for d in outputs)
+        matched, conf_delta = 0, 0.0
+        for ref, new in zip(reference, outputs):
+            m, delta = match(ref, new)
+            matched += m
+            conf_delta = max(conf_delta, delta)
+        recall = matched / total_ref if total_ref else 1.0
+        stats.update({
+            "reference_detections": total_ref,
+            "detections": total_new,
+            "recall_vs_reference": recall,
+            "precision_vs_reference": matched / total_new if total_new else 1.0,
+            "max_confidence_delta": conf_delta,
+            "speedup_p50": ref_stats["p50_ms"] / stats["p50_ms"] if stats["p50_ms"] else None,
+        })
+        report[name] = stats
+        if recall < args.min_recall:
+            failed = True
+            print(f"PARITY FAIL {name}: recall {recall:.3f} < {args.min_recall}")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failed else 0)
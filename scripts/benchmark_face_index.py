@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Allow running from the repository root without setting PYTHONPATH
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from src.core.face.embedding_index import EmbeddingIndex, EMBEDDING_DIM
+
+try:
+    import face_recognition
+    FACE_REC_AVAILABLE = True
+except ImportError:
+    FACE_REC_AVAILABLE = False
+
+
+def _face_distance(known_encodings, face_encoding):
+    # Same computation as face_recognition.face_distance (list -> array each call)
+    if len(known_encodings) == 0:
+        return np.empty((0,))
+    return np.linalg.norm(np.array(known_encodings) - face_encoding, axis=1)
+
+
+def legacy_match(known_encodings, known_names, face_encodings, tolerance=0.6):
+    """The original per-face compare_faces + face_distance path."""
+    distance_fn = face_recognition.face_distance if FACE_REC_AVAILABLE else _face_distance
+    names = []
+    for face_encoding in face_encodings:
+        matches = list(distance_fn(known_encodings, face_encoding) <= tolerance)
+        name = "Unknown"
+        face_distances = distance_fn(known_encodings, face_encoding)
+        if len(face_distances) > 0:
+            best_match_index = np.argmin(face_distances)
+            if matches[best_match_index]:
+                name = known_names[best_match_index]
+        names.append(name)
+    return names
+
+
+def _time(fn, repeats):
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(samples))
+
+
+def run(sizes, faces_per_frame, repeats, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for size in sizes:
+        known = rng.normal(0, 0.1, (size, EMBEDDING_DIM))
+        names = [f"student_{i}" for i in range(size)]
+        # Queries: noisy copies of enrolled students
+        picks = rng.integers(0, size, faces_per_frame)
+        queries = known[picks] + rng.normal(0, 0.01, (faces_per_frame, EMBEDDING_DIM))
+
+        known_list = list(known)
+        index = EmbeddingIndex()
+        index.load(names, known)
+
+        legacy_names = legacy_match(known_list, names, list(queries))
+        index_names, _ = index.match(queries)
+        agree = sum(a == b for a, b in zip(legacy_names, index_names)) / faces_per_frame
+
+        legacy_ms = _time(lambda: legacy_match(known_list, names, list(queries)), repeats)
+        index_ms = _time(lambda: index.match(queries), repeats)
+        rows.append({
+            "enrolled": size,
+            "faces_per_frame": faces_per_frame,
+            "legacy_ms": legacy_ms,
+            "index_ms": index_ms,
+            "speedup": legacy_ms / index_ms if index_ms > 0 else float("inf"),
+            "agreement": agree,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare face matching paths per frame.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--faces", type=int, default=40, help="Faces per frame")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.faces, args.repeats)
+    print(f"{'enrolled':>9} {'legacy ms':>10} {'index ms':>9} {'speedup':>8} {'agree':>6}")
+    for r in results:
+        print(f"{r['enrolled']:>9} {r['legacy_ms']:>10.2f} {r['index_ms']:>9.2f} "
+              f"{r['speedup']:>7.1f}x {r['agreement']:>6.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
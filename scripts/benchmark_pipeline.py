@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Allow running from the repository root without setting PYTHONPATH
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from src.config import MAX_STUDENTS_PER_CAMERA, TRACKING_ENABLED
+
+# Runs in a fresh interpreter so imports and model loads are really cold
+COLD_START_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+import numpy as np
+timings = {}
+t = time.perf_counter()
+import src.api.main
+timings["api_import_s"] = time.perf_counter() - t
+from src.core.face.face_manager import FaceManager
+from src.core.detection.object_detector import ObjectDetector
+from src.core.pose.behavior_analyzer import BehaviorAnalyzer
+from src.core.frame_pipeline import FramePipeline
+t = time.perf_counter(); face_mgr = FaceManager(); face_mgr.load_models(); timings["face_load_s"] = time.perf_counter() - t
+t = time.perf_counter(); detector = ObjectDetector(); timings["detector_load_s"] = time.perf_counter() - t
+t = time.perf_counter(); analyzer = BehaviorAnalyzer(); timings["pose_load_s"] = time.perf_counter() - t
+t = time.perf_counter()
+FramePipeline(face_mgr, detector, analyzer).observe(np.zeros((480, 640, 3), dtype=np.uint8))
+timings["first_frame_s"] = time.perf_counter() - t
+print(json.dumps(timings))
+"""
+
+STAGES = ["decode", "motion", "face", "detection", "pose", "association", "scoring"]
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024.0 * 1024.0)
+    except ImportError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def percentiles(samples_s):
+    if not samples_s:
+        return {"count": 0}
+    ms = np.asarray(samples_s) * 1000.0
+    return {
+        "count": int(len(ms)),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def synthetic_hall_frame(width, height, students, rng, phone_ratio=0.1):
+    """Draw a classroom-like grid of seated students (head, torso, desk)."""
+    frame = np.full((height, width, 3), (70, 80, 90), dtype=np.uint8)
+    cols = int(np.ceil(np.sqrt(students * width / height)))
+    rows = int(np.ceil(students / cols))
+    cell_w, cell_h = width / cols, height / rows
+    for i in range(students):
+        r, c = divmod(i, cols)
+        cx = int((c + 0.5) * cell_w + rng.integers(-3, 4))
+        cy = int((r + 0.35) * cell_h)
+        head = max(3, int(min(cell_w, cell_h) * 0.12))
+        skin = tuple(int(v) for v in rng.integers([90, 120, 160], [140, 170, 220]))
+        shirt = tuple(int(v) for v in rng.integers(20, 230, 3))
+        cv2.rectangle(frame, (cx - 2 * head, cy + head), (cx + 2 * head, cy + 4 * head), shirt, -1)
+        cv2.ellipse(frame, (cx, cy), (head, int(head * 1.3)), 0, 0, 360, skin, -1)
+        cv2.circle(frame, (cx - head // 3, cy - head // 4), max(1, head // 6), (30, 30, 30), -1)
+        cv2.circle(frame, (cx + head // 3, cy - head // 4), max(1, head // 6), (30, 30, 30), -1)
+        cv2.rectangle(frame, (cx - 3 * head, cy + 4 * head), (cx + 3 * head, cy + 5 * head), (40, 60, 100), -1)
+        if rng.random() < phone_ratio:
+            cv2.rectangle(frame, (cx + head, cy + 3 * head), (cx + 2 * head, cy + 4 * head + head // 2), (15, 15, 15), -1)
+    noise = rng.normal(0, 4, frame.shape)
+    return np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+
+def build_workload(args):
+    rng = np.random.default_rng(args.seed)
+    workload = {}
+    for cam in range(args.cameras):
+        frames = []
+        for _ in range(args.variants):
+            frame = synthetic_hall_frame(args.width, args.height, args.students, rng)
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, args.jpeg_quality])
+            frames.append(encoded.tobytes())
+        workload[f"bench_cam_{cam:02d}"] = frames
+    return workload
+
+
+def run_in_process(args, workload):
+    from src.core.face.face_manager import FaceManager
+    from src.core.face.identity_tracker import IdentityTracker
+    from src.core.detection.object_detector import ObjectDetector
+    from src.core.pose.behavior_analyzer import BehaviorAnalyzer
+    from src.core.malpractice_engine import MalpracticeEngine
+    from src.core.frame_pipeline import FramePipeline
+    from src.core.adaptive_scheduler import AdaptiveScheduler
+    from src.core.frame_context import FrameContext
+
+    rss_start = current_rss_mb()
+    started = time.perf_counter()
+    tracker = IdentityTracker() if TRACKING_ENABLED else None
+    scheduler = AdaptiveScheduler() if args.adaptive else None
+    pipeline = FramePipeline(FaceManager(tracker=tracker), ObjectDetector(), BehaviorAnalyzer(), scheduler=scheduler)
+    engine = MalpracticeEngine()
+    startup_s = time.perf_counter() - started
+
+    samples = {stage: [] for stage in STAGES}
+    rss_peak = {stage: 0.0 for stage in STAGES}
+    end_to_end = []
+    skipped = {}
+    seats = {cam: [f"{cam}_seat_{i}" for i in range(args.students)] for cam in workload}
+    no_dets = [[] for _ in range(args.students)]
+
+    def record(stage, seconds):
+        samples[stage].append(seconds)
+        rss_peak[stage] = max(rss_peak[stage], current_rss_mb())
+
+    # Warm-up so lazy initialisation doesn't count against the first frame
+    warm = FrameContext.from_jpeg(next(iter(workload.values()))[0])
+    t0 = time.perf_counter()
+    pipeline.observe(warm)
+    first_frame_s = time.perf_counter() - t0
+
+    bench_started = time.perf_counter()
+    for frame_idx in range(args.frames):
+        for cam, frames in workload.items():
+            t0 = time.perf_counter()
+            frame = FrameContext.from_jpeg(frames[frame_idx % len(frames)])
+            record("decode", time.perf_counter() - t0)
+
+            observations = pipeline.observe(frame, camera_id=cam)
+            for stage, seconds in observations["timings"].items():
+                record(stage, seconds)
+            for stage in observations.get("skipped", ()):
+                skipped[stage] = skipped.get(stage, 0) + 1
+
+            # Scoring covers every seat of the synthetic hall
+            t1 = time.perf_counter()
+            engine.score_batch(seats[cam], no_dets, ["Center"] * args.students, [0.0] * args.students)
+            record("scoring", time.perf_counter() - t1)
+            end_to_end.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - bench_started
+
+    return {
+        "startup_s": startup_s,
+        "first_frame_s": first_frame_s,
+        "frames": len(end_to_end),
+        "frames_per_sec": len(end_to_end) / wall if wall > 0 else 0.0,
+        "end_to_end": percentiles(end_to_end),
+        "stages": {
+            stage: {**percentiles(samples[stage]), "rss_peak_mb": rss_peak[stage]}
+            for stage in STAGES if samples[stage]
+        },
+        "skipped_stages": skipped,
+        "rss_start_mb": rss_start,
+        "rss_end_mb": current_rss_mb(),
+    }
+
+
+def run_http(args, workload):
+    import requests
+
+    latencies = []
+    errors = []
+    dropped = [0]
+    lock = threading.Lock()
+
+    def camera_worker(cam, frames):
+        session = requests.Session()
+        interval = 1.0 / args.fps if args.fps else 0.0
+        for frame_idx in range(args.frames):
+            t0 = time.perf_counter()
+            try:
+                files = {"file": ("frame.jpg", frames[frame_idx % len(frames)], "image/jpeg")}
+                response = session.post(args.url, files=files, data={"camera_id": cam}, timeout=60)
+                response.raise_for_status()
+                result = response.json()
+                with lock:
+                    latencies.append(time.perf_counter() - t0)
+                    if result.get("dropped"):
+                        dropped[0] += 1
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+            if interval:
+                time.sleep(max(0.0, interval - (time.perf_counter() - t0)))
+
+    threads = [threading.Thread(target=camera_worker, args=item) for item in workload.items()]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    return {
+        "url": args.url,
+        "frames": len(latencies),
+        "frames_per_sec": len(latencies) / wall if wall > 0 else 0.0,
+        "dropped": dropped[0],
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "end_to_end": percentiles(latencies),
+    }
+
+
+def measure_cold_start(runs):
+    """Median import / model-load / first-frame times over `runs` fresh interpreters."""
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", COLD_START_SNIPPET, ROOT_DIR],
+            capture_output=True, text=True, check=True,
+        )
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {key: float(np.median([s[key] for s in samples])) for key in samples[0]} | {"runs": runs}
+
+
+def compare(report, baseline_path, tolerance):
+    """Return the list of p95 regressions beyond `tolerance` versus a baseline report."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for mode in ("in_process", "http"):
+        if mode not in report or mode not in baseline:
+            continue
+        pairs = [("end_to_end", report[mode]["end_to_end"], baseline[mode]["end_to_end"])]
+        for stage, stats in report[mode].get("stages", {}).items():
+            if stage in baseline[mode].get("stages", {}):
+                pairs.append((stage, stats, baseline[mode]["stages"][stage]))
+        for name, new, old in pairs:
+            if old.get("p95_ms") and new.get("p95_ms", 0) > old["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{mode}/{name}: p95 {old['p95_ms']:.1f} -> {new['p95_ms']:.1f} ms")
+    if "cold_start" in report and "cold_start" in baseline:
+        for key, old in baseline["cold_start"].items():
+            new = report["cold_start"].get(key)
+            if key.endswith("_s") and old and new is not None and new > old * (1 + tolerance):
+                regressions.append(f"cold_start/{key}: {old:.2f} -> {new:.2f} s")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark on synthetic exam halls.")
+    parser.add_argument("--mode", choices=["in_process", "http", "both"], default="in_process")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--cameras", type=int, default=2)
+    parser.add_argument("--frames", type=int, default=50, help="Frames per camera")
+    parser.add_argument("--variants", type=int, default=5, help="Distinct synthetic frames per camera")
+    parser.add_argument("--jpeg-quality", type=int, default=85)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Enable motion gating / per-stage rates (identical variants then mostly skip work)")
+    parser.add_argument("--url", default="http://localhost:8004/analyze_frame")
+    parser.add_argument("--fps", type=float, default=0.0, help="Per-camera send rate in HTTP mode (0 = as fast as possible)")
+    parser.add_argument("--cold-start", type=int, default=0, metavar="RUNS",
+                        help="Also measure import/model-load/first-frame time in RUNS fresh interpreters")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", help="Previous report to check for p95 regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    if not 1 <= args.students <= MAX_STUDENTS_PER_CAMERA:
+        parser.error(f"--students must be between 1 and {MAX_STUDENTS_PER_CAMERA}")
+
+    workload = build_workload(args)
+    report = {
+        "config": vars(args),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "timestamp": time.time(),
+    }
+    if args.mode in ("in_process", "both"):
+        report["in_process"] = run_in_process(args, workload)
+    if args.mode in ("http", "both"):
+        report["http"] = run_http(args, workload)
+    if args.cold_start:
+        report["cold_start"] = measure_cold_start(args.cold_start)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps({k: v for k, v in report.items() if k not in ("config", "environment")}, indent=2))
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(report, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
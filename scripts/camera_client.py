@@ -1,9 +1,84 @@
 import cv2
 import requests
 import json
+import struct
 import time
 
-def start_camera_client(camera_id="cam_local", api_url="http://localhost:8004/analyze_frame"):
+try:
+    import websocket  # websocket-client
+    WEBSOCKET_AVAILABLE = True
+except ImportError:
+    WEBSOCKET_AVAILABLE = False
+
+
+class FrameSender:
+    """Sends JPEG frames over one persistent WebSocket connection, falling back
+    to HTTP POSTs on a pooled keep-alive session.
+
+    In a cluster, a node that doesn't serve this camera answers with the
+    owner's URL and the sender switches to that node."""
+
+    MAX_REDIRECTS = 3
+
+    def __init__(self, camera_id, api_url, stream_url):
+        self.camera_id = camera_id
+        self.api_url = api_url
+        self.stream_url = f"{stream_url}/{camera_id}"
+        self.session = requests.Session()
+        self.ws = None
+        self._connect()
+
+    def _connect(self):
+        if WEBSOCKET_AVAILABLE:
+            try:
+                self.ws = websocket.create_connection(self.stream_url, timeout=10)
+                print(f"Streaming frames over {self.stream_url}")
+            except Exception as e:
+                print(f"WebSocket unavailable ({e}); using HTTP uploads.")
+
+    def _follow(self, owner):
+        """Switch to the node that owns this camera."""
+        print(f"Camera {self.camera_id} is served by {owner}; switching.")
+        self.close()
+        owner = owner.rstrip("/")
+        self.api_url = f"{owner}/analyze_frame"
+        self.stream_url = f"{owner.replace('http', 'ws', 1)}/ws/frames/{self.camera_id}"
+        self._connect()
+
+    def send(self, jpeg_bytes, redirects=0):
+        """Send one frame and return the analysis result dict."""
+        if self.ws is not None:
+            try:
+                # Length-prefixed frame, see src/api/stream_protocol.py
+                self.ws.send_binary(struct.pack(">I", len(jpeg_bytes)) + jpeg_bytes)
+                result = json.loads(self.ws.recv())
+                if "owner" in result and redirects < self.MAX_REDIRECTS:
+                    self._follow(result["owner"])
+                    return self.send(jpeg_bytes, redirects + 1)
+                return result
+            except Exception as e:
+                print(f"Stream error ({e}); falling back to HTTP uploads.")
+                self.close()
+        files = {'file': ('frame.jpg', jpeg_bytes, 'image/jpeg')}
+        data = {'camera_id': self.camera_id}
+        response = self.session.post(self.api_url, files=files, data=data)
+        if response.status_code == 421 and redirects < self.MAX_REDIRECTS:
+            self._follow(response.json()["owner"])
+            return self.send(jpeg_bytes, redirects + 1)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        if self.ws is not None:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+            self.ws = None
+
+
+def start_camera_client(camera_id="cam_local", api_url="http://localhost:8004/analyze_frame",
+                        stream_url="ws://localhost:8004/ws/frames"):
     """
     Captures video from the local webcam, sends frames to the backend for analysis,
     and displays the results.
@@ -15,6 +90,8 @@ def start_camera_client(camera_id="cam_local", api_url="http://localhost:8004/an
         print("Error: Could not open camera.")
         return
 
+    sender = FrameSender(camera_id, api_url, stream_url)
+
     while True:
         ret, frame = cap.read()
         if not ret:
@@ -23,44 +100,39 @@ def start_camera_client(camera_id="cam_local", api_url="http://localhost:8004/an
 
         # Encode frame to send to API
         _, img_encoded = cv2.imencode('.jpg', frame)
-        files = {'file': ('frame.jpg', img_encoded.tobytes(), 'image/jpeg')}
-        data = {'camera_id': camera_id}
 
         try:
             # Send frame to backend
-            response = requests.post(api_url, files=files, data=data)
-            
-            if response.status_code == 200:
-                result = response.json()
-                students = result.get("students", [])
-
-                # Draw analysis results on the frame
-                for student in students:
-                    # Parse data
-                    student_id = student.get("student_id", "Unknown")
-                    risk = student.get("risk_level", "Unknown")
-                    detections = student.get("detections", [])
-                    gaze = student.get("gaze", "Unknown")
-                    
-                    # Construct label text
-                    label_text = f"ID: {student_id} | Risk: {risk} | Gaze: {gaze}"
-                    if detections:
-                        label_text += f" | Det: {', '.join(detections)}"
-                    
-                    # Draw on frame (simplified, since backend doesn't return bounding boxes for everything in the 'students' list structure yet,
-                    # but let's assume valid face/detection logic runs).
-                    # Actually, the backend response structure 'students' is a bit complex in main.py.
-                    # It returns a list of results.
-                    # The main.py does NOT helpfully return bounding boxes in the final `students` list for drawing here easily 
-                    # unless we modify main.py to pass them back.
-                    # However, we can just display the text overlay at the top or bottom for now.
-                    
-                    # Let's display the overall status on the top-left
-                    cv2.putText(frame, label_text, (10, 30 + 30 * students.index(student)), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255) if risk == "High" else (0, 255, 0), 2)
-            else:
-                print(f"Server Error: {response.status_code}")
+            result = sender.send(img_encoded.tobytes())
+            students = result.get("students", [])
+
+            # Draw analysis results on the frame
+            for student in students:
+                # Parse data
+                student_id = student.get("student_id", "Unknown")
+                risk = student.get("risk_level", "Unknown")
+                detections = student.get("detections", [])
+                gaze = student.get("gaze", "Unknown")
+                
+                # Construct label text
+                label_text = f"ID: {student_id} | Risk: {risk} | Gaze: {gaze}"
+                if detections:
+                    label_text += f" | Det: {', '.join(detections)}"
+                
+                # Draw on frame (simplified, since backend doesn't return bounding boxes for everything in the 'students' list structure yet,
+                # but let's assume valid face/detection logic runs).
+                # Actually, the backend response structure 'students' is a bit complex in main.py.
+                # It returns a list of results.
+                # The main.py does NOT helpfully return bounding boxes in the final `students` list for drawing here easily 
+                # unless we modify main.py to pass them back.
+                # However, we can just display the text overlay at the top or bottom for now.
+                
+                # Let's display the overall status on the top-left
+                cv2.putText(frame, label_text, (10, 30 + 30 * students.index(student)), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255) if risk == "High" else (0, 255, 0), 2)
 
+        except requests.exceptions.HTTPError as e:
+            print(f"Server Error: {e.response.status_code}")
         except requests.exceptions.ConnectionError:
             print("Connection Error: Is the backend running?")
             cv2.putText(frame, "Backend Offline", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
@@ -73,6 +145,7 @@ def start_camera_client(camera_id="cam_local", api_url="http://localhost:8004/an
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
+    sender.close()
     cap.release()
     cv2.destroyAllWindows()
 
@@ -0,0 +1,65 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+
+# Allow running from the repository root without setting PYTHONPATH
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from src.config import YOLO_MODEL_PATH, ONNX_MODEL_PATH, DETECTOR_INPUT_SIZE
+
+
+def write_model_info(onnx_path, names, input_size, source, quantized):
+    """Sidecar JSON read by the onnx/openvino detector backends."""
+    info_path = os.path.splitext(onnx_path)[0] + ".json"
+    with open(info_path, "w") as f:
+        json.dump({
+            "names": {str(k): v for k, v in names.items()},
+            "input_size": input_size,
+            "source": os.path.basename(source),
+            "quantized": quantized,
+        }, f, indent=2)
+    return info_path
+
+
+def export_onnx(weights, output, input_size, opset):
+    from ultralytics import YOLO
+    model = YOLO(weights)
+    # Dynamic axes so the batched detector can send several frames per call
+    exported = model.export(format="onnx", imgsz=input_size, dynamic=True, simplify=True, opset=opset)
+    if os.path.abspath(exported) != os.path.abspath(output):
+        shutil.move(exported, output)
+    return model.names
+
+
+def quantize_int8(source, output):
+    """Dynamic INT8 quantization of the weights (no calibration data needed)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(source, output, weight_type=QuantType.QUInt8)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the YOLO detector to ONNX (optionally INT8) for the onnx/openvino backends.")
+    parser.add_argument("--weights", default=YOLO_MODEL_PATH)
+    parser.add_argument("--output", default=ONNX_MODEL_PATH)
+    parser.add_argument("--input-size", type=int, default=DETECTOR_INPUT_SIZE)
+    parser.add_argument("--opset", type=int, default=12)
+    parser.add_argument("--int8", action="store_true", help="Also write a dynamically quantized <output>.int8.onnx")
+    args = parser.parse_args()
+
+    if args.input_size % 32:
+        parser.error("--input-size must be a multiple of 32")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    names = export_onnx(args.weights, args.output, args.input_size, args.opset)
+    print(f"Exported {args.weights} -> {args.output}")
+    print(f"Wrote {write_model_info(args.output, names, args.input_size, args.weights, False)}")
+
+    if args.int8:
+        int8_path = os.path.splitext(args.output)[0] + ".int8.onnx"
+        quantize_int8(args.output, int8_path)
+        print(f"Quantized -> {int8_path}")
+        print(f"Wrote {write_model_info(int8_path, names, args.input_size, args.weights, True)}")
@@ -1,12 +1,15 @@
 import cv2
 import numpy as np
 import time
-import requests
 import os
 
+from camera_client import FrameSender
+
 def generate_mock_exam_stream(camera_id="cam_01", student_id="student_101"):
     """Simulate an exam session by sending mock frames to the API."""
     url = "http://localhost:8004/analyze_frame"
+    # One persistent connection for the whole session (HTTP keep-alive as fallback)
+    sender = FrameSender(camera_id, url, "ws://localhost:8004/ws/frames")
     
     # Create a blank frame representing a student at a desk
     frame = np.zeros((480, 640, 3), dtype=np.uint8)
@@ -28,17 +31,16 @@ def generate_mock_exam_stream(camera_id="cam_01", student_id="student_101"):
         
         # Encode for transport
         _, img_encoded = cv2.imencode('.jpg', test_frame)
-        files = {'file': ('frame.jpg', img_encoded.tobytes(), 'image/jpeg')}
-        data = {'camera_id': camera_id}
         
         try:
-            response = requests.post(url, files=files, data=data)
-            print(f"API Response: {response.json()}")
+            print(f"API Response: {sender.send(img_encoded.tobytes())}")
         except Exception as e:
             print(f"API Error: {e}")
             
         time.sleep(2)
 
+    sender.close()
+
 if __name__ == "__main__":
     # Ensure the student is enrolled first (mock enrollment)
     # This requires a real face image or a mock bypass in FaceManager
@@ -0,0 +1,90 @@
+from fastapi import FastAPI, Body, HTTPException
+import asyncio
+import time
+from src.core.cluster.hash_ring import HashRing
+from src.core.cluster.state_store import InMemoryStateStore
+from src.config import CLUSTER_NODE_TTL_S, COORDINATOR_PORT
+
+app = FastAPI(title="AI Exam Monitoring Coordinator")
+
+# node_id -> {"url", "joined_at", "last_seen"}; `version` bumps on every membership change
+nodes = {}
+membership = {"version": 0}
+ring = HashRing()
+# Backing store for nodes using STATE_STORE_BACKEND = "http"
+state_store = InMemoryStateStore()
+
+def _membership():
+    return {"version": membership["version"], "nodes": {nid: n["url"] for nid, n in nodes.items()}}
+
+def _set_ring():
+    global ring
+    ring = HashRing(sorted(nodes))
+    membership["version"] += 1
+
+async def expire_nodes():
+    """Drop nodes that stopped heartbeating; their cameras move to the survivors."""
+    while True:
+        await asyncio.sleep(CLUSTER_NODE_TTL_S / 2)
+        now = time.time()
+        stale = [nid for nid, n in nodes.items() if now - n["last_seen"] > CLUSTER_NODE_TTL_S]
+        for node_id in stale:
+            del nodes[node_id]
+            print(f"Node {node_id} timed out")
+        if stale:
+            _set_ring()
+
+@app.on_event("startup")
+async def start_expiry():
+    asyncio.get_running_loop().create_task(expire_nodes())
+
+@app.post("/nodes/{node_id}/heartbeat")
+async def heartbeat(node_id: str, url: str = Body(..., embed=True)):
+    """Register or refresh a node; returns the current membership for the node's ring."""
+    now = time.time()
+    node = nodes.get(node_id)
+    if node is None or node["url"] != url:
+        nodes[node_id] = {"url": url, "joined_at": now, "last_seen": now}
+        _set_ring()
+    else:
+        node["last_seen"] = now
+    return _membership()
+
+@app.delete("/nodes/{node_id}")
+async def leave(node_id: str):
+    if nodes.pop(node_id, None) is not None:
+        _set_ring()
+    return _membership()
+
+@app.get("/nodes")
+async def list_nodes():
+    return {"version": membership["version"], "nodes": nodes}
+
+@app.get("/route/{camera_id}")
+async def route(camera_id: str):
+    """Which node a camera should send its frames to."""
+    node_id = ring.owner(camera_id)
+    if node_id is None:
+        raise HTTPException(status_code=503, detail="No inference nodes registered")
+    return {"camera_id": camera_id, "node_id": node_id, "url": nodes[node_id]["url"]}
+
+@app.get("/state/{key}")
+async def get_state(key: str):
+    value = state_store.get(key)
+    if value is None:
+        raise HTTPException(status_code=404, detail="No state")
+    return value
+
+@app.put("/state/{key}")
+async def put_state(key: str, value: dict = Body(...)):
+    state_store.put(key, value)
+    return {"key": key}
+
+@app.delete("/state/{key}")
+async def delete_state(key: str):
+    state_store.delete(key)
+    return {"key": key}
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=COORDINATOR_PORT)
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+from src.config import FEED_MAX_PENDING, FEED_SCORE_EPSILON, FEED_STUDENT_TTL_S
+
+
+class Subscriber:
+    """One dashboard connection.
+
+    Messages are queued pre-encoded and shared with every other subscriber.
+    A client that falls more than `max_pending` messages behind has its
+    backlog discarded: the halls involved are marked for resync and it gets
+    one snapshot of their latest state instead, so slow clients never
+    replay stale deltas.
+    """
+
+    def __init__(self, halls=None, max_pending=FEED_MAX_PENDING):
+        self.halls = set(halls) if halls else None  # None = every hall
+        self.max_pending = max(1, int(max_pending))
+        self.queue = deque()
+        self.resync = set()
+        self.coalesced = 0
+        self._event = asyncio.Event()
+
+    def wants(self, hall_id):
+        return self.halls is None or hall_id in self.halls
+
+    def offer(self, hall_id, message):
+        if hall_id in self.resync:
+            return  # The pending snapshot will carry this change
+        if len(self.queue) >= self.max_pending:
+            self.coalesced += len(self.queue) + 1
+            self.resync.update(hall for hall, _ in self.queue)
+            self.resync.add(hall_id)
+            self.queue.clear()
+        else:
+            self.queue.append((hall_id, message))
+        self._event.set()
+
+    async def next_messages(self, hub):
+        """Wait for updates; returns encoded messages (deltas, then resync snapshots)."""
+        await self._event.wait()
+        self._event.clear()
+        messages = [message for _, message in self.queue]
+        self.queue.clear()
+        messages.extend(hub.snapshot(hall_id) for hall_id in sorted(self.resync))
+        self.resync.clear()
+        return messages
+
+
+class LiveFeedHub:
+    """Pub/sub of per-hall student results for the dashboards.
+
+    The pipeline publishes each scored frame; the hub keeps the latest state
+    per hall and fans out only the students whose risk level or score
+    changed. Each delta is JSON-encoded once for all subscribers, and full
+    snapshots (for new or lagging clients) are encoded once per hall version.
+    """
+
+    def __init__(self, score_epsilon=FEED_SCORE_EPSILON, student_ttl=FEED_STUDENT_TTL_S):
+        self.score_epsilon = score_epsilon
+        self.student_ttl = student_ttl
+        self.halls = {}  # hall_id -> {student_id: student dict}
+        self.last_seen = {}  # hall_id -> {student_id: timestamp}
+        self.seq = {}
+        self.subscribers = set()
+        self._snapshots = {}  # hall_id -> (seq, encoded snapshot)
+        self.published = 0
+        self.deltas_sent = 0
+
+    def _changed(self, old, new):
+        if old is None or old["risk_level"] != new["risk_level"]:
+            return True
+        try:
+            return abs(float(old["score"]) - float(new["score"])) >= self.score_epsilon
+        except (KeyError, ValueError):
+            return old != new
+
+    def publish(self, hall_id, students, timestamp=None):
+        """Merge one frame's results into the hall state and fan out the delta."""
+        now = time.time() if timestamp is None else timestamp
+        self.published += 1
+        state = self.halls.setdefault(hall_id, {})
+        seen = self.last_seen.setdefault(hall_id, {})
+
+        changed = []
+        for student in students:
+            student_id = student.get("student_id")
+            # Unidentified faces have no score of their own to track
+            if student_id is None or student_id == "Unknown":
+                continue
+            seen[student_id] = now
+            entry = {
+                "student_id": student_id,
+                "risk_level": student.get("risk_level"),
+                "score": student.get("score"),
+                "gaze": student.get("gaze"),
+                "detections": student.get("detections", []),
+            }
+            if self._changed(state.get(student_id), entry):
+                state[student_id] = entry
+                changed.append(entry)
+
+        removed = self._expire(hall_id, now)
+        if not changed and not removed:
+            return 0
+        self._fan_out(hall_id, now, changed, removed)
+        return len(changed) + len(removed)
+
+    def _expire(self, hall_id, now):
+        seen = self.last_seen.get(hall_id, {})
+        state = self.halls.get(hall_id, {})
+        removed = [sid for sid, t in seen.items() if now - t > self.student_ttl]
+        for student_id in removed:
+            del seen[student_id]
+            state.pop(student_id, None)
+        return removed
+
+    def _fan_out(self, hall_id, now, changed, removed):
+        seq = self.seq[hall_id] = self.seq.get(hall_id, 0) + 1
+        message = json.dumps({
+            "type": "delta", "hall": hall_id, "seq": seq, "ts": now,
+            "students": changed, "removed": removed,
+        })
+        for subscriber in self.subscribers:
+            if subscriber.wants(hall_id):
+                subscriber.offer(hall_id, message)
+                self.deltas_sent += 1
+
+    def prune(self, timestamp=None):
+        """Drop students unseen for `student_ttl` in every hall, including halls whose camera went quiet."""
+        now = time.time() if timestamp is None else timestamp
+        pruned = 0
+        for hall_id in list(self.halls):
+            removed = self._expire(hall_id, now)
+            if removed:
+                self._fan_out(hall_id, now, [], removed)
+                pruned += len(removed)
+        return pruned
+
+    def snapshot(self, hall_id):
+        seq = self.seq.get(hall_id, 0)
+        cached = self._snapshots.get(hall_id)
+        if cached is None or cached[0] != seq:
+            encoded = json.dumps({
+                "type": "snapshot", "hall": hall_id, "seq": seq, "ts": time.time(),
+                "students": list(self.halls.get(hall_id, {}).values()),
+            })
+            cached = self._snapshots[hall_id] = (seq, encoded)
+        return cached[1]
+
+    def subscribe(self, halls=None):
+        """Register a subscriber; returns it with the initial snapshots of its halls."""
+        self.prune()
+        subscriber = Subscriber(halls)
+        self.subscribers.add(subscriber)
+        initial = [self.snapshot(hall_id) for hall_id in sorted(self.halls) if subscriber.wants(hall_id)]
+        return subscriber, initial
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def remove_hall(self, hall_id):
+        self.halls.pop(hall_id, None)
+        self.last_seen.pop(hall_id, None)
+        self.seq.pop(hall_id, None)
+        self._snapshots.pop(hall_id, None)
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "halls": {hall_id: {"seq": self.seq.get(hall_id, 0), "students": len(state)}
+                      for hall_id, state in self.halls.items()},
+            "frames_published": self.published,
+            "deltas_sent": self.deltas_sent,
+            "messages_coalesced": sum(s.coalesced for s in self.subscribers),
+        }
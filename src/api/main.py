@@ -1,93 +1,652 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Body, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse, FileResponse
+from fastapi.staticfiles import StaticFiles
+import asyncio
+import concurrent.futures
 import cv2
+import json
+import logging
 import numpy as np
 import os
+import socket
+import time
+from urllib.parse import urlsplit
 from src.core.face.face_manager import FaceManager
 from src.core.detection.object_detector import ObjectDetector
-from src.core.pose.behavior_analyzer import BehaviorAnalyzer
 from src.core.malpractice_engine import MalpracticeEngine
+from src.core.event_log import EventLog
+from src.core.evidence import EvidenceRecorder
+from src.core.result_cache import ResultCache, content_key
+from src.core.detection.batch_scheduler import BatchScheduler
+from src.core.frame_pipeline import score_observations
+from src.core.worker_pool import (
+    InferencePool, FrameDropped, analyze_jpeg, analyze_frame_array, set_detection_hook,
+)
+from src.core.capture.camera_reader import CameraReader
+from src.core.capture.camera_registry import CameraRegistry
+from src.core.cluster.member import ClusterMember
+from src.core.cluster.state_store import create_state_store
+from src.api.stream_protocol import unpack_frames, ProtocolError
+from src.api.metrics import MetricsRegistry
+from src.api.profiler import SamplingProfiler
+from src.api.live_feed import LiveFeedHub
+from src.config import (
+    BATCH_INFERENCE_ENABLED, BATCH_RESULT_TIMEOUT_S, WORKER_POOL_MODE, PULL_MODE_ENABLED, FPS_TARGET, SUSPICIOUS_RISK_LEVELS,
+    MODEL_PRELOAD_ENABLED, MODEL_WARMUP_ENABLED, CLUSTER_ENABLED, COORDINATOR_URL, NODE_ID, NODE_URL, NODE_PORT,
+    FEED_KEEPALIVE_S, DASHBOARD_DIR, EVENT_LOG_ENABLED, EVIDENCE_ENABLED, EVIDENCE_TRIGGER_LEVELS,
+    EVIDENCE_PULL_JPEG_QUALITY, RESULT_CACHE_ENABLED, RESULT_CACHE_PERCEPTUAL,
+)
 
 app = FastAPI(title="AI Exam Monitoring System")
+logger = logging.getLogger("exam_monitor")
+
+MAX_PROFILE_SECONDS = 300
 
 # Initialize Cores
+# Inference models live in the pool workers and are loaded after startup
+# (see load_models); the main process keeps the enrollment database and the
+# temporal scoring state, both cheap to open.
 face_mgr = FaceManager()
-obj_det = ObjectDetector()
-bh_analyzer = BehaviorAnalyzer()
 engine = MalpracticeEngine()
+inference_pool = InferencePool()
+
+# Pull mode: camera_id -> (CameraReader, asyncio task) and latest results
+camera_registry = CameraRegistry()
+pull_cameras = {}
+latest_results = {}
+
+# camera_id -> WebSockets streaming its frames to this node
+frame_streams = {}
+
+# Byte-identical uploads (mock streams, frozen encoders) reuse the last
+# observations without going through the pool; they are still scored
+result_cache = ResultCache() if RESULT_CACHE_ENABLED else None
+
+# camera_id -> {student_id: risk level} of the last frame; suspicious students
+# are analyzed at full rate and escalations trigger evidence clips
+last_risk = {}
+
+# Cluster mode: this node only serves the cameras the hash ring assigns to it
+# and hands their scoring state over through the shared state store
+cluster = None
+if CLUSTER_ENABLED:
+    node_url = NODE_URL or f"http://{socket.gethostname()}:{NODE_PORT}"
+    # Keyed by the advertised URL: a 421 redirect must reach a different process
+    node_id = NODE_ID or urlsplit(node_url).netloc
+    cluster = ClusterMember(
+        node_id, node_url, COORDINATOR_URL,
+        create_state_store(), engine, on_change=lambda: on_cluster_change(),
+    )
+
+# Batching needs a shared detector, so it is only available with thread workers
+batch_scheduler = None
+if BATCH_INFERENCE_ENABLED and WORKER_POOL_MODE == "thread":
+    batch_scheduler = BatchScheduler(detector_factory=ObjectDetector)
+elif BATCH_INFERENCE_ENABLED:
+    logger.warning("Batched detection is disabled in process mode; each worker runs its own detector.")
+
+# Observability: per-camera stage histograms, drop/failure counters, profiler
+metrics = MetricsRegistry()
+profiler = SamplingProfiler()
+
+def _runtime_gauges():
+    gauges = []
+    for camera_id, stats in inference_pool.stats()["cameras"].items():
+        gauges.append(("pending_frames", (("camera", camera_id),), stats["pending"]))
+    if batch_scheduler is not None:
+        gauges.append(("batch_queue_depth", (), batch_scheduler.stats()["queue_depth"]))
+    gauges.append(("live_subscribers", (), len(live_feed.subscribers)))
+    if event_log is not None:
+        stats = event_log.stats()
+        gauges.append(("event_log_queue_depth", (), stats["queue_depth"]))
+        gauges.append(("event_log_dropped", (), stats["dropped"]))
+    if evidence is not None:
+        stats = evidence.stats()
+        # Pre-roll plus open and queued clips: the memory EVIDENCE_BUFFER_MAX_MB bounds
+        gauges.append(("evidence_buffer_bytes", (), stats["total_bytes"]))
+        gauges.append(("evidence_clip_bytes", (), stats["clip_bytes"]))
+        for camera_id, camera in stats["cameras"].items():
+            gauges.append(("evidence_camera_buffer_bytes", (("camera", camera_id),), camera["bytes"]))
+        gauges.append(("evidence_clips_written", (), stats["clips_written"]))
+        gauges.append(("evidence_clips_dropped", (), stats["clips_dropped"]))
+    if result_cache is not None:
+        gauges.append(("result_cache_entries", (), result_cache.stats()["entries"]))
+    return gauges
+
+metrics.register_gauge_callback(_runtime_gauges)
+
+# Audit trail of risk transitions and detections, written off the request path
+event_log = EventLog() if EVENT_LOG_ENABLED else None
+
+# Pre-roll of received frames per camera, saved as clips on escalations
+evidence = EvidenceRecorder() if EVIDENCE_ENABLED else None
+
+# Live feed: dashboards subscribe to per-hall (camera) result deltas
+live_feed = LiveFeedHub()
+
+# Readiness (/ready): liveness is "/", readiness waits for the models
+readiness = {"ready": False, "started_at": time.time(), "ready_at": None, "components": {}, "error": None}
+
+def _mark_ready():
+    readiness["ready"] = True
+    readiness["ready_at"] = time.time()
+    metrics.set_gauge("startup_seconds", readiness["ready_at"] - readiness["started_at"],
+                      help_text="Seconds from API start until the models were loaded")
+
+async def load_models():
+    """Load (and optionally warm up) every model in the background, then report ready."""
+    try:
+        if batch_scheduler is not None:
+            started = time.perf_counter()
+            warm_frame = np.zeros((480, 640, 3), dtype=np.uint8) if MODEL_WARMUP_ENABLED else None
+            await batch_scheduler.warm_up(warm_frame)
+            readiness["components"]["detector"] = {"seconds": time.perf_counter() - started}
+        started = time.perf_counter()
+        workers = await inference_pool.warm_up(run_inference=MODEL_WARMUP_ENABLED)
+        readiness["components"]["workers"] = {"seconds": time.perf_counter() - started, "details": workers}
+        _mark_ready()
+        logger.info("Models ready after %.1fs", readiness["ready_at"] - readiness["started_at"])
+    except Exception as e:
+        logger.exception("Model loading failed")
+        readiness["error"] = str(e)
+
+async def prune_live_feed():
+    """Expire students of halls that stopped publishing (publish only prunes its own hall)."""
+    while True:
+        await asyncio.sleep(FEED_KEEPALIVE_S)
+        live_feed.prune()
+
+@app.on_event("startup")
+async def start_live_feed_pruning():
+    asyncio.get_running_loop().create_task(prune_live_feed())
+
+@app.on_event("startup")
+async def start_batch_scheduler():
+    if batch_scheduler is not None:
+        batch_scheduler.start()
+        loop = asyncio.get_running_loop()
+
+        def detect_batched(frame):
+            # Worker threads block on the shared batcher running on the event loop
+            future = asyncio.run_coroutine_threadsafe(batch_scheduler.submit(frame), loop)
+            try:
+                return future.result(BATCH_RESULT_TIMEOUT_S)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                raise
+
+        set_detection_hook(detect_batched)
+
+    if MODEL_PRELOAD_ENABLED:
+        asyncio.get_running_loop().create_task(load_models())
+    else:
+        # Models load on the first frame of each worker
+        _mark_ready()
+
+    if cluster is not None:
+        asyncio.get_running_loop().create_task(cluster.run())
+    sync_pull_cameras()
+
+@app.on_event("shutdown")
+async def stop_batch_scheduler():
+    for camera_id in list(pull_cameras):
+        stop_pull_camera(camera_id)
+    if cluster is not None:
+        await cluster.leave()
+    if event_log is not None:
+        event_log.close()
+    if evidence is not None:
+        evidence.close()
+    if batch_scheduler is not None:
+        await batch_scheduler.stop()
+    inference_pool.shutdown()
 
 @app.get("/")
 async def root():
     return {"status": "Monitoring System Active"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until the models are loaded (and warmed up)."""
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+@app.get("/stats/batching")
+async def batching_stats():
+    if batch_scheduler is None:
+        return {"enabled": False}
+    return {"enabled": True, **batch_scheduler.stats()}
+
+@app.post("/enroll_bulk")
+async def enroll_bulk(file: UploadFile = File(...)):
+    """Enroll a zip of photos named <student_id>.jpg or laid out as <student_id>/<photo>."""
+    temp_path = f"temp_{file.filename}"
+    with open(temp_path, "wb") as buffer:
+        buffer.write(await file.read())
+
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(None, face_mgr.bulk_enroll, temp_path)
+    finally:
+        os.remove(temp_path)
+
+    return {"enrolled": len(result["enrolled"]), "failed": result["failed"]}
+
+@app.get("/stats/workers")
+async def worker_stats():
+    stats = inference_pool.stats()
+    if result_cache is not None:
+        stats["result_cache"] = result_cache.stats()
+    return stats
+
+@app.get("/cluster")
+async def cluster_status():
+    if cluster is None:
+        return {"enabled": False}
+    return {"enabled": True, **cluster.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of stage timings, counters and queue gauges."""
+    return metrics.render()
+
+@app.post("/debug/profile")
+async def start_profile(seconds: float = 10.0, interval_ms: float = 5.0):
+    """Sample the stacks of all threads in this process for `seconds`."""
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or interval_ms <= 0:
+        raise HTTPException(status_code=400, detail="Invalid profiling window")
+    if not profiler.start(seconds, interval_ms / 1000.0):
+        raise HTTPException(status_code=409, detail="A profiling session is already running")
+    return profiler.status()
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def profile_report(limit: int = 200):
+    """Collapsed stacks of the last profiling session (flamegraph input)."""
+    return profiler.report(limit)
+
+@app.get("/debug/profile/status")
+async def profile_status():
+    return profiler.status()
+
 @app.post("/enroll")
 async def enroll_student(student_id: str = Form(...), file: UploadFile = File(...)):
     temp_path = f"temp_{file.filename}"
     with open(temp_path, "wb") as buffer:
         buffer.write(await file.read())
         
-    success = face_mgr.enroll_student(student_id, temp_path)
+    loop = asyncio.get_running_loop()
+    success = await loop.run_in_executor(None, face_mgr.enroll_student, student_id, temp_path)
     os.remove(temp_path)
     
     return {"student_id": student_id, "status": "Success" if success else "Failed"}
 
-@app.post("/analyze_frame")
-async def analyze_frame(camera_id: str = Form(...), file: UploadFile = File(...)):
-    # Read frame
-    contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    
-    if frame is None:
+@app.post("/sessions/{session_id}/roster")
+async def set_session_roster(session_id: str, student_ids: list[str] = Body(...)):
+    face_mgr.set_session_roster(session_id, student_ids)
+    return {"session_id": session_id, "students": len(student_ids)}
+
+def _camera_labels(camera_id):
+    return (("camera", camera_id),)
+
+def _count_cache_lookup(camera_id, kind, hit):
+    labels = _camera_labels(camera_id) + (("kind", kind), ("result", "hit" if hit else "miss"))
+    metrics.inc("result_cache_lookups_total", labels,
+                help_text="Result cache lookups by key kind (exact upload bytes or perceptual hash)")
+
+async def run_analysis(camera_id, fn, *args, session_id=None, cache_key=None):
+    """Run a worker-pool analysis job for one frame, score it and record metrics.
+
+    `fn(*args, boosted)` runs in the pool; `boosted` is the tuple of this
+    camera's currently suspicious students. With a `cache_key`, recent
+    observations of the same key are reused instead; scoring runs either way
+    so the temporal window keeps advancing.
+    """
+    started = time.perf_counter()
+    previous_risk = last_risk.get(camera_id, {})
+    boosted = tuple(sid for sid, risk in previous_risk.items() if risk in SUSPICIOUS_RISK_LEVELS)
+    observations = result_cache.get(camera_id, cache_key, session_id=session_id) if cache_key is not None else None
+    exact_hit = observations is not None
+    if cache_key is not None:
+        _count_cache_lookup(camera_id, "exact", exact_hit)
+    if not exact_hit:
+        # Decode, detection and pose run in the worker pool, off the event loop
+        try:
+            observations = await inference_pool.submit(camera_id, fn, *args, boosted)
+        except FrameDropped:
+            metrics.inc("frames_dropped_total", _camera_labels(camera_id),
+                        help_text="Frames dropped because a newer frame from the camera was waiting")
+            return {"camera_id": camera_id, "dropped": True, "students": []}
+        except Exception:
+            logger.exception("Error in frame analysis (%s)", camera_id)
+            metrics.inc("frames_failed_total", _camera_labels(camera_id),
+                        help_text="Frames whose analysis raised an error")
+            return {"camera_id": camera_id, "students": []}
+        if observations is not None:
+            # Frames with a failed stage are retried instead of reused
+            if cache_key is not None and not observations.get("errors"):
+                result_cache.put(camera_id, cache_key, observations, session_id=session_id)
+            if RESULT_CACHE_ENABLED and RESULT_CACHE_PERCEPTUAL:
+                _count_cache_lookup(camera_id, "perceptual", observations.get("cached") == "perceptual")
+
+    if cluster is not None and not await cluster.ensure_loaded(camera_id):
+        # The camera moved to another node; its scoring state is no longer ours
+        return {"camera_id": camera_id, "owner": cluster.owner_url(camera_id), "students": []}
+
+    if observations is None:
+        metrics.inc("frames_invalid_total", _camera_labels(camera_id),
+                    help_text="Uploads that could not be decoded as images")
         return {"error": "Invalid image"}
-        
-    # 1. Face Identification
+
+    scoring_started = time.perf_counter()
+    # Stages that failed and were treated as finding nothing (such frames are never cached)
+    stage_errors = list(observations.get("errors", ()))
+    results = score_observations(engine, observations, errors=stage_errors)
+    finished = time.perf_counter()
+    for stage in stage_errors:
+        metrics.inc("stage_errors_total", _camera_labels(camera_id) + (("stage", stage),),
+                    help_text="Analysis stages (face, scoring) that raised an error on a frame")
+    current_risk = last_risk[camera_id] = {
+        r["student_id"]: r["risk_level"] for r in results if r["student_id"] != "Unknown"
+    }
+    if evidence is not None:
+        for student_id, risk in current_risk.items():
+            if risk in EVIDENCE_TRIGGER_LEVELS and previous_risk.get(student_id) != risk:
+                evidence.trigger(camera_id, student_id, risk, session_id)
+    if cluster is not None:
+        cluster.note_students(camera_id, [r["student_id"] for r in results])
+    live_feed.publish(camera_id, results)
+    if event_log is not None:
+        event_log.record_frame(camera_id, session_id, results)
+
+    if not exact_hit:
+        # An exact hit still carries the timings of the frame that was analyzed
+        metrics.observe_timings(camera_id, observations.get("timings", {}))
+        for stage in observations.get("skipped", ()):
+            metrics.inc("stage_skipped_total", _camera_labels(camera_id) + (("stage", stage),),
+                        help_text="Stages skipped by the adaptive scheduler (no motion or not due)")
+    metrics.observe_stage(camera_id, "scoring", finished - scoring_started)
+    metrics.observe_stage(camera_id, "total", finished - started)
+    metrics.inc("frames_processed_total", _camera_labels(camera_id), help_text="Frames analyzed and scored")
+    return {"camera_id": camera_id, "students": results}
+
+async def process_frame(camera_id, contents, session_id=None):
+    """Analyze one encoded frame and score it; shared by the HTTP and streaming endpoints."""
+    if evidence is not None:
+        # Buffered before analysis so a triggering frame is part of its own clip
+        evidence.add_frame(camera_id, contents)
+    cache_key = content_key(contents) if result_cache is not None else None
+    return await run_analysis(camera_id, analyze_jpeg, contents, session_id, camera_id,
+                              session_id=session_id, cache_key=cache_key)
+
+async def pull_camera_loop(camera_id, reader, session_id=None):
+    """Analyze the newest frame of a pulled camera at FPS_TARGET.
+
+    The next frame is only taken once the previous one is analyzed, so when
+    inference falls behind frames are skipped instead of queued.
+    """
+    interval = 1.0 / FPS_TARGET
+    last_seq = 0
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        seq, timestamp, frame = reader.latest()
+        if frame is not None and seq != last_seq:
+            last_seq = seq
+            if evidence is not None:
+                ok, encoded = await loop.run_in_executor(
+                    None, cv2.imencode, ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, EVIDENCE_PULL_JPEG_QUALITY]
+                )
+                if ok:
+                    evidence.add_frame(camera_id, encoded.tobytes(), timestamp)
+            result = await run_analysis(
+                camera_id, analyze_frame_array, frame, session_id, camera_id, session_id=session_id
+            )
+            result["timestamp"] = timestamp
+            latest_results[camera_id] = result
+        await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+
+def start_pull_camera(entry):
+    camera_id = entry["camera_id"]
+    stop_pull_camera(camera_id)
+    reader = CameraReader(camera_id, entry["source"])
+    reader.start()
+    task = asyncio.get_running_loop().create_task(
+        pull_camera_loop(camera_id, reader, entry.get("session_id"))
+    )
+    pull_cameras[camera_id] = (reader, task)
+
+def sync_pull_cameras():
+    """Pull exactly the enabled registry cameras owned by this node."""
+    if not PULL_MODE_ENABLED:
+        return
+    for entry in camera_registry.enabled():
+        camera_id = entry["camera_id"]
+        if cluster is None or cluster.owns(camera_id):
+            if camera_id not in pull_cameras:
+                start_pull_camera(entry)
+        elif camera_id in pull_cameras:
+            stop_pull_camera(camera_id)
+
+async def redirect_stream(websocket, camera_id):
+    """Tell a frame stream which node owns its camera now and close it."""
     try:
-        face_locs, face_names = face_mgr.identify_face(frame)
-    except Exception as e:
-        print(f"Error in face identification: {e}")
-        face_locs, face_names = [], []
-    
-    results = []
-    # If no faces identified but we have a frame, analyze the frame anyway (general detection)
-    if not face_names:
+        await websocket.send_text(json.dumps({"camera_id": camera_id, "owner": cluster.owner_url(camera_id)}))
+        await websocket.close(code=1008, reason="camera is served by another node")
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+def on_cluster_change():
+    """Stop serving the cameras this node lost: pulled ones and pushed streams."""
+    sync_pull_cameras()
+    for camera_id, sockets in frame_streams.items():
+        if not cluster.owns(camera_id):
+            for websocket in list(sockets):
+                asyncio.get_running_loop().create_task(redirect_stream(websocket, camera_id))
+
+def stop_pull_camera(camera_id):
+    reader, task = pull_cameras.pop(camera_id, (None, None))
+    if reader is not None:
+        reader.stop()
+        task.cancel()
+
+@app.get("/cameras")
+async def list_cameras():
+    return {
+        camera_id: {
+            **entry,
+            "running": camera_id in pull_cameras,
+            **(pull_cameras[camera_id][0].stats() if camera_id in pull_cameras else {}),
+        }
+        for camera_id, entry in camera_registry.cameras.items()
+    }
+
+@app.post("/cameras")
+async def add_camera(camera_id: str = Body(...), source: str = Body(...),
+                     session_id: str = Body(None), enabled: bool = Body(True)):
+    """Register a camera source (RTSP URL, video file or device index) and start pulling it."""
+    entry = camera_registry.add(camera_id, source, session_id, enabled)
+    if enabled and PULL_MODE_ENABLED and (cluster is None or cluster.owns(camera_id)):
+        start_pull_camera(entry)
+    return entry
+
+@app.delete("/cameras/{camera_id}")
+async def remove_camera(camera_id: str):
+    stop_pull_camera(camera_id)
+    latest_results.pop(camera_id, None)
+    last_risk.pop(camera_id, None)
+    if result_cache is not None:
+        result_cache.drop_camera(camera_id)
+    if evidence is not None:
+        evidence.drop_camera(camera_id)
+    live_feed.remove_hall(camera_id)
+    return {"camera_id": camera_id, "removed": camera_registry.remove(camera_id) is not None}
+
+@app.get("/cameras/{camera_id}/latest")
+async def latest_camera_result(camera_id: str):
+    return latest_results.get(camera_id, {"camera_id": camera_id, "students": []})
+
+@app.post("/analyze_frame")
+async def analyze_frame(camera_id: str = Form(...), file: UploadFile = File(...),
+                        session_id: str = Form(None)):
+    if cluster is not None and not cluster.owns(camera_id):
+        # 421 Misdirected Request: the client should resend to the owner
+        return JSONResponse({"camera_id": camera_id, "owner": cluster.owner_url(camera_id)}, status_code=421)
+    contents = await file.read()
+    return await process_frame(camera_id, contents, session_id)
+
+@app.websocket("/ws/frames/{camera_id}")
+async def stream_frames(websocket: WebSocket, camera_id: str, session_id: str = None):
+    """Long-lived ingestion: the camera pushes length-prefixed JPEG frames as
+    binary messages and receives one JSON result per frame, tagged with its
+    sequence number. Frames superseded while queued come back as dropped."""
+    await websocket.accept()
+    if cluster is not None and not cluster.owns(camera_id):
+        await redirect_stream(websocket, camera_id)
+        return
+    # Registered so a cluster rebalance can redirect the stream
+    frame_streams.setdefault(camera_id, set()).add(websocket)
+    send_lock = asyncio.Lock()
+    pending = set()
+    seq = 0
+
+    async def handle(frame_seq, contents):
+        result = await process_frame(camera_id, contents, session_id)
+        result["seq"] = frame_seq
         try:
-            detections = obj_det.detect_prohibited_items(frame)
-            pose_data = bh_analyzer.analyze_pose(frame)
-            gaze = bh_analyzer.estimate_gaze(frame, pose_data)
-            
-            results.append({
-                "student_id": "Unknown",
-                "detections": [d["label"] for d in detections],
-                "gaze": gaze,
-                "risk_level": "N/A"
-            })
-        except Exception as e:
-            print(f"Error in general detection: {e}")
-    else:
-        for (top, right, bottom, left), name in zip(face_locs, face_names):
+            async with send_lock:
+                await websocket.send_text(json.dumps(result))
+        except (WebSocketDisconnect, RuntimeError):
+            # The client went away while the frame was analyzed; the receive loop ends the stream
+            pass
+
+    def handled(task):
+        pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Error in streamed frame (%s)", camera_id, exc_info=task.exception())
+
+    try:
+        while True:
+            payload = await websocket.receive_bytes()
             try:
-                # 2. Behavior & Detection
-                detections = obj_det.detect_prohibited_items(frame) # Global detect
-                pose_data = bh_analyzer.analyze_pose(frame)
-                gaze = bh_analyzer.estimate_gaze(frame, pose_data)
-                
-                # 3. Scoring
-                risk_level, score = engine.calculate_malpractice_score(
-                    name, detections, gaze, pose_data.get("lean_score", 0)
-                )
-                
-                results.append({
-                    "student_id": name,
-                    "risk_level": risk_level,
-                    "score": f"{score:.2f}",
-                    "gaze": gaze,
-                    "detections": [d["label"] for d in detections]
-                })
-            except Exception as e:
-                print(f"Error in student analysis ({name}): {e}")
-        
-    return {"camera_id": camera_id, "students": results}
+                frames = unpack_frames(payload)
+            except ProtocolError as e:
+                await websocket.close(code=1003, reason=str(e))
+                break
+            for frame in frames:
+                task = asyncio.create_task(handle(seq, bytes(frame)))
+                pending.add(task)
+                task.add_done_callback(handled)
+                seq += 1
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: closed by redirect_stream() after a rebalance
+        pass
+    finally:
+        frame_streams.get(camera_id, set()).discard(websocket)
+        if not frame_streams.get(camera_id):
+            frame_streams.pop(camera_id, None)
+        leftover = list(pending)
+        for task in leftover:
+            task.cancel()
+        # Retrieve every outcome so nothing is reported as "never retrieved"
+        await asyncio.gather(*leftover, return_exceptions=True)
+
+def _halls_param(halls):
+    return [h for h in halls.split(",") if h] if halls else None
+
+@app.get("/live/halls")
+async def live_halls():
+    return live_feed.stats()
+
+@app.websocket("/ws/live")
+async def live_updates(websocket: WebSocket, halls: str = None):
+    """Dashboard feed: snapshots of the requested halls (cameras), then deltas.
+
+    `halls` is a comma-separated list of camera ids (all halls if omitted).
+    """
+    await websocket.accept()
+    subscriber, initial = live_feed.subscribe(_halls_param(halls))
+    try:
+        for message in initial:
+            await websocket.send_text(message)
+        while True:
+            for message in await subscriber.next_messages(live_feed):
+                await websocket.send_text(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_feed.unsubscribe(subscriber)
+
+@app.get("/live/stream")
+async def live_stream(halls: str = None):
+    """Same feed as /ws/live as Server-Sent Events (for EventSource clients)."""
+    subscriber, initial = live_feed.subscribe(_halls_param(halls))
+
+    async def events():
+        try:
+            for message in initial:
+                yield f"data: {message}\n\n"
+            while True:
+                try:
+                    messages = await asyncio.wait_for(subscriber.next_messages(live_feed), FEED_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                for message in messages:
+                    yield f"data: {message}\n\n"
+        finally:
+            live_feed.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _event_log():
+    if event_log is None:
+        raise HTTPException(status_code=404, detail="Event log is disabled")
+    return event_log
+
+@app.get("/events/students/{student_id}")
+async def student_timeline(student_id: str, session_id: str = None, since: float = None,
+                           until: float = None, limit: int = 1000):
+    """A student's risk transitions and detections, oldest first (all sessions unless `session_id` is given)."""
+    log = _event_log()
+    events = await asyncio.get_running_loop().run_in_executor(
+        None, log.student_timeline, student_id, session_id, since, until, min(limit, 10000)
+    )
+    return {"student_id": student_id, "session_id": session_id, "events": events}
+
+@app.get("/events/halls/{camera_id}/summary")
+async def hall_summary(camera_id: str, since: float = None, until: float = None, bucket_minutes: int = 1):
+    """Per-bucket counts of risk transitions (by level) and detections (by item) for one hall."""
+    log = _event_log()
+    buckets = await asyncio.get_running_loop().run_in_executor(
+        None, log.hall_summary, camera_id, since, until, bucket_minutes
+    )
+    return {"camera_id": camera_id, "bucket_minutes": bucket_minutes, "buckets": buckets}
+
+@app.get("/events/recent")
+async def recent_events(limit: int = 100, kind: str = None):
+    log = _event_log()
+    events = await asyncio.get_running_loop().run_in_executor(None, log.recent, min(limit, 1000), kind)
+    return {"events": events, **log.stats()}
+
+@app.get("/evidence")
+async def list_evidence(camera_id: str = None):
+    if evidence is None:
+        return {"enabled": False, "clips": []}
+    return {"enabled": True, "clips": evidence.list_clips(camera_id), **evidence.stats()}
+
+@app.get("/evidence/{camera_id}/{clip_id}")
+async def get_evidence(camera_id: str, clip_id: str, metadata: bool = False):
+    """The clip as concatenated JPEGs (video/x-motion-jpeg), or its JSON sidecar."""
+    if evidence is None:
+        raise HTTPException(status_code=404, detail="Evidence capture is disabled")
+    path = evidence.clip_path(camera_id, clip_id, sidecar=metadata)
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="No such clip")
+    return FileResponse(path, media_type="application/json" if metadata else "video/x-motion-jpeg")
+
+# The dashboard is served from the API so its feed connections are same-origin
+if os.path.isdir(DASHBOARD_DIR):
+    app.mount("/dashboard", StaticFiles(directory=DASHBOARD_DIR, html=True), name="dashboard")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8004)
+    uvicorn.run(app, host="0.0.0.0", port=NODE_PORT)
@@ -0,0 +1,171 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+# Upper bounds (seconds) of the latency buckets, Prometheus style
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ROLLING_WINDOW_S = 60.0
+ROLLING_SLICES = 6
+ROLLING_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """Fixed-bucket latency histogram.
+
+    Keeps cumulative counts (for Prometheus rate/quantile queries) plus the
+    counts of the last `window_s` seconds in a ring of time slices, which
+    the process itself uses for rolling quantiles.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window_s=ROLLING_WINDOW_S, slices=ROLLING_SLICES):
+        self.buckets = buckets
+        self.slice_len = window_s / slices
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.slices = [[0] * (len(buckets) + 1) for _ in range(slices)]
+        self.slice_ids = [-1] * slices
+
+    def observe(self, value, now=None):
+        now = time.time() if now is None else now
+        idx = bisect.bisect_left(self.buckets, value)
+        self.counts[idx] += 1
+        self.sum += value
+        self.count += 1
+
+        slice_id = int(now // self.slice_len)
+        pos = slice_id % len(self.slices)
+        if self.slice_ids[pos] != slice_id:
+            self.slices[pos] = [0] * len(self.counts)
+            self.slice_ids[pos] = slice_id
+        self.slices[pos][idx] += 1
+
+    def rolling_counts(self, now=None):
+        now = time.time() if now is None else now
+        oldest = int(now // self.slice_len) - len(self.slices) + 1
+        totals = [0] * len(self.counts)
+        for slice_id, counts in zip(self.slice_ids, self.slices):
+            if slice_id >= oldest:
+                totals = [a + b for a, b in zip(totals, counts)]
+        return totals
+
+    def rolling_quantile(self, q, now=None):
+        """Quantile estimate over the rolling window (linear within a bucket)."""
+        counts = self.rolling_counts(now)
+        total = sum(counts)
+        if total == 0:
+            return None
+        target = q * total
+        seen = 0
+        for idx, n in enumerate(counts):
+            if n and seen + n >= target:
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                upper = self.buckets[idx] if idx < len(self.buckets) else self.buckets[-1] * 2
+                return lower + (upper - lower) * (target - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class MetricsRegistry:
+    """Per-camera stage histograms, counters and gauges in Prometheus text format."""
+
+    def __init__(self, prefix="exam"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.histograms = {}  # (camera, stage) -> RollingHistogram
+        self.counters = defaultdict(float)  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value
+        self.gauge_callbacks = []
+        self.help = {}
+
+    def observe_stage(self, camera_id, stage, seconds):
+        with self._lock:
+            hist = self.histograms.get((camera_id, stage))
+            if hist is None:
+                hist = self.histograms[(camera_id, stage)] = RollingHistogram()
+            hist.observe(seconds)
+
+    def observe_timings(self, camera_id, timings):
+        for stage, seconds in timings.items():
+            self.observe_stage(camera_id, stage, seconds)
+
+    def inc(self, name, labels=(), value=1.0, help_text=None):
+        with self._lock:
+            self.counters[(name, tuple(labels))] += value
+            if help_text:
+                self.help[name] = help_text
+
+    def set_gauge(self, name, value, labels=(), help_text=None):
+        with self._lock:
+            self.gauges[(name, tuple(labels))] = value
+            if help_text:
+                self.help[name] = help_text
+
+    def register_gauge_callback(self, callback):
+        """`callback()` returns [(name, labels, value), ...], evaluated at scrape time."""
+        self.gauge_callbacks.append(callback)
+
+    def render(self):
+        now = time.time()
+        p = self.prefix
+        lines = []
+        with self._lock:
+            if self.histograms:
+                lines.append(f"# HELP {p}_stage_seconds Per-camera processing time of each analyze_frame stage")
+                lines.append(f"# TYPE {p}_stage_seconds histogram")
+                for (camera_id, stage), hist in sorted(self.histograms.items()):
+                    base = (("camera", camera_id), ("stage", stage))
+                    cumulative = 0
+                    for bound, n in zip(hist.buckets, hist.counts):
+                        cumulative += n
+                        lines.append(f"{p}_stage_seconds_bucket{_labels(base + (('le', bound),))} {cumulative}")
+                    lines.append(f"{p}_stage_seconds_bucket{_labels(base + (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{p}_stage_seconds_sum{_labels(base)} {hist.sum:.6f}")
+                    lines.append(f"{p}_stage_seconds_count{_labels(base)} {hist.count}")
+
+                lines.append(f"# HELP {p}_stage_seconds_rolling Stage time quantiles over the last {int(ROLLING_WINDOW_S)}s")
+                lines.append(f"# TYPE {p}_stage_seconds_rolling gauge")
+                for (camera_id, stage), hist in sorted(self.histograms.items()):
+                    for q in ROLLING_QUANTILES:
+                        value = hist.rolling_quantile(q, now)
+                        if value is not None:
+                            labels = (("camera", camera_id), ("stage", stage), ("quantile", q))
+                            lines.append(f"{p}_stage_seconds_rolling{_labels(labels)} {value:.6f}")
+
+            by_name = defaultdict(list)
+            for (name, labels), value in self.counters.items():
+                by_name[name].append((labels, value))
+            for name, series in sorted(by_name.items()):
+                lines.append(f"# HELP {p}_{name} {self.help.get(name, name)}")
+                lines.append(f"# TYPE {p}_{name} counter")
+                for labels, value in sorted(series):
+                    lines.append(f"{p}_{name}{_labels(labels)} {value:g}")
+
+            gauges = dict(self.gauges)
+
+        for callback in self.gauge_callbacks:
+            try:
+                for name, labels, value in callback():
+                    gauges[(name, tuple(labels))] = value
+            except Exception as e:
+                print(f"Error collecting gauges: {e}")
+        by_name = defaultdict(list)
+        for (name, labels), value in gauges.items():
+            by_name[name].append((labels, value))
+        for name, series in sorted(by_name.items()):
+            lines.append(f"# HELP {p}_{name} {self.help.get(name, name)}")
+            lines.append(f"# TYPE {p}_{name} gauge")
+            for labels, value in sorted(series):
+                lines.append(f"{p}_{name}{_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,82 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_STACK_DEPTH = 64
+
+
+class SamplingProfiler:
+    """On-demand statistical profiler for the threads of this process.
+
+    While running, a background thread snapshots every thread's stack every
+    `interval` seconds and counts collapsed stacks ("a;b;c N", the format
+    flamegraph tools read). Nothing runs while it is off.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self.interval = 0.0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds, interval=0.005):
+        """Sample for `seconds`; returns False if a session is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self.stacks = Counter()
+            self.samples = 0
+            self.started_at = time.time()
+            self.duration = seconds
+            self.interval = interval
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + self.duration
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                parts = []
+                while frame is not None and len(parts) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                parts.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+
+    def report(self, limit=None):
+        """Collapsed stacks, most frequent first."""
+        lines = [f"{stack} {count}" for stack, count in self.stacks.most_common(limit)]
+        return "\n".join(lines) + "\n"
+
+    def status(self):
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "duration_s": self.duration,
+            "interval_ms": self.interval * 1000.0,
+            "samples": self.samples,
+            "distinct_stacks": len(self.stacks),
+        }
@@ -0,0 +1,32 @@
+import struct
+
+# Each frame on a streaming connection is a 4-byte big-endian length followed
+# by that many bytes of JPEG data. A WebSocket binary message may carry one or
+# several such frames.
+HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def pack_frame(jpeg_bytes):
+    return HEADER.pack(len(jpeg_bytes)) + jpeg_bytes
+
+
+def unpack_frames(payload):
+    """Split a binary message into its length-prefixed frames (zero-copy views)."""
+    view = memoryview(payload)
+    offset = 0
+    frames = []
+    while offset < len(view):
+        if offset + HEADER.size > len(view):
+            raise ProtocolError("Truncated frame header")
+        (length,) = HEADER.unpack_from(view, offset)
+        offset += HEADER.size
+        if length > MAX_FRAME_BYTES or offset + length > len(view):
+            raise ProtocolError(f"Invalid frame length: {length}")
+        frames.append(view[offset:offset + length])
+        offset += length
+    return frames
@@ -13,6 +13,11 @@ YOLO_MODEL_PATH = os.path.join(MODELS_DIR, "yolov8", "yolov8n.pt")  # Default we
 # Detection Settings
 PROHIBITED_OBJECTS = ["cell phone", "paper", "chit"]
 DETECTION_THRESHOLD = 0.5
+DETECTOR_BACKEND = "ultralytics"  # "ultralytics" (PyTorch), "onnx" or "openvino"
+ONNX_MODEL_PATH = os.path.join(MODELS_DIR, "yolov8", "yolov8n.onnx")  # From scripts/export_detector.py (or yolov8n.int8.onnx)
+DETECTOR_INPUT_SIZE = 640  # Square network input; 416 or 320 is much cheaper on CPU
+DETECTOR_NMS_IOU = 0.45
+DETECTOR_THREADS = 0  # Intra-op threads for onnx/openvino (0 = runtime default)
 
 # Malpractice Scoring Weights
 WEIGHTS = {
@@ -23,10 +28,119 @@ WEIGHTS = {
     "natural_movement_threshold": 0.2
 }
 
+# Pose Analysis
+POSE_MODE = "roi"  # "roi": per-student regions, "frame": single full-frame pose
+POSE_ROI_MAX_SIDE = 256  # ROIs are downscaled to this size before pose
+POSE_ROI_MODEL_COMPLEXITY = 0
+POSE_MAX_TRACKED_ROIS = 256  # Per-student pose trackers kept per process, shared by its worker threads (LRU)
+
 # Monitoring Parameters
 FPS_TARGET = 10
 MAX_STUDENTS_PER_CAMERA = 60
 TEMPORAL_WINDOW_SIZE = 30  # Number of frames for smoothing
+TEMPORAL_MODE = "frames"  # "frames", "seconds" or "decay"
+TEMPORAL_WINDOW_SECONDS = 3.0  # Window length in "seconds" mode
+TEMPORAL_DECAY_HALF_LIFE_S = 2.0  # Half-life in "decay" mode
+STUDENT_TTL_SECONDS = 600  # Evict scoring state of students idle this long
+
+# Face Identity Tracking (skip re-identification of seated students)
+TRACKING_ENABLED = True
+TRACK_IOU_THRESHOLD = 0.3
+TRACK_REID_INTERVAL_S = 5.0  # Periodic re-check of identified tracks (face re-ID at 0.2 fps)
+TRACK_UNKNOWN_RETRY_S = 1.0  # Faster retry for tracks still "Unknown"
+TRACK_MAX_MISSES = 5  # Frames a track survives without a matching face
+TRACK_CAMERA_TTL_S = 300  # Drop all tracks of a camera idle this long
+
+# Frame decoding
+ANALYSIS_MAX_SIDE = 1280  # Larger frames are decoded at 1/2, 1/4 or 1/8 scale (long side kept >= this); 0 = full size
+
+# Adaptive Inference Scheduling (motion gating + per-stage rates)
+ADAPTIVE_SCHEDULING_ENABLED = True
+STAGE_RATES = {"face": 5.0, "detection": 5.0, "pose": 10.0}  # Max runs per second per camera
+MAX_STAGE_STALENESS_S = 10.0  # Every stage runs at least this often, motion or not
+MOTION_DOWNSCALE_WIDTH = 160
+MOTION_PIXEL_THRESHOLD = 12  # Gray-level difference counted as change
+MOTION_MIN_FRACTION = 0.002  # Changed pixel fraction that marks the frame as changed
+MOTION_REGION_MIN_FRACTION = 0.01  # Same, inside one student's region
+SUSPICIOUS_RISK_LEVELS = ("Mildly Suspicious", "High Risk", "Malpractice Confirmed")  # Boosted to full rate
+
+# Batched Detection (micro-batching across concurrent requests)
+BATCH_INFERENCE_ENABLED = True
+BATCH_MAX_SIZE = 8
+BATCH_MAX_WAIT_MS = 15  # Max time the first frame in a batch waits for others
+BATCH_RESULT_TIMEOUT_S = 30.0  # A worker thread gives up on its batched detections after this long
+
+# Inference Worker Pool
+WORKER_POOL_MODE = "thread"  # "thread" or "process"
+WORKER_POOL_SIZE = 8  # Keep >= BATCH_MAX_SIZE in thread mode so batches can fill
+MAX_PENDING_FRAMES_PER_CAMERA = 1  # Older pending frames are dropped beyond this
+
+# Server-side Camera Pull Mode (RTSP / video files)
+CAMERA_REGISTRY_PATH = os.path.join(DATA_DIR, "cameras.json")
+PULL_MODE_ENABLED = True  # Start enabled registry cameras at startup
+
+# Cluster: cameras sharded across nodes by consistent hashing
+COORDINATOR_URL = os.environ.get("EXAM_COORDINATOR_URL", "")  # Empty = standalone node
+CLUSTER_ENABLED = bool(COORDINATOR_URL)
+NODE_PORT = int(os.environ.get("EXAM_API_PORT", "8004"))  # Port this node's API listens on
+# One ring member per advertised URL: run a single uvicorn worker per node, or give each
+# worker its own port and EXAM_NODE_URL, so redirects to another node never land here again
+NODE_ID = os.environ.get("EXAM_NODE_ID", "")  # Defaults to the host:port of NODE_URL
+NODE_URL = os.environ.get("EXAM_NODE_URL", "")  # How clients reach this node; defaults to http://<hostname>:<port>
+COORDINATOR_PORT = 8010
+CLUSTER_VIRTUAL_NODES = 64  # Ring points per node; more = more even camera split
+CLUSTER_HEARTBEAT_INTERVAL_S = 2.0
+CLUSTER_NODE_TTL_S = 10.0  # Nodes silent this long are removed and their cameras reassigned
+CLUSTER_CHECKPOINT_INTERVAL_S = 5.0  # Scoring state of owned cameras saved this often
+CLUSTER_HANDOFF_TIMEOUT_S = 6.0  # New owner waits this long for the previous owner's final save
+STATE_STORE_BACKEND = "file"  # "memory" (single node), "file" (shared directory) or "http" (via coordinator)
+STATE_STORE_DIR = os.path.join(DATA_DIR, "cluster_state")
+
+# Event log (risk transitions and detections, SQLite WAL)
+EVENT_LOG_ENABLED = True
+EVENT_LOG_PATH = os.path.join(DATA_DIR, "events.db")
+EVENT_LOG_QUEUE_SIZE = 10000  # Events waiting for the writer; beyond this new events are dropped
+EVENT_LOG_BATCH_SIZE = 500  # Events per write transaction
+EVENT_LOG_FLUSH_INTERVAL_S = 0.5
+EVENT_DETECTION_MIN_INTERVAL_S = 5.0  # Repeat detections of one item per student are logged at most this often
+
+# Evidence clips (pre-roll of received JPEGs, saved on risk escalation)
+EVIDENCE_ENABLED = True
+EVIDENCE_DIR = os.path.join(DATA_DIR, "evidence")
+EVIDENCE_PRE_SECONDS = 10.0
+EVIDENCE_POST_SECONDS = 5.0
+EVIDENCE_MAX_CLIP_SECONDS = 60.0  # Repeated triggers extend an open clip up to this length
+EVIDENCE_BUFFER_MAX_MB = 512  # Shared by the pre-roll buffers of all cameras
+EVIDENCE_TRIGGER_LEVELS = ("High Risk", "Malpractice Confirmed")
+EVIDENCE_STUDENT_COOLDOWN_S = 60.0  # At most one clip trigger per student per interval
+EVIDENCE_WRITER_QUEUE = 32
+EVIDENCE_PULL_JPEG_QUALITY = 80  # Pulled cameras deliver raw frames, which are encoded for the buffer
+
+# Live results feed (dashboard WebSocket/SSE)
+FEED_MAX_PENDING = 8  # Queued messages per client before its backlog is replaced by a snapshot
+FEED_SCORE_EPSILON = 0.05  # Smaller score changes (same risk level) are not pushed
+FEED_STUDENT_TTL_S = 30.0  # Students unseen this long are removed from the hall
+FEED_KEEPALIVE_S = 15.0
+DASHBOARD_DIR = os.path.join(BASE_DIR, "dashboard")
+
+# Result cache (repeated frames reuse the last analysis; scoring still runs per frame)
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_TTL_S = 2.0  # A cached analysis is reused at most this long after it was computed
+RESULT_CACHE_MAX_ENTRIES = 4  # Per camera (LRU)
+RESULT_CACHE_PERCEPTUAL = False  # Also match decoded frames by perceptual hash (in the workers)
+RESULT_CACHE_PHASH_SIZE = 16  # Hash grid side; 16 = 256-bit difference hash
+RESULT_CACHE_PHASH_MAX_DISTANCE = 0  # Differing hash bits still treated as the same frame
+
+# Offline analysis of recorded exams (analyze_recordings.py)
+OFFLINE_WORK_DIR = os.path.join(DATA_DIR, "offline")  # Per-video chunk results, kept for resuming
+OFFLINE_CHUNK_SECONDS = 120.0  # Video length handed to a worker as one job
+OFFLINE_FRAME_STRIDE = 0  # Analyze every Nth frame; 0 = sample at FPS_TARGET
+OFFLINE_WORKERS = 0  # Worker processes; 0 = one per CPU core
+
+# Startup
+MODEL_PRELOAD_ENABLED = True  # Load models in the background at startup (otherwise on first frame)
+MODEL_WARMUP_ENABLED = True  # Run one blank-frame inference per worker before reporting ready
+WARMUP_BARRIER_TIMEOUT_S = 300.0  # Thread mode: how long a warmed thread waits for the others to start
 
 # API Settings
 API_HOST = "0.0.0.0"
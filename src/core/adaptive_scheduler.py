@@ -0,0 +1,133 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from src.config import (
+    STAGE_RATES, MAX_STAGE_STALENESS_S, MOTION_DOWNSCALE_WIDTH, MOTION_PIXEL_THRESHOLD,
+    MOTION_MIN_FRACTION, MOTION_REGION_MIN_FRACTION, TRACK_CAMERA_TTL_S, MAX_STUDENTS_PER_CAMERA,
+)
+from src.core.frame_context import FrameContext
+
+
+class MotionGate:
+    """Cheap change detector on a downscaled, blurred grayscale copy of the frame."""
+
+    def __init__(self, width=MOTION_DOWNSCALE_WIDTH, threshold=MOTION_PIXEL_THRESHOLD):
+        self.width = width
+        self.threshold = threshold
+
+    def prepare(self, frame):
+        ctx = FrameContext.wrap(frame)
+        small = ctx.downscaled(self.width)
+        scale = small.shape[1] / float(ctx.shape[1])
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0), scale
+
+    def diff(self, previous, current):
+        """Boolean change mask between two prepared frames (None if shapes differ)."""
+        if previous is None or previous.shape != current.shape:
+            return None
+        return cv2.absdiff(previous, current) > self.threshold
+
+
+class CameraSchedule:
+    """Per-camera scheduling state for one frame: which stages and regions to run."""
+
+    def __init__(self):
+        self.reference = None
+        self.mask = None
+        self.scale = 1.0
+        self.changed_fraction = 1.0
+        self.last_run = {}
+        self.dirty = {}
+        self.region_last_run = {}
+        self.region_dirty = {}
+        self.cache = {}  # Last results of each stage, reused when it is skipped
+        self.last_seen = 0.0
+        self.now = 0.0
+
+    def should_run(self, stage, boosted=False):
+        """Run when boosted, never run, stale, or due by rate with changes since the last run."""
+        last = self.last_run.get(stage)
+        if boosted or last is None or self.now - last >= MAX_STAGE_STALENESS_S:
+            return True
+        rate = STAGE_RATES.get(stage)
+        due = not rate or self.now - last >= 1.0 / rate
+        return due and self.dirty.get(stage, True)
+
+    def mark_run(self, stage):
+        self.last_run[stage] = self.now
+        self.dirty[stage] = False
+
+    def region_changed(self, box):
+        """Fraction of changed pixels inside an (x1, y1, x2, y2) box of the full frame."""
+        if self.mask is None:
+            return 1.0
+        h, w = self.mask.shape
+        x1, y1, x2, y2 = (int(v * self.scale) for v in box)
+        region = self.mask[max(0, y1):min(h, y2 + 1), max(0, x1):min(w, x2 + 1)]
+        return float(region.mean()) if region.size else 0.0
+
+    def region_should_run(self, key, box, stage="pose", boosted=False):
+        if self.region_changed(box) >= MOTION_REGION_MIN_FRACTION:
+            self.region_dirty[key] = True
+        last = self.region_last_run.get(key)
+        if boosted or last is None or self.now - last >= MAX_STAGE_STALENESS_S:
+            return True
+        rate = STAGE_RATES.get(stage)
+        due = not rate or self.now - last >= 1.0 / rate
+        return due and self.region_dirty.get(key, True)
+
+    def mark_region_run(self, key):
+        self.region_last_run[key] = self.now
+        self.region_dirty[key] = False
+
+    def prune_regions(self, max_age):
+        """Forget regions (and their cached results) not run for `max_age` seconds."""
+        region_cache = self.cache.get("regions", {})
+        for key in [k for k, t in self.region_last_run.items() if self.now - t > max_age]:
+            del self.region_last_run[key]
+            self.region_dirty.pop(key, None)
+            region_cache.pop(key, None)
+
+
+class AdaptiveScheduler:
+    """Motion gating plus per-stage frame rates for each camera.
+
+    Expensive stages are skipped (and their last results reused) when nothing
+    changed in the frame or region since they last ran, and otherwise run at
+    most at their STAGE_RATES rate. Boosted (suspicious) students run at full
+    rate. Every stage is refreshed at least every MAX_STAGE_STALENESS_S.
+    """
+
+    def __init__(self, motion_gate=None, camera_ttl=TRACK_CAMERA_TTL_S):
+        self.motion_gate = motion_gate or MotionGate()
+        self.camera_ttl = camera_ttl
+        self.cameras = {}
+        self._lock = threading.Lock()
+
+    def begin_frame(self, camera_id, frame, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            for stale_id in [c for c, s in self.cameras.items() if now - s.last_seen > self.camera_ttl]:
+                del self.cameras[stale_id]
+            schedule = self.cameras.setdefault(camera_id, CameraSchedule())
+        schedule.now = now
+        schedule.last_seen = now
+        if len(schedule.region_last_run) > 2 * MAX_STUDENTS_PER_CAMERA:
+            schedule.prune_regions(MAX_STAGE_STALENESS_S)
+
+        prepared, schedule.scale = self.motion_gate.prepare(frame)
+        schedule.mask = self.motion_gate.diff(schedule.reference, prepared)
+        schedule.reference = prepared
+        schedule.changed_fraction = 1.0 if schedule.mask is None else float(np.mean(schedule.mask))
+        if schedule.changed_fraction >= MOTION_MIN_FRACTION:
+            for stage in STAGE_RATES:
+                schedule.dirty[stage] = True
+        return schedule
+
+    def drop_camera(self, camera_id):
+        with self._lock:
+            self.cameras.pop(camera_id, None)
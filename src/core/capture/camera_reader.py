@@ -0,0 +1,106 @@
+import threading
+import time
+
+import cv2
+
+from src.config import FPS_TARGET
+
+RECONNECT_DELAY_S = 2.0
+
+
+class CameraReader(threading.Thread):
+    """Dedicated reader for one camera source (RTSP URL, device index or video file).
+
+    Every frame is grabbed so the capture buffer never falls behind, but only
+    frames sampled at `fps_target` are decoded (`retrieve`). Only the latest
+    decoded frame is kept; consumers that fall behind simply skip frames.
+    """
+
+    def __init__(self, camera_id, source, fps_target=FPS_TARGET, loop_video=True):
+        super().__init__(name=f"camera-{camera_id}", daemon=True)
+        self.camera_id = camera_id
+        self.source = int(source) if str(source).isdigit() else source
+        self.frame_interval = 1.0 / fps_target if fps_target else 0.0
+        self.loop_video = loop_video
+        self.is_file = isinstance(self.source, str) and "://" not in self.source
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._frame = None
+        self._seq = 0
+        self._timestamp = 0.0
+        self.frames_grabbed = 0
+        self.frames_decoded = 0
+        self.connected = False
+
+    def latest(self):
+        """Return (seq, timestamp, frame) of the newest decoded frame."""
+        with self._lock:
+            return self._seq, self._timestamp, self._frame
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        if cap.isOpened():
+            # Keep the driver-side queue minimal so grabs return fresh frames
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def run(self):
+        while not self._stop_event.is_set():
+            cap = self._open()
+            self.connected = cap.isOpened()
+            if not self.connected:
+                print(f"Camera {self.camera_id}: could not open {self.source}")
+                self._stop_event.wait(RECONNECT_DELAY_S)
+                continue
+            try:
+                self._read_loop(cap)
+            finally:
+                cap.release()
+                self.connected = False
+            if self.is_file and not self.loop_video:
+                break
+
+    def _read_loop(self, cap):
+        # Video files are paced at their native rate; live sources pace themselves
+        source_fps = cap.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        source_interval = 1.0 / source_fps if source_fps and source_fps > 0 else 0.0
+        next_decode = 0.0
+        next_grab = time.monotonic()
+
+        while not self._stop_event.is_set():
+            if not cap.grab():
+                if not self.is_file:
+                    print(f"Camera {self.camera_id}: stream lost, reconnecting")
+                return
+            self.frames_grabbed += 1
+            now = time.monotonic()
+
+            if now >= next_decode:
+                ok, frame = cap.retrieve()
+                if ok:
+                    self.frames_decoded += 1
+                    with self._lock:
+                        self._frame = frame
+                        self._seq += 1
+                        self._timestamp = time.time()
+                next_decode = now + self.frame_interval
+
+            if source_interval:
+                next_grab += source_interval
+                delay = next_grab - time.monotonic()
+                if delay > 0:
+                    self._stop_event.wait(delay)
+                else:
+                    next_grab = time.monotonic()
+
+    def stats(self):
+        return {
+            "source": str(self.source),
+            "connected": self.connected,
+            "frames_grabbed": self.frames_grabbed,
+            "frames_decoded": self.frames_decoded,
+        }
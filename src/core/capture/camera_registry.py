@@ -0,0 +1,39 @@
+import json
+import os
+
+from src.config import CAMERA_REGISTRY_PATH
+
+
+class CameraRegistry:
+    """Camera sources the backend pulls from, persisted as JSON.
+
+    Each entry: {"camera_id": ..., "source": RTSP URL / file / device index,
+    "session_id": optional exam session, "enabled": bool}.
+    """
+
+    def __init__(self, path=CAMERA_REGISTRY_PATH):
+        self.path = path
+        self.cameras = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                for entry in json.load(f):
+                    self.cameras[entry["camera_id"]] = entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(list(self.cameras.values()), f, indent=2)
+
+    def add(self, camera_id, source, session_id=None, enabled=True):
+        entry = {"camera_id": camera_id, "source": source, "session_id": session_id, "enabled": enabled}
+        self.cameras[camera_id] = entry
+        self.save()
+        return entry
+
+    def remove(self, camera_id):
+        entry = self.cameras.pop(camera_id, None)
+        self.save()
+        return entry
+
+    def enabled(self):
+        return [entry for entry in self.cameras.values() if entry.get("enabled", True)]
@@ -0,0 +1,53 @@
+import bisect
+import hashlib
+
+from src.config import CLUSTER_VIRTUAL_NODES
+
+
+def _hash(key):
+    # Stable across processes and hosts (unlike the built-in hash())
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing of camera ids onto nodes.
+
+    Each node is placed at `vnodes` points on the ring; a camera belongs to
+    the first node point after its own hash. Adding or removing a node only
+    moves the cameras of the ring segments it gains or loses (about 1/N of
+    them), and every member that knows the same node list computes the same
+    owners.
+    """
+
+    def __init__(self, nodes=(), vnodes=CLUSTER_VIRTUAL_NODES):
+        self.vnodes = vnodes
+        self.nodes = set()
+        self._points = []
+        self._owners = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node_id):
+        if node_id in self.nodes:
+            return
+        self.nodes.add(node_id)
+        for i in range(self.vnodes):
+            point = _hash(f"{node_id}#{i}")
+            idx = bisect.bisect(self._points, point)
+            self._points.insert(idx, point)
+            self._owners.insert(idx, node_id)
+
+    def remove(self, node_id):
+        if node_id not in self.nodes:
+            return
+        self.nodes.discard(node_id)
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node_id]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def owner(self, key):
+        """Node owning `key`, or None for an empty ring."""
+        if not self._points:
+            return None
+        idx = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[idx]
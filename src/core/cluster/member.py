@@ -0,0 +1,194 @@
+import asyncio
+import time
+
+from src.config import CLUSTER_HEARTBEAT_INTERVAL_S, CLUSTER_CHECKPOINT_INTERVAL_S, CLUSTER_HANDOFF_TIMEOUT_S
+from src.core.cluster.hash_ring import HashRing
+
+HANDOFF_POLL_INTERVAL_S = 0.25
+
+
+def state_key(camera_id):
+    return f"camera:{camera_id}"
+
+
+class ClusterMember:
+    """This node's view of the cluster and the handoff of per-camera scoring state.
+
+    The node heartbeats to the coordinator and gets the current node list
+    back; every node builds the same HashRing from it, so camera ownership
+    needs no further coordination. The scoring state of the students of each
+    owned camera is checkpointed to the shared StateStore, saved when a
+    camera moves to another node and loaded when a camera arrives.
+
+    Checkpoints record the saving node and whether it released the camera,
+    so an arriving camera waits for its previous owner's final save instead
+    of starting from an older periodic checkpoint.
+    """
+
+    def __init__(self, node_id, node_url, coordinator_url, store, engine, on_change=None):
+        self.node_id = node_id
+        self.node_url = node_url
+        self.coordinator_url = coordinator_url.rstrip("/")
+        self.store = store
+        self.engine = engine
+        # Called after cluster membership changes (e.g. to start/stop pulled cameras)
+        self.on_change = on_change
+        self.ring = HashRing()
+        self.node_urls = {}
+        self.version = None
+        self.cameras = {}  # owned camera_id -> student ids scored here
+        self._loading = {}  # camera_id -> task loading its handed-over state
+        self.handoffs_in = 0
+        self.handoffs_out = 0
+        self.last_heartbeat = None
+        self._session = None
+        self._stop = asyncio.Event()
+
+    def owner(self, camera_id):
+        """Owning node id; this node until the first heartbeat succeeded."""
+        return self.ring.owner(camera_id) or self.node_id
+
+    def owns(self, camera_id):
+        return self.owner(camera_id) == self.node_id
+
+    def owner_url(self, camera_id):
+        return self.node_urls.get(self.owner(camera_id), self.node_url)
+
+    async def ensure_loaded(self, camera_id):
+        """Load the camera's scoring state the first time this node scores it.
+
+        Returns False, without loading, once the camera belongs to another node.
+        """
+        if not self.owns(camera_id):
+            return False
+        if camera_id in self.cameras:
+            return True
+        loading = self._loading.get(camera_id)
+        if loading is None:
+            loading = self._loading[camera_id] = asyncio.get_running_loop().create_task(self._load(camera_id))
+        await loading
+        return self.owns(camera_id)
+
+    async def _load(self, camera_id):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + CLUSTER_HANDOFF_TIMEOUT_S
+        try:
+            while True:
+                state = await loop.run_in_executor(None, self.store.get, state_key(camera_id))
+                previous = state.get("owner") if state else None
+                # Nothing newer will come once the previous owner released the camera or left
+                if (not state or state.get("released") or previous == self.node_id
+                        or previous not in self.node_urls or loop.time() >= deadline):
+                    break
+                await asyncio.sleep(HANDOFF_POLL_INTERVAL_S)
+        except Exception as e:
+            print(f"Error loading state of {camera_id}: {e}")
+            state = None
+        finally:
+            self._loading.pop(camera_id, None)
+        if not self.owns(camera_id):
+            # Moved away while loading; the new owner loads the same state
+            return
+        self.cameras[camera_id] = set()
+        if state:
+            self.engine.import_state(state)
+            self.cameras[camera_id].update(state.get("students", {}))
+            self.handoffs_in += 1
+
+    def note_students(self, camera_id, student_ids):
+        if not self.owns(camera_id):
+            # A frame scored after the camera was released must not bring it back
+            return
+        # "Unknown" shares one engine slot across cameras, so it is never handed off
+        self.cameras.setdefault(camera_id, set()).update(sid for sid in student_ids if sid != "Unknown")
+
+    async def checkpoint(self, camera_ids=None, released=False):
+        camera_ids = list(self.cameras) if camera_ids is None else camera_ids
+        # Only a final save may cover a camera that moved away; anything else would
+        # overwrite the new owner's state
+        camera_ids = [cid for cid in camera_ids if cid in self.cameras and (released or self.owns(cid))]
+        # Snapshot on the event loop (which owns the engine); write in a thread
+        saved_at = time.time()
+        states = {
+            cid: dict(self.engine.export_state(self.cameras.get(cid, ())),
+                      owner=self.node_id, released=released, saved_at=saved_at)
+            for cid in camera_ids
+        }
+        loop = asyncio.get_running_loop()
+        for camera_id, state in states.items():
+            try:
+                await loop.run_in_executor(None, self.store.put, state_key(camera_id), state)
+            except Exception as e:
+                print(f"Error saving state of {camera_id}: {e}")
+
+    async def release(self, camera_id):
+        """Hand a camera over: save its state and forget it locally."""
+        await self.checkpoint([camera_id], released=True)
+        self.engine.drop(self.cameras.pop(camera_id, ()))
+        self.handoffs_out += 1
+
+    async def apply_membership(self, version, nodes):
+        """Rebuild the ring from {node_id: url} and release cameras that moved away."""
+        self.version = version
+        self.node_urls = dict(nodes)
+        self.ring = HashRing(sorted(nodes))
+        for camera_id in [cid for cid in self.cameras if not self.owns(cid)]:
+            await self.release(camera_id)
+        if self.on_change is not None:
+            self.on_change()
+
+    def _heartbeat(self):
+        import requests
+        if self._session is None:
+            self._session = requests.Session()
+        response = self._session.post(
+            f"{self.coordinator_url}/nodes/{self.node_id}/heartbeat",
+            json={"url": self.node_url}, timeout=5.0,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        last_checkpoint = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                membership = await loop.run_in_executor(None, self._heartbeat)
+                self.last_heartbeat = time.time()
+                if membership["version"] != self.version:
+                    await self.apply_membership(membership["version"], membership["nodes"])
+            except Exception as e:
+                # Keep serving with the last known ring until the coordinator is back
+                print(f"Cluster heartbeat failed: {e}")
+            if time.monotonic() - last_checkpoint >= CLUSTER_CHECKPOINT_INTERVAL_S:
+                last_checkpoint = time.monotonic()
+                await self.checkpoint()
+            try:
+                await asyncio.wait_for(self._stop.wait(), CLUSTER_HEARTBEAT_INTERVAL_S)
+            except asyncio.TimeoutError:
+                pass
+
+    async def leave(self):
+        """Graceful shutdown: save every camera and deregister so others take over at once."""
+        self._stop.set()
+        await self.checkpoint(released=True)
+        if self._session is not None:
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: self._session.delete(f"{self.coordinator_url}/nodes/{self.node_id}", timeout=5.0)
+                )
+            except Exception as e:
+                print(f"Error leaving cluster: {e}")
+
+    def stats(self):
+        return {
+            "node_id": self.node_id,
+            "node_url": self.node_url,
+            "coordinator": self.coordinator_url,
+            "membership_version": self.version,
+            "nodes": self.node_urls,
+            "owned_cameras": sorted(self.cameras),
+            "handoffs_in": self.handoffs_in,
+            "handoffs_out": self.handoffs_out,
+            "last_heartbeat": self.last_heartbeat,
+        }
@@ -0,0 +1,125 @@
+import json
+import os
+import re
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from urllib.parse import quote
+
+from src.config import STATE_STORE_BACKEND, STATE_STORE_DIR, COORDINATOR_URL
+
+
+class StateStore(ABC):
+    """Key -> JSON document store used to hand scoring state between nodes."""
+
+    @abstractmethod
+    def get(self, key):
+        """The stored document, or None."""
+
+    @abstractmethod
+    def put(self, key, value):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+
+class InMemoryStateStore(StateStore):
+    """Process-local store (single node, or the coordinator's backing store)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+        # Copy so callers never share mutable state with the store
+        return None if value is None else json.loads(value)
+
+    def put(self, key, value):
+        encoded = json.dumps(value)
+        with self._lock:
+            self._data[key] = encoded
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class LocalFileStateStore(StateStore):
+    """One JSON file per key in a directory shared by the nodes (local disk or NFS)."""
+
+    def __init__(self, directory=STATE_STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", key) + ".json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            print(f"Ignoring unreadable state {key}: {e}")
+            return None
+
+    def put(self, key, value):
+        # Write to a temp file and rename so readers never see a partial document
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class HttpStateStore(StateStore):
+    """The coordinator's /state endpoints, for nodes on different hosts without shared disk."""
+
+    def __init__(self, base_url=COORDINATOR_URL, timeout=5.0):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _url(self, key):
+        return f"{self.base_url}/state/{quote(key, safe='')}"
+
+    def get(self, key):
+        response = self.session.get(self._url(key), timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def put(self, key, value):
+        self.session.put(self._url(key), json=value, timeout=self.timeout).raise_for_status()
+
+    def delete(self, key):
+        self.session.delete(self._url(key), timeout=self.timeout).raise_for_status()
+
+
+STATE_STORES = {
+    "memory": InMemoryStateStore,
+    "file": LocalFileStateStore,
+    "http": HttpStateStore,
+}
+
+
+def create_state_store(backend=STATE_STORE_BACKEND):
+    if backend not in STATE_STORES:
+        raise ValueError(f"Unknown state store backend: {backend}")
+    return STATE_STORES[backend]()
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+
+logger = logging.getLogger("exam_monitor.batching")
+
+
+class BatchScheduler:
+    """Micro-batching front end for ObjectDetector.
+
+    Concurrent requests submit single frames; the scheduler groups them into
+    batches of up to `max_batch_size` frames, waiting at most `max_wait_ms`
+    after the first frame arrives, and runs one batched model call per batch.
+    With `detector_factory` instead of a detector, the model is built on the
+    batching thread when first needed (or by warm_up()).
+    """
+
+    def __init__(self, detector=None, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                 detector_factory=None):
+        if detector is None and detector_factory is None:
+            raise ValueError("BatchScheduler needs a detector or a detector_factory")
+        self.detector = detector
+        self.detector_factory = detector_factory
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        # Single thread so the model never runs two batches concurrently
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo-batch")
+        self.queue = None
+        self._task = None
+        self._batch = []  # items of the batch being inferred
+        self._stopped = False
+
+        # Stats
+        self.batch_size_hist = Counter()
+        self.queue_depth_hist = Counter()
+        self.max_queue_depth = 0
+        self.frames_processed = 0
+        self.total_wait = 0.0
+        self.total_inference = 0.0
+
+    def start(self):
+        """Start the batching loop on the running event loop."""
+        if self._task is None:
+            self.queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop batching and fail every frame still waiting, so no caller blocks forever."""
+        self._stopped = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending = list(self._batch)
+        self._batch = []
+        while self.queue is not None and not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Batch scheduler stopped"))
+        self.executor.shutdown(wait=False)
+
+    def _load(self):
+        if self.detector is None:
+            self.detector = self.detector_factory()
+        return self.detector
+
+    def _detect(self, frames):
+        return self._load().detect_prohibited_items_batch(frames)
+
+    async def warm_up(self, frame=None):
+        """Load the model now; with a frame, also run one inference so the first batch isn't slow."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._load)
+        if frame is not None:
+            await loop.run_in_executor(self.executor, self._detect, [frame])
+
+    async def submit(self, frame):
+        """Queue a frame and wait for its detections."""
+        if self._stopped:
+            raise RuntimeError("Batch scheduler stopped")
+        if self._task is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((frame, future, time.perf_counter()))
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return await future
+
+    async def _collect_batch(self):
+        # Collected items live in self._batch so stop() can fail them while we wait for stragglers
+        self._batch = batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued before waiting for stragglers
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            # Requests whose caller went away don't need inference
+            self._batch = batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            self.queue_depth_hist[self.queue.qsize()] += 1
+            self.batch_size_hist[len(batch)] += 1
+            started = time.perf_counter()
+            self.total_wait += sum(started - queued_at for _, _, queued_at in batch)
+
+            frames = [frame for frame, _, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self._detect, frames
+                )
+            except Exception as e:
+                self._batch = []
+                logger.exception("Error in batched detection (%d frames)", len(frames))
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self._batch = []
+            self.total_inference += time.perf_counter() - started
+            self.frames_processed += len(batch)
+            for (_, future, _), detections in zip(batch, results):
+                if not future.done():
+                    future.set_result(detections)
+
+    def stats(self):
+        """Queue depth and batch-size histograms for tuning latency vs throughput."""
+        batches = sum(self.batch_size_hist.values())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "batches": batches,
+            "frames": self.frames_processed,
+            "avg_batch_size": self.frames_processed / batches if batches else 0.0,
+            "avg_queue_wait_ms": 1000.0 * self.total_wait / self.frames_processed if self.frames_processed else 0.0,
+            "avg_batch_inference_ms": 1000.0 * self.total_inference / batches if batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_size_hist.items())),
+            "queue_depth_histogram": dict(sorted(self.queue_depth_hist.items())),
+        }
@@ -0,0 +1,161 @@
+import json
+import os
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+from src.config import DETECTION_THRESHOLD, DETECTOR_NMS_IOU, DETECTOR_THREADS
+
+LETTERBOX_FILL = 114
+
+
+def load_model_info(model_path):
+    """Class names and export settings written next to an exported model by scripts/export_detector.py."""
+    info_path = os.path.splitext(model_path)[0] + ".json"
+    with open(info_path) as f:
+        info = json.load(f)
+    info["names"] = {int(k): v for k, v in info["names"].items()}
+    return info
+
+
+def letterbox(frame, size):
+    """Resize keeping the aspect ratio and pad to size x size; returns (image, scale, (pad_x, pad_y))."""
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    canvas = np.full((size, size, 3), LETTERBOX_FILL, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+    return canvas, scale, (pad_x, pad_y)
+
+
+class UltralyticsBackend:
+    """The original PyTorch path through ultralytics' YOLO wrapper."""
+
+    def __init__(self, model_path, input_size, labels):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+        self.input_size = input_size
+        # Restricting classes makes ultralytics drop the rest before NMS
+        self.class_ids = [i for i, name in self.names.items() if name in labels]
+
+    def detect(self, frames):
+        results = self.model(
+            list(frames), conf=DETECTION_THRESHOLD, imgsz=self.input_size,
+            classes=self.class_ids, verbose=False,
+        )
+        batch = []
+        for result in results:
+            detections = []
+            for box in result.boxes:
+                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                detections.append({
+                    "label": self.names[int(box.cls[0])],
+                    "confidence": float(box.conf[0]),
+                    "bbox": (x1, y1, x2, y2),
+                })
+            batch.append(detections)
+        return batch
+
+
+class ExportedYoloBackend(ABC):
+    """Shared pre/post-processing for YOLOv8 models exported to ONNX.
+
+    The raw output is (batch, 4 + classes, anchors) with cx, cy, w, h boxes.
+    Only the columns of the wanted classes are scored, so NMS runs on the
+    few boxes that can actually be reported.
+    """
+
+    def __init__(self, model_path, input_size, labels):
+        info = load_model_info(model_path)
+        self.names = info["names"]
+        self.input_size = input_size or info.get("input_size", 640)
+        self.class_ids = np.array([i for i, name in self.names.items() if name in labels], dtype=np.int64)
+
+    @abstractmethod
+    def _infer(self, batch):
+        """Run the network on an NCHW float32 batch; returns the raw (batch, 4 + classes, anchors) output."""
+
+    def detect(self, frames):
+        letterboxed = [letterbox(frame, self.input_size) for frame in frames]
+        batch = np.stack([img for img, _, _ in letterboxed])
+        # BGR HWC uint8 -> RGB NCHW float32 in [0, 1]
+        batch = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        outputs = self._infer(batch)
+        return [
+            self._postprocess(output, scale, pad, frame.shape)
+            for output, (_, scale, pad), frame in zip(outputs, letterboxed, frames)
+        ]
+
+    def _postprocess(self, output, scale, pad, frame_shape):
+        if not len(self.class_ids):
+            return []
+        class_scores = output[4 + self.class_ids]  # (wanted classes, anchors)
+        best = class_scores.argmax(axis=0)
+        confidences = class_scores[best, np.arange(class_scores.shape[1])]
+        keep = confidences >= DETECTION_THRESHOLD
+        if not keep.any():
+            return []
+        cx, cy, w, h = output[:4, keep]
+        confidences, labels = confidences[keep], self.class_ids[best[keep]]
+
+        boxes = np.stack([cx - w / 2, cy - h / 2, w, h], axis=1)
+        indices = cv2.dnn.NMSBoxesBatched(
+            boxes.tolist(), confidences.tolist(), labels.tolist(), DETECTION_THRESHOLD, DETECTOR_NMS_IOU
+        )
+        frame_h, frame_w = frame_shape[:2]
+        detections = []
+        for i in np.asarray(indices).reshape(-1):
+            x, y, bw, bh = boxes[i]
+            x1 = int(np.clip((x - pad[0]) / scale, 0, frame_w))
+            y1 = int(np.clip((y - pad[1]) / scale, 0, frame_h))
+            x2 = int(np.clip((x + bw - pad[0]) / scale, 0, frame_w))
+            y2 = int(np.clip((y + bh - pad[1]) / scale, 0, frame_h))
+            detections.append({
+                "label": self.names[int(labels[i])],
+                "confidence": float(confidences[i]),
+                "bbox": (x1, y1, x2, y2),
+            })
+        return detections
+
+
+class OnnxBackend(ExportedYoloBackend):
+    """ONNX Runtime on CPU (FP32 or dynamically quantized INT8 model)."""
+
+    def __init__(self, model_path, input_size, labels):
+        super().__init__(model_path, input_size, labels)
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if DETECTOR_THREADS:
+            options.intra_op_num_threads = DETECTOR_THREADS
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _infer(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoBackend(ExportedYoloBackend):
+    """OpenVINO on CPU; reads the same exported ONNX file."""
+
+    def __init__(self, model_path, input_size, labels):
+        super().__init__(model_path, input_size, labels)
+        import openvino as ov
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if DETECTOR_THREADS:
+            config["INFERENCE_NUM_THREADS"] = DETECTOR_THREADS
+        self.model = ov.Core().compile_model(model_path, "CPU", config)
+
+    def _infer(self, batch):
+        return self.model(batch)[0]
+
+
+BACKENDS = {
+    "ultralytics": UltralyticsBackend,
+    "onnx": OnnxBackend,
+    "openvino": OpenVinoBackend,
+}
@@ -1,32 +1,29 @@
 import sys
-from ultralytics import YOLO
 import cv2
-from src.config import YOLO_MODEL_PATH, PROHIBITED_OBJECTS, DETECTION_THRESHOLD
+from src.config import (
+    YOLO_MODEL_PATH, ONNX_MODEL_PATH, PROHIBITED_OBJECTS, DETECTOR_BACKEND, DETECTOR_INPUT_SIZE,
+)
+from src.core.detection.detector_backends import BACKENDS
+
+# Labels reported by the detector; everything else is filtered before NMS
+DETECTED_LABELS = set(PROHIBITED_OBJECTS) | {"cell phone"}
 
 class ObjectDetector:
-    def __init__(self, model_path=YOLO_MODEL_PATH):
-        self.model = YOLO(model_path)
-        
+    def __init__(self, model_path=None, backend=DETECTOR_BACKEND, input_size=DETECTOR_INPUT_SIZE):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown detector backend: {backend}")
+        if model_path is None:
+            model_path = YOLO_MODEL_PATH if backend == "ultralytics" else ONNX_MODEL_PATH
+        self.backend_name = backend
+        self.backend = BACKENDS[backend](model_path, input_size, DETECTED_LABELS)
+
     def detect_prohibited_items(self, frame):
         """Detect prohibited objects in a frame."""
-        results = self.model(frame, conf=DETECTION_THRESHOLD, verbose=False)
-        
-        detections = []
-        for result in results:
-            for box in result.boxes:
-                # YOLO class IDs: cell phone is usually 67 in COCO dataset
-                cls_id = int(box.cls[0])
-                label = self.model.names[cls_id]
-                
-                if label in PROHIBITED_OBJECTS or label == "cell phone":
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    conf = float(box.conf[0])
-                    detections.append({
-                        "label": label,
-                        "confidence": conf,
-                        "bbox": (x1, y1, x2, y2)
-                    })
-        return detections
+        return self.detect_prohibited_items_batch([frame])[0]
+
+    def detect_prohibited_items_batch(self, frames):
+        """Detect prohibited objects in several frames with one model call."""
+        return self.backend.detect(frames)
 
     def draw_detections(self, frame, detections):
         """Draw detections on the frame for visualization."""
@@ -49,7 +46,7 @@ if __name__ == "__main__":
     if current_dir not in sys.path:
         sys.path.append(current_dir)
         
-    print(f"Initializing ObjectDetector with model: {YOLO_MODEL_PATH}")
+    print(f"Initializing ObjectDetector with backend: {DETECTOR_BACKEND}")
     try:
         detector = ObjectDetector()
         print("Model loaded successfully.")
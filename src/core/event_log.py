@@ -0,0 +1,229 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from src.config import (
+    EVENT_LOG_PATH, EVENT_LOG_QUEUE_SIZE, EVENT_LOG_BATCH_SIZE, EVENT_LOG_FLUSH_INTERVAL_S,
+    EVENT_DETECTION_MIN_INTERVAL_S, STUDENT_TTL_SECONDS,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    session_id TEXT NOT NULL,
+    camera_id TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    risk_level TEXT,
+    previous_risk TEXT,
+    score REAL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_student ON events (session_id, student_id, ts);
+CREATE INDEX IF NOT EXISTS idx_events_student_any_session ON events (student_id, ts);
+CREATE INDEX IF NOT EXISTS idx_events_camera ON events (camera_id, ts);
+-- Per-minute counts maintained by the writer, so hall aggregates never scan events
+CREATE TABLE IF NOT EXISTS hall_minutes (
+    camera_id TEXT NOT NULL,
+    minute INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    label TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (camera_id, minute, kind, label)
+) WITHOUT ROWID;
+"""
+
+EVENT_COLUMNS = ("ts", "session_id", "camera_id", "student_id", "kind", "risk_level", "previous_risk", "score", "detail")
+EVICTION_INTERVAL_SECONDS = 60.0
+
+
+class EventLog:
+    """Append-only SQLite (WAL) log of risk transitions and detections.
+
+    The request path only derives events and puts them on a bounded queue
+    (dropping, and counting, when it is full); a writer thread inserts them
+    in batches of up to `batch_size` per transaction, or every
+    `flush_interval` seconds, and keeps the per-minute hall rollups.
+    """
+
+    def __init__(self, db_path=EVENT_LOG_PATH, max_queue=EVENT_LOG_QUEUE_SIZE,
+                 batch_size=EVENT_LOG_BATCH_SIZE, flush_interval=EVENT_LOG_FLUSH_INTERVAL_S):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        # Hot-path state for deriving events (event-loop thread only)
+        self._last_risk = {}  # (camera_id, student_id) -> (risk_level, last_seen)
+        self._last_detection = {}  # (camera_id, student_id, label) -> timestamp
+        self._last_eviction = time.time()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Durable at checkpoints; a crash may lose the last transactions, never corrupt the file
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record_frame(self, camera_id, session_id, results, now=None):
+        """Derive events from one frame's scored results and queue them."""
+        now = time.time() if now is None else now
+        session_id = session_id or ""
+        for result in results:
+            student_id = result.get("student_id")
+            if not student_id or student_id == "Unknown":
+                continue
+            risk = result.get("risk_level")
+            score = float(result["score"]) if "score" in result else None
+            key = (camera_id, student_id)
+            previous = self._last_risk.get(key, (None, 0.0))[0]
+            self._last_risk[key] = (risk, now)
+            if risk != previous and not (previous is None and risk == "Normal"):
+                self._put((now, session_id, camera_id, student_id, "risk_change", risk, previous, score,
+                           json.dumps({"gaze": result.get("gaze"), "detections": result.get("detections", [])})))
+            for label in set(result.get("detections", [])):
+                det_key = (camera_id, student_id, label)
+                if now - self._last_detection.get(det_key, 0.0) >= EVENT_DETECTION_MIN_INTERVAL_S:
+                    self._last_detection[det_key] = now
+                    self._put((now, session_id, camera_id, student_id, "detection", risk, None, score,
+                               json.dumps({"label": label})))
+
+        if now - self._last_eviction > EVICTION_INTERVAL_SECONDS:
+            self._evict(now)
+
+    def _evict(self, now):
+        self._last_eviction = now
+        for key in [k for k, (_, seen) in self._last_risk.items() if now - seen > STUDENT_TTL_SECONDS]:
+            del self._last_risk[key]
+        for key in [k for k, seen in self._last_detection.items() if now - seen > STUDENT_TTL_SECONDS]:
+            del self._last_detection[key]
+
+    def _put(self, row):
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while not (self._stop.is_set() and self.queue.empty()):
+                batch = self._collect()
+                if batch:
+                    self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def _collect(self):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=max(0.0, remaining)) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, conn, batch):
+        rollup = Counter()
+        for row in batch:
+            ts, _, camera_id, _, kind, risk_level, _, _, detail = row
+            label = json.loads(detail)["label"] if kind == "detection" else (risk_level or "")
+            rollup[(camera_id, int(ts // 60), kind, label)] += 1
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO events ({', '.join(EVENT_COLUMNS)}) VALUES ({', '.join('?' * len(EVENT_COLUMNS))})",
+                    batch,
+                )
+                conn.executemany(
+                    "INSERT INTO hall_minutes (camera_id, minute, kind, label, count) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (camera_id, minute, kind, label) DO UPDATE SET count = count + excluded.count",
+                    [key + (count,) for key, count in rollup.items()],
+                )
+            self.written += len(batch)
+            self.batches += 1
+        except sqlite3.Error as e:
+            print(f"Error writing {len(batch)} events: {e}")
+
+    def close(self, timeout=5.0):
+        """Flush what is queued and stop the writer."""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    # Queries (any thread; WAL readers don't block the writer)
+
+    def _query(self, sql, params):
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def student_timeline(self, student_id, session_id=None, since=None, until=None, limit=1000):
+        """A student's events, oldest first; across all sessions unless `session_id` is given."""
+        where, params = "student_id = ? AND ts >= ? AND ts < ?", [student_id, since or 0.0, until or float("inf")]
+        if session_id is not None:
+            where += " AND session_id = ?"
+            params.append(session_id)
+        rows = self._query(
+            "SELECT ts, session_id, camera_id, kind, risk_level, previous_risk, score, detail FROM events "
+            f"WHERE {where} ORDER BY ts LIMIT ?",
+            params + [limit],
+        )
+        for row in rows:
+            row["detail"] = json.loads(row["detail"]) if row["detail"] else None
+        return rows
+
+    def hall_summary(self, camera_id, since=None, until=None, bucket_minutes=1):
+        """Event counts per time bucket, kind and label (risk level or detected item)."""
+        bucket_minutes = max(1, int(bucket_minutes))
+        rows = self._query(
+            "SELECT (minute / ?) * ? AS bucket, kind, label, SUM(count) AS count FROM hall_minutes "
+            "WHERE camera_id = ? AND minute >= ? AND minute < ? GROUP BY bucket, kind, label ORDER BY bucket",
+            (bucket_minutes, bucket_minutes, camera_id,
+             int((since or 0.0) // 60), int(until // 60) + 1 if until else 2 ** 62),
+        )
+        for row in rows:
+            row["bucket_start"] = row.pop("bucket") * 60
+        return rows
+
+    def recent(self, limit=100, kind=None):
+        if kind:
+            sql, params = "SELECT * FROM events WHERE kind = ? ORDER BY id DESC LIMIT ?", (kind, limit)
+        else:
+            sql, params = "SELECT * FROM events ORDER BY id DESC LIMIT ?", (limit,)
+        rows = self._query(sql, params)
+        for row in rows:
+            row["detail"] = json.loads(row["detail"]) if row["detail"] else None
+        return rows
+
+    def stats(self):
+        return {
+            "path": self.db_path,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+        }
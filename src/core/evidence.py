@@ -0,0 +1,251 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+from src.config import (
+    EVIDENCE_DIR, EVIDENCE_PRE_SECONDS, EVIDENCE_POST_SECONDS, EVIDENCE_MAX_CLIP_SECONDS,
+    EVIDENCE_BUFFER_MAX_MB, EVIDENCE_STUDENT_COOLDOWN_S, EVIDENCE_WRITER_QUEUE,
+)
+
+SWEEP_INTERVAL_SECONDS = 1.0
+
+
+def _safe(name):
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", str(name))
+    # "", "." and ".." would name the directory itself or its parent
+    return name if name.strip(".") else name.replace(".", "_") + "_"
+
+
+class _Capture:
+    """A clip being collected: the pre-roll plus frames until `end`."""
+
+    def __init__(self, camera_id, frames, start, end):
+        self.camera_id = camera_id
+        self.frames = frames  # [(ts, jpeg bytes)]
+        self.bytes = sum(len(data) for _, data in frames)
+        self.started_at = start
+        self.end = end
+        self.triggers = []
+
+
+class EvidenceRecorder:
+    """Per-camera pre-roll of the JPEG bytes already received, saved as clips on risk escalations.
+
+    Each camera keeps the last `pre_seconds` of compressed frames (never
+    decoded arrays). When a student crosses into an evidence risk level,
+    the buffered frames plus `post_seconds` of the following ones are
+    handed to a background thread that writes a .mjpeg clip (concatenated
+    JPEGs) and a JSON sidecar.
+
+    One byte budget covers the buffers and the frames held by open and
+    queued clips. Past it the oldest buffered frames across all cameras are
+    evicted first; if clips alone fill it, open clips are cut short and new
+    ones are refused until the writer catches up.
+    """
+
+    def __init__(self, clip_dir=EVIDENCE_DIR, pre_seconds=EVIDENCE_PRE_SECONDS,
+                 post_seconds=EVIDENCE_POST_SECONDS, max_bytes=EVIDENCE_BUFFER_MAX_MB * 1024 * 1024):
+        self.clip_dir = clip_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.buffers = {}  # camera_id -> deque[(ts, bytes)]
+        self.buffer_bytes = {}  # camera_id -> bytes held in its buffer
+        self.captures = {}  # camera_id -> _Capture
+        self.clip_bytes = 0  # held by open captures and clips waiting for the writer
+        self.last_clip = {}  # (camera_id, student_id) -> trigger time
+        self.evicted_frames = 0
+        self.clips_truncated = 0
+        self.clips_written = 0
+        self.clips_dropped = 0
+        self.queue = queue.Queue(maxsize=EVIDENCE_WRITER_QUEUE)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="evidence-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def buffered_bytes(self):
+        return sum(self.buffer_bytes.values())
+
+    @property
+    def total_bytes(self):
+        return self.buffered_bytes + self.clip_bytes
+
+    def add_frame(self, camera_id, jpeg_bytes, timestamp=None):
+        now = time.time() if timestamp is None else timestamp
+        with self._lock:
+            buffer = self.buffers.setdefault(camera_id, deque())
+            buffer.append((now, jpeg_bytes))
+            self.buffer_bytes[camera_id] = self.buffer_bytes.get(camera_id, 0) + len(jpeg_bytes)
+            while buffer and now - buffer[0][0] > self.pre_seconds:
+                self._pop_oldest(camera_id)
+            self._enforce_cap()
+
+            capture = self.captures.get(camera_id)
+            if capture is not None:
+                if now > capture.end:
+                    self._finish(camera_id)
+                elif self.clip_bytes + len(jpeg_bytes) > self.max_bytes:
+                    # Clips alone fill the budget: save what this one has
+                    self.clips_truncated += 1
+                    self._finish(camera_id)
+                else:
+                    capture.frames.append((now, jpeg_bytes))
+                    capture.bytes += len(jpeg_bytes)
+                    self.clip_bytes += len(jpeg_bytes)
+                    self._enforce_cap()
+
+    def _pop_oldest(self, camera_id):
+        _, data = self.buffers[camera_id].popleft()
+        self.buffer_bytes[camera_id] -= len(data)
+
+    def _enforce_cap(self):
+        total = self.total_bytes
+        while total > self.max_bytes and any(self.buffers.values()):
+            # Evict the globally oldest frame so busy cameras can't starve quiet ones of history
+            camera_id = min((c for c, b in self.buffers.items() if b), key=lambda c: self.buffers[c][0][0])
+            size = len(self.buffers[camera_id][0][1])
+            self._pop_oldest(camera_id)
+            self.evicted_frames += 1
+            total -= size
+
+    def trigger(self, camera_id, student_id, risk_level, session_id=None, timestamp=None):
+        """Start (or extend) a clip for a student's escalation; returns False while in cooldown."""
+        now = time.time() if timestamp is None else timestamp
+        with self._lock:
+            key = (camera_id, student_id)
+            if now - self.last_clip.get(key, float("-inf")) < EVIDENCE_STUDENT_COOLDOWN_S:
+                return False
+            capture = self.captures.get(camera_id)
+            if capture is None:
+                if self.clip_bytes >= self.max_bytes:
+                    self.clips_dropped += 1
+                    print(f"Evidence memory budget is full; skipped a clip for {camera_id}")
+                    return False
+                # The pre-roll frames are shared with the buffer (bytes are immutable), but
+                # counted for the clip too since they outlive their eviction from the buffer
+                capture = _Capture(camera_id, list(self.buffers.get(camera_id, ())), now, now + self.post_seconds)
+                self.captures[camera_id] = capture
+                self.clip_bytes += capture.bytes
+                self._enforce_cap()
+            else:
+                capture.end = min(now + self.post_seconds, capture.started_at + EVIDENCE_MAX_CLIP_SECONDS)
+            self.last_clip[key] = now
+            capture.triggers.append({
+                "student_id": student_id, "risk_level": risk_level, "session_id": session_id, "ts": now,
+            })
+            return True
+
+    def _finish(self, camera_id):
+        capture = self.captures.pop(camera_id)
+        try:
+            self.queue.put_nowait(capture)
+        except queue.Full:
+            self.clips_dropped += 1
+            self.clip_bytes -= capture.bytes
+            print(f"Evidence writer is behind; dropped a clip for {camera_id}")
+
+    def drop_camera(self, camera_id):
+        with self._lock:
+            if camera_id in self.captures:
+                self._finish(camera_id)
+            self.buffers.pop(camera_id, None)
+            self.buffer_bytes.pop(camera_id, None)
+
+    def _sweep(self, now):
+        """Close clips and age out buffers of cameras that stopped sending frames."""
+        with self._lock:
+            for camera_id in [c for c, cap in self.captures.items() if now > cap.end + self.post_seconds]:
+                self._finish(camera_id)
+            for camera_id, buffer in self.buffers.items():
+                while buffer and now - buffer[0][0] > self.pre_seconds:
+                    self._pop_oldest(camera_id)
+            for key in [k for k, t in self.last_clip.items() if now - t > EVIDENCE_STUDENT_COOLDOWN_S]:
+                del self.last_clip[key]
+
+    def _run(self):
+        while not self._stop.is_set() or not self.queue.empty():
+            try:
+                capture = self.queue.get(timeout=SWEEP_INTERVAL_SECONDS)
+            except queue.Empty:
+                self._sweep(time.time())
+                continue
+            try:
+                self._write(capture)
+                self.clips_written += 1
+            except OSError as e:
+                print(f"Error writing evidence clip for {capture.camera_id}: {e}")
+            finally:
+                with self._lock:
+                    self.clip_bytes -= capture.bytes
+
+    def _write(self, capture):
+        camera_dir = os.path.join(self.clip_dir, _safe(capture.camera_id))
+        os.makedirs(camera_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(capture.started_at))
+        students = "_".join(sorted({_safe(t["student_id"]) for t in capture.triggers}))[:80]
+        base = os.path.join(camera_dir, f"{stamp}_{students}")
+
+        offsets = []
+        with open(base + ".mjpeg", "wb") as f:
+            for ts, data in capture.frames:
+                offsets.append({"ts": ts, "offset": f.tell(), "size": len(data)})
+                f.write(data)
+        with open(base + ".json", "w") as f:
+            json.dump({
+                "camera_id": capture.camera_id,
+                "triggers": capture.triggers,
+                "start": capture.frames[0][0] if capture.frames else capture.started_at,
+                "end": capture.frames[-1][0] if capture.frames else capture.end,
+                "frames": offsets,
+            }, f, indent=2)
+
+    def list_clips(self, camera_id=None):
+        clips = []
+        cameras = [_safe(camera_id)] if camera_id else (os.listdir(self.clip_dir) if os.path.isdir(self.clip_dir) else [])
+        for camera in cameras:
+            camera_dir = os.path.join(self.clip_dir, camera)
+            if not os.path.isdir(camera_dir):
+                continue
+            for name in sorted(os.listdir(camera_dir)):
+                if name.endswith(".json"):
+                    clips.append({"camera_id": camera, "clip_id": name[:-len(".json")]})
+        return clips
+
+    def clip_path(self, camera_id, clip_id, sidecar=False):
+        """Path of a listed clip, or None for ids list_clips() can't return (e.g. "..")."""
+        if _safe(camera_id) != camera_id or _safe(clip_id) != clip_id:
+            return None
+        path = os.path.join(self.clip_dir, camera_id, clip_id + (".json" if sidecar else ".mjpeg"))
+        root = os.path.realpath(self.clip_dir)
+        if os.path.dirname(os.path.dirname(os.path.realpath(path))) != root:
+            return None
+        return path
+
+    def close(self, timeout=10.0):
+        """Write out open clips and stop the writer."""
+        with self._lock:
+            for camera_id in list(self.captures):
+                self._finish(camera_id)
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buffer_bytes": self.buffered_bytes,
+                "clip_bytes": self.clip_bytes,
+                "total_bytes": self.total_bytes,
+                "buffer_limit_bytes": self.max_bytes,
+                "cameras": {c: {"frames": len(b), "bytes": self.buffer_bytes[c]} for c, b in self.buffers.items()},
+                "open_clips": len(self.captures),
+                "evicted_frames": self.evicted_frames,
+                "clips_written": self.clips_written,
+                "clips_truncated": self.clips_truncated,
+                "clips_dropped": self.clips_dropped,
+            }
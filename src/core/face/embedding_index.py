@@ -0,0 +1,113 @@
+import numpy as np
+
+EMBEDDING_DIM = 128
+
+
+class EmbeddingIndex:
+    """Known face encodings kept as one contiguous float32 matrix.
+
+    Squared norms are precomputed so all faces of a frame are matched against
+    the roster (or a per-session subset of it) with a single matrix product.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.names = []
+        self._buf = np.empty((0, dim), dtype=np.float32)
+        self._sq_norms = np.empty((0,), dtype=np.float32)
+        self._size = 0
+        self._subsets = {}
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def matrix(self):
+        return self._buf[:self._size]
+
+    @property
+    def sq_norms(self):
+        return self._sq_norms[:self._size]
+
+    def load(self, names, encodings):
+        """Replace the index contents."""
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        self._buf = np.ascontiguousarray(matrix)
+        self._sq_norms = np.einsum("ij,ij->i", self._buf, self._buf)
+        self._size = len(self._buf)
+        self.names = list(names)
+        self._subsets.clear()
+
+    def add(self, name, encoding):
+        """Append one encoding, growing the backing buffer geometrically."""
+        if self._size == len(self._buf):
+            capacity = max(64, 2 * len(self._buf))
+            buf = np.empty((capacity, self.dim), dtype=np.float32)
+            buf[:self._size] = self._buf[:self._size]
+            norms = np.empty((capacity,), dtype=np.float32)
+            norms[:self._size] = self._sq_norms[:self._size]
+            self._buf, self._sq_norms = buf, norms
+        vec = np.asarray(encoding, dtype=np.float32)
+        self._buf[self._size] = vec
+        self._sq_norms[self._size] = vec @ vec
+        self._size += 1
+        self.names.append(name)
+        self._subsets.clear()
+
+    def rows_for(self, student_ids, key=None):
+        """Row indices of the given students, cached under `key` (e.g. a session id)."""
+        if key is not None and key in self._subsets:
+            return self._subsets[key]
+        wanted = set(student_ids)
+        rows = np.array([i for i, name in enumerate(self.names) if name in wanted], dtype=np.intp)
+        if key is not None:
+            self._subsets[key] = rows
+        return rows
+
+    def invalidate_subsets(self, key=None):
+        """Forget cached subset rows for one key, or for all keys."""
+        if key is None:
+            self._subsets.clear()
+        else:
+            self._subsets.pop(key, None)
+
+    def distances(self, encodings, rows=None):
+        """Euclidean distances (faces x known) via ||a||^2 + ||b||^2 - 2ab."""
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        matrix, norms = self.matrix, self.sq_norms
+        if rows is not None:
+            matrix, norms = matrix[rows], norms[rows]
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        d2 = q_norms[:, None] + norms[None, :] - 2.0 * (queries @ matrix.T)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2, out=d2)
+
+    def match(self, encodings, tolerance=0.6, top_k=1, rows=None):
+        """Match every face of a frame in one call.
+
+        Returns (names, candidates): the best name per face ("Unknown" when the
+        nearest distance exceeds `tolerance`) and, per face, up to `top_k`
+        (name, distance) pairs sorted by distance.
+        """
+        n_faces = len(encodings)
+        if n_faces == 0:
+            return [], []
+        if self._size == 0 or (rows is not None and len(rows) == 0):
+            return ["Unknown"] * n_faces, [[] for _ in range(n_faces)]
+
+        dist = self.distances(encodings, rows)
+        row_ids = rows if rows is not None else np.arange(self._size)
+        k = min(max(1, top_k), dist.shape[1])
+        if k < dist.shape[1]:
+            idx = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            idx = np.tile(np.arange(dist.shape[1]), (n_faces, 1))
+        order = np.take_along_axis(dist, idx, axis=1).argsort(axis=1)
+        idx = np.take_along_axis(idx, order, axis=1)
+
+        names, candidates = [], []
+        for face_i in range(n_faces):
+            top = [(self.names[row_ids[j]], float(dist[face_i, j])) for j in idx[face_i]]
+            candidates.append(top)
+            names.append(top[0][0] if top[0][1] <= tolerance else "Unknown")
+        return names, candidates
@@ -0,0 +1,128 @@
+import os
+import pickle
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer deployments only
+    fcntl = None
+
+from src.core.face.embedding_index import EMBEDDING_DIM
+
+
+class EmbeddingStore:
+    """Append-only on-disk face embedding store.
+
+    Embeddings are fixed-width float32 rows in `embeddings.f32` that readers
+    memory-map read-only (so worker processes share the same pages), with the
+    matching student ids, one per line, in `embedding_ids.txt`. Enrollment
+    appends to both files without rewriting existing data.
+
+    Writers (appends, repair, migration) hold an exclusive lock on
+    `embeddings.lock`. A `read_only` store (the inference workers) never
+    writes, so it can't truncate a row another process is still appending.
+    """
+
+    def __init__(self, db_path, dim=EMBEDDING_DIM, read_only=False):
+        self.dim = dim
+        self.read_only = read_only
+        self.row_bytes = dim * np.dtype(np.float32).itemsize
+        self.vectors_file = os.path.join(db_path, "embeddings.f32")
+        self.ids_file = os.path.join(db_path, "embedding_ids.txt")
+        self.lock_file = os.path.join(db_path, "embeddings.lock")
+        if not read_only:
+            self._repair()
+
+    @contextmanager
+    def _write_lock(self):
+        if self.read_only:
+            raise PermissionError("Embedding store was opened read-only")
+        with open(self.lock_file, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _repair(self):
+        """Trim a partially written trailing row so both files line up."""
+        with self._write_lock():
+            self._repair_locked()
+
+    def _repair_locked(self):
+        if not os.path.exists(self.vectors_file):
+            return
+        rows = os.path.getsize(self.vectors_file) // self.row_bytes
+        ids = self._read_ids()
+        count = min(rows, len(ids))
+        if os.path.getsize(self.vectors_file) != count * self.row_bytes:
+            with open(self.vectors_file, "r+b") as f:
+                f.truncate(count * self.row_bytes)
+        if len(ids) != count:
+            with open(self.ids_file, "w") as f:
+                f.writelines(f"{student_id}\n" for student_id in ids[:count])
+
+    def _read_ids(self):
+        if not os.path.exists(self.ids_file):
+            return []
+        with open(self.ids_file, "r") as f:
+            # Ignore a trailing line without newline (interrupted write)
+            data = f.read()
+        lines = data.split("\n")
+        return lines[:-1]
+
+    def __len__(self):
+        if not os.path.exists(self.vectors_file):
+            return 0
+        return os.path.getsize(self.vectors_file) // self.row_bytes
+
+    def signature(self):
+        """Cheap change marker for readers polling for new enrollments."""
+        return len(self)
+
+    def load(self):
+        """Return (ids, matrix) where matrix is a zero-copy read-only memmap."""
+        ids = self._read_ids()
+        count = min(len(self), len(ids))
+        if count == 0:
+            return [], np.empty((0, self.dim), dtype=np.float32)
+        matrix = np.memmap(self.vectors_file, dtype=np.float32, mode="r", shape=(count, self.dim))
+        return ids[:count], matrix
+
+    def append(self, student_id, encoding):
+        self.append_many([student_id], [encoding])
+
+    def append_many(self, student_ids, encodings):
+        """Append embeddings; vectors are written before ids so readers never see an id without data."""
+        if not student_ids:
+            return
+        for student_id in student_ids:
+            if "\n" in student_id:
+                raise ValueError(f"Invalid student id: {student_id!r}")
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        with self._write_lock():
+            self._append_locked(student_ids, matrix)
+
+    def _append_locked(self, student_ids, matrix):
+        with open(self.vectors_file, "ab") as f:
+            f.write(matrix.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.ids_file, "a") as f:
+            f.writelines(f"{student_id}\n" for student_id in student_ids)
+
+    def migrate_pickle(self, pickle_path):
+        """One-time import of the legacy face_encodings.pkl; returns the number of faces imported."""
+        with self._write_lock():
+            # Re-checked under the lock so concurrent starts import the pickle only once
+            if not os.path.exists(pickle_path) or len(self) > 0:
+                return 0
+            with open(pickle_path, "rb") as f:
+                data = pickle.load(f)
+            self._append_locked(list(data["names"]), np.asarray(data["encodings"], dtype=np.float32).reshape(-1, self.dim))
+            os.replace(pickle_path, pickle_path + ".migrated")
+            return len(data["names"])
@@ -1,107 +1,258 @@
 import cv2
 import os
-import pickle
+import json
+import tempfile
+import threading
+import zipfile
 import numpy as np
 
-try:
-    import face_recognition
-    FACE_REC_AVAILABLE = True
-except ImportError:
-    FACE_REC_AVAILABLE = False
-    try:
-        import mediapipe.python.solutions.face_detection as mp_face
-        MP_FACE_AVAILABLE = True
-    except ImportError:
-        MP_FACE_AVAILABLE = False
-
 from src.config import FACE_DATABASE_DIR
+from src.core.frame_context import FrameContext
+from src.core.face.embedding_index import EmbeddingIndex
+from src.core.face.embedding_store import EmbeddingStore
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+# face_recognition (dlib) and MediaPipe take seconds to import, so they are
+# imported on first use rather than when the API module loads
+face_recognition = None
+mp_face = None
+FACE_REC_AVAILABLE = None
+MP_FACE_AVAILABLE = None
+
+
+def load_face_backends():
+    """Import the face libraries once; returns (FACE_REC_AVAILABLE, MP_FACE_AVAILABLE)."""
+    global face_recognition, mp_face, FACE_REC_AVAILABLE, MP_FACE_AVAILABLE
+    if FACE_REC_AVAILABLE is None:
+        try:
+            import face_recognition
+            FACE_REC_AVAILABLE, MP_FACE_AVAILABLE = True, False
+        except ImportError:
+            FACE_REC_AVAILABLE = False
+            try:
+                import mediapipe.python.solutions.face_detection as mp_face
+                MP_FACE_AVAILABLE = True
+            except ImportError:
+                MP_FACE_AVAILABLE = False
+    return FACE_REC_AVAILABLE, MP_FACE_AVAILABLE
 
 class FaceManager:
-    def __init__(self, db_path=FACE_DATABASE_DIR):
+    def __init__(self, db_path=FACE_DATABASE_DIR, tracker=None, read_only=False):
         self.db_path = db_path
-        self.known_face_encodings = []
-        self.known_face_names = []
+        # Optional IdentityTracker to keep identities between frames
+        self.tracker = tracker
+        self.index = EmbeddingIndex()
+        # session_id -> student ids seated in that hall
+        self.rosters = {}
+        # Legacy pickle database, migrated into the embedding store on first start
         self.db_file = os.path.join(self.db_path, "face_encodings.pkl")
+        self.roster_file = os.path.join(self.db_path, "rosters.json")
+        self.db_signature = None
+        self.roster_mtime = None
+        self.face_detection = None
+        # Enrollments on the API executor and reloads must not interleave their index updates
+        self._index_lock = threading.RLock()
         
         if not os.path.exists(self.db_path):
             os.makedirs(self.db_path)
-            
-        if not FACE_REC_AVAILABLE and MP_FACE_AVAILABLE:
-            self.mp_face_detection = mp_face
-            self.face_detection = self.mp_face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5)
-            
+        # Inference workers open the store read-only; repair, migration and
+        # enrollment happen in the owning (API) process
+        self.store = EmbeddingStore(self.db_path, read_only=read_only)
+        if not read_only:
+            migrated = self.store.migrate_pickle(self.db_file)
+            if migrated:
+                print(f"Migrated {migrated} faces from {self.db_file} to the embedding store.")
+
         self.load_known_faces()
+        self.load_rosters()
+
+    def load_models(self):
+        """Import the face libraries and build the detector now instead of on the first frame."""
+        load_face_backends()
+        if not FACE_REC_AVAILABLE and MP_FACE_AVAILABLE and self.face_detection is None:
+            self.face_detection = mp_face.FaceDetection(model_selection=1, min_detection_confidence=0.5)
+
+    @property
+    def known_face_names(self):
+        return self.index.names
 
     def load_known_faces(self):
-        """Load known faces from the database file."""
-        if os.path.exists(self.db_file):
-            with open(self.db_file, "rb") as f:
-                data = pickle.load(f)
-                self.known_face_encodings = data["encodings"]
-                self.known_face_names = data["names"]
-            print(f"Loaded {len(self.known_face_names)} faces from database.")
-
-    def save_known_faces(self):
-        """Save known faces to the database file."""
-        if FACE_REC_AVAILABLE:
-            with open(self.db_file, "wb") as f:
-                data = {"encodings": self.known_face_encodings, "names": self.known_face_names}
-                pickle.dump(data, f)
+        """Map the embedding store into the index (zero-copy, shared between processes)."""
+        with self._index_lock:
+            names, matrix = self.store.load()
+            self.index.load(names, matrix)
+            self.db_signature = self.store.signature()
+        if names:
+            print(f"Loaded {len(names)} faces from database.")
+
+    def load_rosters(self):
+        """Load per-session rosters (which students sit in which hall)."""
+        if os.path.exists(self.roster_file):
+            with open(self.roster_file, "r") as f:
+                self.rosters = json.load(f)
+            self.roster_mtime = os.path.getmtime(self.roster_file)
+
+    def refresh_if_changed(self):
+        """Reload the database if another process enrolled students since the last load."""
+        with self._index_lock:
+            if self.store.signature() != self.db_signature:
+                self.load_known_faces()
+        if os.path.exists(self.roster_file) and os.path.getmtime(self.roster_file) != self.roster_mtime:
+            self.load_rosters()
+            self.index.invalidate_subsets()
+
+    def set_session_roster(self, session_id, student_ids):
+        """Restrict matching for an exam session to the students seated in that hall."""
+        self.rosters[session_id] = list(student_ids)
+        with open(self.roster_file, "w") as f:
+            json.dump(self.rosters, f)
+        self.roster_mtime = os.path.getmtime(self.roster_file)
+        self.index.invalidate_subsets(session_id)
 
     def enroll_student(self, student_id, image_path):
         """Enroll a student by generating face embeddings from an image."""
+        self.load_models()
         if not FACE_REC_AVAILABLE:
             print("Face recognition library not available. Skipping embedding generation.")
-            self.known_face_names.append(student_id)
             return True
             
-        image = face_recognition.load_image_file(image_path)
-        encodings = face_recognition.face_encodings(image)
-        
-        if len(encodings) > 0:
-            self.known_face_encodings.append(encodings[0])
-            self.known_face_names.append(student_id)
-            self.save_known_faces()
+        encoding = self._encode_image(image_path)
+        if encoding is not None:
+            self._append([student_id], [encoding])
             return True
         return False
 
-    def identify_face(self, frame, tolerance=0.6):
-        """Identify a face in a frame."""
+    def _append(self, student_ids, encodings):
+        """Append to the store and to the in-memory index, without re-reading the store."""
+        if not student_ids:
+            return
+        with self._index_lock:
+            expected = len(self.index) + len(student_ids)
+            self.store.append_many(student_ids, encodings)
+            if self.store.signature() != expected:
+                # Another process enrolled since our last load; pick its rows up as well
+                self.load_known_faces()
+                return
+            for student_id, encoding in zip(student_ids, encodings):
+                self.index.add(student_id, encoding)
+            self.db_signature = expected
+
+    def _encode_image(self, image_path):
+        image = face_recognition.load_image_file(image_path)
+        encodings = face_recognition.face_encodings(image)
+        return encodings[0] if len(encodings) > 0 else None
+
+    def bulk_enroll(self, path):
+        """Enroll every photo in a directory or zip archive with a single store append.
+
+        The student id is the photo's parent folder name for `<id>/<photo>`
+        layouts, otherwise the file name without extension.
+        """
+        self.load_models()
+        if not FACE_REC_AVAILABLE:
+            print("Face recognition library not available. Skipping embedding generation.")
+            return {"enrolled": [], "failed": []}
+
+        if zipfile.is_zipfile(path):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                with zipfile.ZipFile(path) as archive:
+                    archive.extractall(tmp_dir)
+                return self._bulk_enroll_dir(tmp_dir)
+        return self._bulk_enroll_dir(path)
+
+    def _bulk_enroll_dir(self, root):
+        student_ids, encodings, failed = [], [], []
+        seen = set()
+        for dirpath, _, filenames in sorted(os.walk(root)):
+            for filename in sorted(filenames):
+                if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if os.path.abspath(dirpath) == os.path.abspath(root):
+                    student_id = os.path.splitext(filename)[0]
+                else:
+                    student_id = os.path.basename(dirpath)
+                if student_id in seen:
+                    continue
+                encoding = self._encode_image(os.path.join(dirpath, filename))
+                if encoding is None:
+                    failed.append(student_id)
+                    continue
+                seen.add(student_id)
+                student_ids.append(student_id)
+                encodings.append(encoding)
+
+        # Folders with several photos may have failed on one and succeeded on another
+        failed = [student_id for student_id in dict.fromkeys(failed) if student_id not in seen]
+        self._append(student_ids, encodings)
+        return {"enrolled": student_ids, "failed": failed}
+
+    def identify_face(self, frame, tolerance=0.6, session_id=None, top_k=1, camera_id=None, now=None):
+        """Identify faces in a frame.
+
+        All faces are matched against the enrolled encodings in one matrix
+        operation, optionally restricted to the roster of `session_id`. When
+        a tracker is attached and `camera_id` is given, only new or stale
+        tracks are encoded and matched; the rest keep their identity.
+        """
+        face_locations, names, _ = self.identify_tracked(frame, tolerance, session_id, top_k, camera_id, now)
+        return face_locations, names
+
+    def identify_tracked(self, frame, tolerance=0.6, session_id=None, top_k=1, camera_id=None, now=None):
+        """identify_face() plus the track id of each face (None without a tracker)."""
+        self.load_models()
+        if not FACE_REC_AVAILABLE and not MP_FACE_AVAILABLE:
+            return [], [], []
+
+        # Shared with the pose stage when `frame` is a FrameContext
+        rgb_frame = FrameContext.wrap(frame).rgb
+        face_locations = self.detect_faces(rgb_frame)
+
+        if self.tracker is None or camera_id is None:
+            names = self._identify_all(rgb_frame, face_locations, tolerance, session_id, top_k)
+            return face_locations, names, [None] * len(face_locations)
+
+        tracks, reid = self.tracker.update(camera_id, face_locations, now=now)
+        if reid:
+            if FACE_REC_AVAILABLE:
+                reid_locations = [face_locations[i] for i in reid]
+                names = self._identify_all(rgb_frame, reid_locations, tolerance, session_id, top_k)
+            else:
+                # No embeddings available: the track itself is the identity
+                names = [f"Student_{camera_id}_{tracks[i].track_id}" for i in reid]
+            self.tracker.set_identities([tracks[i] for i in reid], names, now=now)
+        return face_locations, [t.student_id for t in tracks], [t.track_id for t in tracks]
+
+    def detect_faces(self, rgb_frame):
+        """Face boxes as (top, right, bottom, left) tuples."""
+        self.load_models()
         if FACE_REC_AVAILABLE:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(rgb_frame)
-            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-            
-            face_names = []
-            for face_encoding in face_encodings:
-                matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, tolerance=tolerance)
-                name = "Unknown"
-                
-                face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                if len(face_distances) > 0:
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        name = self.known_face_names[best_match_index]
-                
-                face_names.append(name)
-            return face_locations, face_names
-        elif MP_FACE_AVAILABLE:
-            # Fallback to MediaPipe Face Detection
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.face_detection.process(rgb_frame)
-            
-            face_locations = []
-            face_names = []
-            if results.detections:
-                for detection in results.detections:
-                    bbox = detection.location_data.relative_bounding_box
-                    h, w, _ = frame.shape
-                    top = int(bbox.ymin * h)
-                    left = int(bbox.xmin * w)
-                    bottom = int((bbox.ymin + bbox.height) * h)
-                    right = int((bbox.xmin + bbox.width) * w)
-                    face_locations.append((top, right, bottom, left))
-                    face_names.append("Student_Detected") # Placeholder
-            return face_locations, face_names
-        
-        return [], []
+            return face_recognition.face_locations(rgb_frame)
+
+        # Fallback to MediaPipe Face Detection
+        results = self.face_detection.process(rgb_frame)
+        face_locations = []
+        if results.detections:
+            h, w, _ = rgb_frame.shape
+            for detection in results.detections:
+                bbox = detection.location_data.relative_bounding_box
+                top = int(bbox.ymin * h)
+                left = int(bbox.xmin * w)
+                bottom = int((bbox.ymin + bbox.height) * h)
+                right = int((bbox.xmin + bbox.width) * w)
+                face_locations.append((top, right, bottom, left))
+        return face_locations
+
+    def _identify_all(self, rgb_frame, face_locations, tolerance, session_id, top_k):
+        if not FACE_REC_AVAILABLE:
+            return ["Student_Detected"] * len(face_locations)  # Placeholder
+        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        face_names, _ = self.match_encodings(face_encodings, tolerance, session_id, top_k)
+        return face_names
+
+    def match_encodings(self, face_encodings, tolerance=0.6, session_id=None, top_k=1):
+        """Match encodings against the index; returns (names, top-k candidates)."""
+        rows = None
+        if session_id is not None and session_id in self.rosters:
+            rows = self.index.rows_for(self.rosters[session_id], key=session_id)
+        return self.index.match(face_encodings, tolerance=tolerance, top_k=top_k, rows=rows)
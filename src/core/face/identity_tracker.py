@@ -0,0 +1,137 @@
+import itertools
+import threading
+import time
+
+import numpy as np
+
+from src.config import (
+    TRACK_IOU_THRESHOLD, TRACK_REID_INTERVAL_S, TRACK_UNKNOWN_RETRY_S,
+    TRACK_MAX_MISSES, TRACK_CAMERA_TTL_S,
+)
+
+
+def box_iou(boxes_a, boxes_b):
+    """IoU matrix between two lists of (top, right, bottom, left) boxes."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class FaceTrack:
+    def __init__(self, track_id, box, now):
+        self.track_id = track_id
+        self.box = box
+        self.student_id = None
+        self.last_seen = now
+        self.last_identified = None
+        self.misses = 0
+
+    def needs_reid(self, now, reid_interval, unknown_retry):
+        if self.last_identified is None:
+            return True
+        interval = unknown_retry if self.student_id == "Unknown" else reid_interval
+        return now - self.last_identified >= interval
+
+
+class IdentityTracker:
+    """Keeps face identities between frames per camera.
+
+    Face boxes are associated to existing tracks by IoU (falling back to
+    centroid distance for small moves), so the expensive encode + match step
+    only runs for new tracks and for tracks due a periodic re-check.
+    """
+
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, reid_interval=TRACK_REID_INTERVAL_S,
+                 unknown_retry=TRACK_UNKNOWN_RETRY_S, max_misses=TRACK_MAX_MISSES,
+                 camera_ttl=TRACK_CAMERA_TTL_S):
+        self.iou_threshold = iou_threshold
+        self.reid_interval = reid_interval
+        self.unknown_retry = unknown_retry
+        self.max_misses = max_misses
+        self.camera_ttl = camera_ttl
+        self.cameras = {}  # camera_id -> list of FaceTrack
+        self.camera_seen = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def update(self, camera_id, face_locations, now=None):
+        """Associate this frame's face boxes with the camera's tracks.
+
+        Returns (tracks, reid_indices): one track per face location and the
+        indices of the locations that need full re-identification.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict_idle_cameras(now)
+            tracks = self.cameras.setdefault(camera_id, [])
+            self.camera_seen[camera_id] = now
+
+        assigned = [None] * len(face_locations)
+        if tracks and face_locations:
+            iou = box_iou([t.box for t in tracks], face_locations)
+            # Centroid fallback: a face that moved less than half its width
+            t_boxes = np.asarray([t.box for t in tracks], dtype=np.float32)
+            f_boxes = np.asarray(face_locations, dtype=np.float32)
+            t_c = np.stack([(t_boxes[:, 1] + t_boxes[:, 3]) / 2, (t_boxes[:, 0] + t_boxes[:, 2]) / 2], axis=1)
+            f_c = np.stack([(f_boxes[:, 1] + f_boxes[:, 3]) / 2, (f_boxes[:, 0] + f_boxes[:, 2]) / 2], axis=1)
+            dist = np.linalg.norm(t_c[:, None, :] - f_c[None, :, :], axis=2)
+            width = np.maximum(t_boxes[:, 1] - t_boxes[:, 3], 1.0)
+            near = dist <= 0.5 * width[:, None]
+
+            score = np.where(iou >= self.iou_threshold, iou, np.where(near, 1e-3, -1.0))
+            used_tracks = set()
+            for flat in np.argsort(-score, axis=None):
+                t_idx, f_idx = np.unravel_index(flat, score.shape)
+                if score[t_idx, f_idx] < 0:
+                    break
+                if t_idx in used_tracks or assigned[f_idx] is not None:
+                    continue
+                used_tracks.add(t_idx)
+                assigned[f_idx] = tracks[t_idx]
+
+        for f_idx, loc in enumerate(face_locations):
+            track = assigned[f_idx]
+            if track is None:
+                track = FaceTrack(next(self._ids), loc, now)
+                tracks.append(track)
+                assigned[f_idx] = track
+            track.box = loc
+            track.last_seen = now
+            track.misses = 0
+
+        matched = set(id(t) for t in assigned)
+        for track in tracks:
+            if id(track) not in matched:
+                track.misses += 1
+        tracks[:] = [t for t in tracks if t.misses <= self.max_misses]
+
+        reid = [i for i, t in enumerate(assigned) if t.needs_reid(now, self.reid_interval, self.unknown_retry)]
+        return assigned, reid
+
+    def set_identities(self, tracks, student_ids, now=None):
+        now = time.time() if now is None else now
+        for track, student_id in zip(tracks, student_ids):
+            track.student_id = student_id
+            track.last_identified = now
+
+    def drop_camera(self, camera_id):
+        with self._lock:
+            self.camera_seen.pop(camera_id, None)
+            self.cameras.pop(camera_id, None)
+
+    def _evict_idle_cameras(self, now):
+        for camera_id, seen in list(self.camera_seen.items()):
+            if now - seen > self.camera_ttl:
+                del self.camera_seen[camera_id]
+                self.cameras.pop(camera_id, None)
+
+    def stats(self):
+        return {camera_id: len(tracks) for camera_id, tracks in self.cameras.items()}
@@ -0,0 +1,122 @@
+import cv2
+import numpy as np
+
+from src.config import ANALYSIS_MAX_SIDE
+
+# JPEG start-of-frame markers (baseline, progressive, ...) that carry the image size
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def jpeg_dimensions(contents):
+    """(width, height) from a JPEG header without decoding it, or None."""
+    data = memoryview(contents)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        length = (data[pos + 2] << 8) | data[pos + 3]
+        if marker in _SOF_MARKERS:
+            height = (data[pos + 5] << 8) | data[pos + 6]
+            width = (data[pos + 7] << 8) | data[pos + 8]
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def reduced_decode_factor(width, height, max_side):
+    """Largest libjpeg reduction (8, 4, 2) that keeps the long side >= max_side."""
+    if not max_side:
+        return 1
+    for factor, _ in _REDUCED_FLAGS:
+        if max(width, height) // factor >= max_side:
+            return factor
+    return 1
+
+
+class FrameContext:
+    """A decoded frame plus lazily computed views shared by every stage.
+
+    The RGB copy, grayscale and downscaled versions are computed at most once
+    per frame no matter how many stages (or students) ask for them; crops are
+    NumPy views, not copies. `scale` is the factor from camera to analysis
+    coordinates when the frame was decoded at reduced size.
+    """
+
+    def __init__(self, bgr, scale=1.0):
+        self.bgr = bgr
+        self.scale = scale
+        self._rgb = None
+        self._gray = None
+        self._downscaled = {}
+
+    @classmethod
+    def wrap(cls, frame):
+        """Accept either a context or a raw BGR array."""
+        return frame if isinstance(frame, cls) else cls(frame)
+
+    @classmethod
+    def from_jpeg(cls, contents, max_side=ANALYSIS_MAX_SIDE):
+        """Decode an encoded frame, directly at reduced scale when the camera is larger than needed.
+
+        Returns None when the data can't be decoded.
+        """
+        buf = np.frombuffer(contents, np.uint8)
+        size = jpeg_dimensions(contents)
+        factor = reduced_decode_factor(*size, max_side) if size else 1
+        flag = dict(_REDUCED_FLAGS).get(factor, cv2.IMREAD_COLOR)
+        frame = cv2.imdecode(buf, flag)
+        if frame is None:
+            return None
+        return cls(frame, scale=1.0 / factor)
+
+    @classmethod
+    def from_array(cls, frame, max_side=ANALYSIS_MAX_SIDE):
+        """Wrap an already decoded frame, shrinking it by the same power-of-two rule as from_jpeg."""
+        h, w = frame.shape[:2]
+        factor = reduced_decode_factor(w, h, max_side)
+        if factor == 1:
+            return cls(frame)
+        small = cv2.resize(frame, (w // factor, h // factor), interpolation=cv2.INTER_AREA)
+        return cls(small, scale=1.0 / factor)
+
+    @property
+    def shape(self):
+        return self.bgr.shape
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def downscaled(self, width):
+        """BGR copy at most `width` pixels wide (the frame itself if already smaller); cached per width."""
+        if width >= self.bgr.shape[1]:
+            return self.bgr
+        small = self._downscaled.get(width)
+        if small is None:
+            h, w = self.bgr.shape[:2]
+            size = (width, max(1, int(round(h * width / w))))
+            small = self._downscaled[width] = cv2.resize(self.bgr, size, interpolation=cv2.INTER_AREA)
+        return small
+
+    def crop(self, box, rgb=False):
+        """View of an (x1, y1, x2, y2) box clipped to the frame; returns (view, clipped box)."""
+        image = self.rgb if rgb else self.bgr
+        h, w = image.shape[:2]
+        x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+        x2, y2 = min(w, int(box[2])), min(h, int(box[3]))
+        return image[y1:y2, x1:x2], (x1, y1, x2, y2)
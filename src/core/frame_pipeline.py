@@ -0,0 +1,301 @@
+import logging
+import time
+
+import numpy as np
+
+from src.config import POSE_MODE
+from src.core.frame_context import FrameContext
+
+# Region around a face (in face widths/heights) where a student's desk items can appear
+TORSO_EXPAND_X = 1.5
+TORSO_EXPAND_UP = 0.5
+TORSO_EXPAND_DOWN = 4.0
+# Max distance (in face widths) between a skeleton's nose and a face centre
+POSE_MATCH_MAX_DIST = 1.0
+
+logger = logging.getLogger("exam_monitor.pipeline")
+
+
+def face_center(face_loc):
+    top, right, bottom, left = face_loc
+    return (left + right) / 2.0, (top + bottom) / 2.0
+
+
+def torso_region(face_loc, frame_shape):
+    """Expand a (top, right, bottom, left) face box into the student's face/torso/desk region."""
+    top, right, bottom, left = face_loc
+    h, w = frame_shape[:2]
+    fw = max(right - left, 1)
+    fh = max(bottom - top, 1)
+    x1 = max(0, left - TORSO_EXPAND_X * fw)
+    x2 = min(w, right + TORSO_EXPAND_X * fw)
+    y1 = max(0, top - TORSO_EXPAND_UP * fh)
+    y2 = min(h, bottom + TORSO_EXPAND_DOWN * fh)
+    return x1, y1, x2, y2
+
+
+def assign_detections(face_locs, detections, frame_shape):
+    """Attribute each detection to at most one face.
+
+    A detection belongs to the nearest face whose torso region contains the
+    centre of its bbox. Returns (per_face_lists, unassigned).
+    """
+    per_face = [[] for _ in face_locs]
+    unassigned = []
+    if not face_locs:
+        return per_face, list(detections)
+
+    centers = np.array([face_center(loc) for loc in face_locs], dtype=np.float32)
+    regions = np.array([torso_region(loc, frame_shape) for loc in face_locs], dtype=np.float32)
+
+    for det in detections:
+        x1, y1, x2, y2 = det["bbox"]
+        cx, cy = (x1 + x2) / 2.0, (y1 + y2) / 2.0
+        inside = (
+            (regions[:, 0] <= cx) & (cx <= regions[:, 2]) &
+            (regions[:, 1] <= cy) & (cy <= regions[:, 3])
+        )
+        if not inside.any():
+            unassigned.append(det)
+            continue
+        dist = np.hypot(centers[:, 0] - cx, centers[:, 1] - cy)
+        dist[~inside] = np.inf
+        per_face[int(np.argmin(dist))].append(det)
+    return per_face, unassigned
+
+
+def assign_poses(face_locs, poses, anchors):
+    """Greedily match skeletons to faces by nose-to-face-centre distance.
+
+    `anchors` holds the (x, y) pixel position of each skeleton's nose, or None.
+    Faces without a close enough skeleton get an empty pose dict.
+    """
+    per_face = [{} for _ in face_locs]
+    candidates = []
+    for p_idx, anchor in enumerate(anchors):
+        if anchor is None:
+            continue
+        for f_idx, loc in enumerate(face_locs):
+            cx, cy = face_center(loc)
+            width = max(loc[1] - loc[3], 1)
+            dist = np.hypot(anchor[0] - cx, anchor[1] - cy)
+            if dist <= POSE_MATCH_MAX_DIST * width:
+                candidates.append((dist, f_idx, p_idx))
+
+    used_faces, used_poses = set(), set()
+    for _, f_idx, p_idx in sorted(candidates):
+        if f_idx in used_faces or p_idx in used_poses:
+            continue
+        per_face[f_idx] = poses[p_idx]
+        used_faces.add(f_idx)
+        used_poses.add(p_idx)
+    return per_face
+
+
+class FramePipeline:
+    """Runs every full-frame model once and attributes the results to each face.
+
+    With an AdaptiveScheduler attached, stages whose input did not change
+    (or that are not due at their configured rate) are skipped for a camera
+    and their previous results reused.
+    """
+
+    def __init__(self, face_mgr, obj_det, bh_analyzer, scheduler=None):
+        self.face_mgr = face_mgr
+        self.obj_det = obj_det
+        self.bh_analyzer = bh_analyzer
+        self.scheduler = scheduler
+        # Optional callable frame -> detections replacing obj_det (e.g. a batched detector)
+        self.detection_hook = None
+
+    def _detect(self, ctx):
+        # Detectors take plain BGR arrays (the batched one ships them across threads)
+        if self.detection_hook is not None:
+            return self.detection_hook(ctx.bgr)
+        return self.obj_det.detect_prohibited_items(ctx.bgr)
+
+    def observe(self, frame, detections=None, session_id=None, camera_id=None, boosted=(), now=None):
+        """Analyze a frame and return per-student observations (no scoring).
+
+        `detections` can be passed in when object detection already ran
+        elsewhere. `session_id` restricts face matching to that exam session's
+        roster; `camera_id` lets the face tracker and the adaptive scheduler
+        reuse state from earlier frames of the same camera. Students in
+        `boosted` (flagged as suspicious) are analyzed at full rate. `now`
+        is the frame time for that state (wall clock by default; video time
+        when analyzing recordings).
+
+        `frame` is a FrameContext (or a raw BGR array, wrapped here) so every
+        stage shares the same RGB conversion and crops. The result carries
+        per-stage wall times in seconds under "timings", the names of
+        stages skipped for this frame under "skipped" and of stages that
+        failed (and were treated as finding nothing) under "errors".
+        """
+        ctx = FrameContext.wrap(frame)
+        timings = {}
+        skipped = []
+        errors = []
+        boosted = set(boosted)
+        schedule = None
+        if self.scheduler is not None and camera_id is not None:
+            started = time.perf_counter()
+            schedule = self.scheduler.begin_frame(camera_id, ctx, now=now)
+            timings["motion"] = time.perf_counter() - started
+
+        def due(stage):
+            if schedule is None or schedule.should_run(stage, boosted=bool(boosted)):
+                return True
+            skipped.append(stage)
+            return False
+
+        if due("face"):
+            started = time.perf_counter()
+            try:
+                face_locs, face_names, track_ids = self.face_mgr.identify_tracked(
+                    ctx, session_id=session_id, camera_id=camera_id, now=now
+                )
+            except Exception:
+                logger.exception("Error in face identification (%s)", camera_id)
+                errors.append("face")
+                face_locs, face_names, track_ids = [], [], []
+            timings["face"] = time.perf_counter() - started
+            if schedule is not None:
+                schedule.mark_run("face")
+                schedule.cache["faces"] = (face_locs, face_names, track_ids)
+        else:
+            face_locs, face_names, track_ids = schedule.cache.get("faces", ([], [], []))
+
+        # Full-frame detection, once per frame regardless of the number of students
+        if detections is None:
+            if due("detection"):
+                started = time.perf_counter()
+                detections = self._detect(ctx)
+                timings["detection"] = time.perf_counter() - started
+                if schedule is not None:
+                    schedule.mark_run("detection")
+                    schedule.cache["detections"] = detections
+            else:
+                detections = schedule.cache.get("detections", [])
+
+        if not face_names:
+            # No students to crop around: fall back to a single full-frame pose
+            if due("pose"):
+                started = time.perf_counter()
+                pose_data = self.bh_analyzer.analyze_pose(ctx)
+                timings["pose"] = time.perf_counter() - started
+                if schedule is not None:
+                    schedule.mark_run("pose")
+                    schedule.cache["frame_pose"] = pose_data
+            else:
+                pose_data = schedule.cache.get("frame_pose", {})
+            return {
+                "faces": [],
+                "unassigned_detections": detections,
+                "frame_gaze": self.bh_analyzer.estimate_gaze(ctx, pose_data),
+                "timings": timings,
+                "skipped": skipped,
+                "errors": errors,
+            }
+
+        started = time.perf_counter()
+        if POSE_MODE == "roi":
+            poses_per_face = self._roi_poses(ctx, face_locs, face_names, track_ids, camera_id, schedule, boosted, skipped)
+            timings["pose"] = time.perf_counter() - started
+        else:
+            if due("pose"):
+                pose_data = self.bh_analyzer.analyze_pose(ctx)
+                if schedule is not None:
+                    schedule.mark_run("pose")
+                    schedule.cache["frame_pose"] = pose_data
+            else:
+                pose_data = schedule.cache.get("frame_pose", {})
+            timings["pose"] = time.perf_counter() - started
+            poses = [pose_data] if pose_data else []
+            anchors = [self.bh_analyzer.pose_anchor(p, ctx.shape) for p in poses]
+            poses_per_face = assign_poses(face_locs, poses, anchors)
+
+        started = time.perf_counter()
+        dets_per_face, unassigned = assign_detections(face_locs, detections, ctx.shape)
+
+        faces = []
+        for loc, name, dets, pose in zip(face_locs, face_names, dets_per_face, poses_per_face):
+            faces.append({
+                "student_id": name,
+                "face_location": loc,
+                "detections": dets,
+                "gaze": self.bh_analyzer.estimate_gaze(ctx, pose),
+                "lean_score": pose.get("lean_score", 0),
+            })
+        timings["association"] = time.perf_counter() - started
+        return {
+            "faces": faces, "unassigned_detections": unassigned, "timings": timings, "skipped": skipped,
+            "errors": errors,
+        }
+
+    def _roi_poses(self, ctx, face_locs, face_names, track_ids, camera_id, schedule, boosted, skipped):
+        """One pose per student, each on its own face/torso region; unchanged regions reuse the last pose."""
+        rois = [torso_region(loc, ctx.shape) for loc in face_locs]
+        # Unidentified faces keep their pose state through their face track;
+        # the list position is only a fallback when no tracker is attached
+        keys = [
+            f"{camera_id}:{name}" if name != "Unknown"
+            else f"{camera_id}:track{track_id}" if track_id is not None else f"{camera_id}:roi{i}"
+            for i, (name, track_id) in enumerate(zip(face_names, track_ids))
+        ]
+        if schedule is None:
+            return self.bh_analyzer.analyze_pose_rois(ctx, rois, keys)
+
+        cached = schedule.cache.setdefault("regions", {})
+        run = [
+            i for i, (key, roi, name) in enumerate(zip(keys, rois, face_names))
+            if schedule.region_should_run(key, roi, boosted=name in boosted)
+        ]
+        if len(run) < len(keys):
+            skipped.append("pose_regions")
+        fresh = self.bh_analyzer.analyze_pose_rois(ctx, [rois[i] for i in run], [keys[i] for i in run])
+        for i, pose in zip(run, fresh):
+            cached[keys[i]] = pose
+            schedule.mark_region_run(keys[i])
+        return [cached.get(key, {}) for key in keys]
+
+
+def score_observations(engine, observations, now=None, errors=None):
+    """Run temporal scoring for each observed student and build the API result list.
+
+    A scoring failure is logged, leaves the students out of the result and
+    appends "scoring" to `errors` when a list is given.
+    """
+    results = []
+    if not observations["faces"]:
+        results.append({
+            "student_id": "Unknown",
+            "detections": [d["label"] for d in observations["unassigned_detections"]],
+            "gaze": observations.get("frame_gaze", "Unknown"),
+            "risk_level": "N/A"
+        })
+        return results
+
+    faces = observations["faces"]
+    try:
+        scored = engine.score_batch(
+            [face["student_id"] for face in faces],
+            [face["detections"] for face in faces],
+            [face["gaze"] for face in faces],
+            [face["lean_score"] for face in faces],
+            now=now,
+        )
+    except Exception:
+        logger.exception("Error in student scoring")
+        if errors is not None:
+            errors.append("scoring")
+        return results
+
+    for face, (risk_level, score) in zip(faces, scored):
+        results.append({
+            "student_id": face["student_id"],
+            "risk_level": risk_level,
+            "score": f"{score:.2f}",
+            "gaze": face["gaze"],
+            "detections": [d["label"] for d in face["detections"]]
+        })
+    return results
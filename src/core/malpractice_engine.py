@@ -1,47 +1,236 @@
+import math
 import time
-from src.config import WEIGHTS, TEMPORAL_WINDOW_SIZE
+
+import numpy as np
+
+from src.config import (
+    WEIGHTS, TEMPORAL_WINDOW_SIZE, TEMPORAL_MODE, TEMPORAL_WINDOW_SECONDS,
+    TEMPORAL_DECAY_HALF_LIFE_S, STUDENT_TTL_SECONDS, FPS_TARGET,
+)
+
+EVICTION_INTERVAL_SECONDS = 30.0
+INITIAL_SLOTS = 64
+# Scores are rounded before classification so float noise can't flip a score sitting on a threshold
+SCORE_DECIMALS = 6
+
 
 class MalpracticeEngine:
-    def __init__(self):
-        # student_id -> list of (timestamp, score_event)
-        self.event_buffers = {}
-        
-    def calculate_malpractice_score(self, student_id, detections, gaze_status, lean_score):
+    """Temporal malpractice scoring with bounded per-student state.
+
+    Each student owns one row ("slot") of fixed-size ring buffers with a
+    running sum, so a frame is scored in O(1) per student and the scores of
+    all students in a frame are updated in one vectorized call. Window modes:
+
+    - "frames":  average of the last TEMPORAL_WINDOW_SIZE events
+    - "seconds": average of the events from the last TEMPORAL_WINDOW_SECONDS
+    - "decay":   exponentially decayed average (TEMPORAL_DECAY_HALF_LIFE_S)
+
+    Students not seen for STUDENT_TTL_SECONDS are evicted and their slot reused.
+    """
+
+    def __init__(self, mode=TEMPORAL_MODE, window_size=TEMPORAL_WINDOW_SIZE,
+                 window_seconds=TEMPORAL_WINDOW_SECONDS, half_life=TEMPORAL_DECAY_HALF_LIFE_S,
+                 ttl=STUDENT_TTL_SECONDS):
+        if mode not in ("frames", "seconds", "decay"):
+            raise ValueError(f"Unknown temporal mode: {mode}")
+        self.mode = mode
+        self.window_seconds = window_seconds
+        self.half_life = half_life
+        self.ttl = ttl
+        if mode == "frames":
+            self.capacity = max(1, int(window_size))
+        elif mode == "seconds":
+            # Room for bursts above FPS_TARGET; beyond that the oldest events are overwritten
+            self.capacity = max(1, int(math.ceil(window_seconds * FPS_TARGET * 2)))
+        else:
+            self.capacity = 1
+
+        self.slots = {}  # student_id -> row
+        self._free = []
+        self._alloc(INITIAL_SLOTS)
+        # Set from the first frame time, which may be video time rather than the wall clock
+        self._last_eviction = None
+
+    def _alloc(self, rows):
+        self._scores = np.zeros((rows, self.capacity), dtype=np.float64)
+        self._times = np.zeros((rows, self.capacity), dtype=np.float64)
+        self._head = np.zeros(rows, dtype=np.int64)
+        self._count = np.zeros(rows, dtype=np.int64)
+        self._total = np.zeros(rows, dtype=np.float64)
+        self._last_seen = np.zeros(rows, dtype=np.float64)
+        self._weight = np.zeros(rows, dtype=np.float64)  # decayed event count ("decay" mode)
+        self._free = list(range(rows - 1, -1, -1))
+
+    def _grow(self):
+        old_rows = len(self._head)
+        arrays = {name: getattr(self, name) for name in
+                  ("_scores", "_times", "_head", "_count", "_total", "_last_seen", "_weight")}
+        self._alloc(old_rows * 2)
+        for name, old in arrays.items():
+            getattr(self, name)[:old_rows] = old
+        self._free = list(range(old_rows * 2 - 1, old_rows - 1, -1))
+
+    def _slot(self, student_id):
+        slot = self.slots.get(student_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self.slots[student_id] = slot
+        return slot
+
+    def _reset_rows(self, rows):
+        self._scores[rows] = 0
+        self._times[rows] = 0
+        self._head[rows] = 0
+        self._count[rows] = 0
+        self._total[rows] = 0
+        self._last_seen[rows] = 0
+        self._weight[rows] = 0
+
+    @staticmethod
+    def event_scores(detections_list, gaze_list, lean_list):
+        """Instantaneous weighted scores for a batch of observations."""
+        phones = np.array([sum(1 for d in dets if "phone" in d["label"]) for dets in detections_list])
+        chits = np.array([
+            sum(1 for d in dets if "phone" not in d["label"] and ("chit" in d["label"] or "paper" in d["label"]))
+            for dets in detections_list
+        ])
+        sideways = np.array([g == "Sideways" for g in gaze_list])
+        # Threshold for unnatural leaning
+        leaning = np.asarray(lean_list, dtype=np.float64) > 0.2
+        return (
+            phones * WEIGHTS["phone"] + chits * WEIGHTS["chit"]
+            + sideways * WEIGHTS["gaze_deviation"] + leaning * WEIGHTS["pose_anomaly"]
+        ).astype(np.float64)
+
+    def calculate_malpractice_score(self, student_id, detections, gaze_status, lean_score, now=None):
         """Calculate a weighted malpractice score based on current detections."""
-        if student_id not in self.event_buffers:
-            self.event_buffers[student_id] = []
-            
-        current_score = 0
-        
-        # 1. Object Detections
-        for det in detections:
-            if "phone" in det["label"]:
-                current_score += WEIGHTS["phone"]
-            elif "chit" in det["label"] or "paper" in det["label"]:
-                current_score += WEIGHTS["chit"]
-                
-        # 2. Behavioral Detections
-        if gaze_status == "Sideways":
-            current_score += WEIGHTS["gaze_deviation"]
-            
-        if lean_score > 0.2: # Threshold for unnatural leaning
-            current_score += WEIGHTS["pose_anomaly"]
-            
-        # Add to temporal buffer
-        self.event_buffers[student_id].append({
-            "timestamp": time.time(),
-            "score": current_score
-        })
-        
-        # Maintain window size
-        if len(self.event_buffers[student_id]) > TEMPORAL_WINDOW_SIZE:
-            self.event_buffers[student_id].pop(0)
-            
-        # Aggregate score (temporal weighted smoothing)
-        total_score = sum(e["score"] for e in self.event_buffers[student_id])
-        avg_score = total_score / len(self.event_buffers[student_id])
-        
-        return self._classify_risk(avg_score)
+        return self.score_batch([student_id], [detections], [gaze_status], [lean_score], now=now)[0]
+
+    def score_batch(self, student_ids, detections_list, gaze_list, lean_list, now=None):
+        """Score every student of a frame at once; returns [(risk_level, score), ...]."""
+        if not student_ids:
+            return []
+        now = time.time() if now is None else now
+        if self._last_eviction is None:
+            self._last_eviction = now
+        elif now - self._last_eviction > EVICTION_INTERVAL_SECONDS:
+            self.evict_idle(now)
+
+        current = self.event_scores(detections_list, gaze_list, lean_list)
+        rows = np.array([self._slot(sid) for sid in student_ids], dtype=np.int64)
+        averages = np.empty(len(rows), dtype=np.float64)
+
+        # The same id may appear twice in a frame (e.g. "Unknown"); apply repeats in rounds
+        remaining = np.arange(len(rows))
+        while len(remaining):
+            _, first = np.unique(rows[remaining], return_index=True)
+            batch = remaining[first]
+            averages[batch] = self._push(rows[batch], current[batch], now)
+            remaining = np.delete(remaining, first)
+
+        return [self._classify_risk(round(float(score), SCORE_DECIMALS)) for score in averages]
+
+    def _push(self, rows, scores, now):
+        """Push one event per (unique) row and return the windowed averages."""
+        if self.mode == "decay":
+            last = self._last_seen[rows]
+            fresh = self._count[rows] == 0
+            alpha = np.where(fresh, 0.0, np.exp(-(now - last) * math.log(2) / self.half_life))
+            self._total[rows] = self._total[rows] * alpha + scores
+            self._weight[rows] = self._weight[rows] * alpha + 1.0
+            self._count[rows] = 1
+            self._last_seen[rows] = now
+            return self._total[rows] / self._weight[rows]
+
+        head = self._head[rows]
+        full = self._count[rows] == self.capacity
+        # Overwriting the oldest entry when the ring is full
+        self._total[rows] -= np.where(full, self._scores[rows, head], 0.0)
+        self._scores[rows, head] = scores
+        self._times[rows, head] = now
+        self._total[rows] += scores
+        self._count[rows] = np.where(full, self.capacity, self._count[rows] + 1)
+        self._head[rows] = (head + 1) % self.capacity
+        self._last_seen[rows] = now
+
+        if self.mode == "seconds":
+            cutoff = now - self.window_seconds
+            active = rows
+            while len(active):
+                tail = (self._head[active] - self._count[active]) % self.capacity
+                expired = (self._count[active] > 1) & (self._times[active, tail] < cutoff)
+                active, tail = active[expired], tail[expired]
+                self._total[active] -= self._scores[active, tail]
+                self._count[active] -= 1
+
+        # The running sum only adds and subtracts; re-sum a row each time its ring wraps
+        # so rounding error stays bounded on long sessions
+        wrapped = rows[self._head[rows] == 0]
+        if len(wrapped):
+            self._recompute_totals(wrapped)
+        return np.maximum(self._total[rows], 0.0) / self._count[rows]
+
+    def _recompute_totals(self, rows):
+        tail = (self._head[rows] - self._count[rows]) % self.capacity
+        age = (np.arange(self.capacity)[None, :] - tail[:, None]) % self.capacity
+        in_window = age < self._count[rows][:, None]
+        self._total[rows] = np.where(in_window, self._scores[rows], 0.0).sum(axis=1)
+
+    def evict_idle(self, now=None):
+        """Free the slots of students not seen for `ttl` seconds."""
+        now = time.time() if now is None else now
+        self._last_eviction = now
+        stale = [sid for sid, slot in self.slots.items() if now - self._last_seen[slot] > self.ttl]
+        if not stale:
+            return 0
+        rows = [self.slots.pop(sid) for sid in stale]
+        self._reset_rows(rows)
+        self._free.extend(rows)
+        return len(stale)
+
+    def export_state(self, student_ids):
+        """JSON-serializable window state of the given students (for handing a camera to another node)."""
+        students = {}
+        for student_id in student_ids:
+            slot = self.slots.get(student_id)
+            if slot is None:
+                continue
+            students[student_id] = {
+                "scores": self._scores[slot].tolist(),
+                "times": self._times[slot].tolist(),
+                "head": int(self._head[slot]),
+                "count": int(self._count[slot]),
+                "total": float(self._total[slot]),
+                "last_seen": float(self._last_seen[slot]),
+                "weight": float(self._weight[slot]),
+            }
+        return {"mode": self.mode, "capacity": self.capacity, "students": students}
+
+    def import_state(self, state):
+        """Restore students exported by export_state(); returns how many were loaded."""
+        if state.get("mode") != self.mode or state.get("capacity") != self.capacity:
+            print(f"Ignoring scoring state from a {state.get('mode')}/{state.get('capacity')} engine")
+            return 0
+        for student_id, student in state.get("students", {}).items():
+            slot = self._slot(student_id)
+            self._scores[slot] = student["scores"]
+            self._times[slot] = student["times"]
+            self._head[slot] = student["head"]
+            self._count[slot] = student["count"]
+            self._total[slot] = student["total"]
+            self._last_seen[slot] = student["last_seen"]
+            self._weight[slot] = student["weight"]
+        return len(state.get("students", {}))
+
+    def drop(self, student_ids):
+        """Forget the given students and free their slots."""
+        rows = [self.slots.pop(sid) for sid in student_ids if sid in self.slots]
+        if rows:
+            self._reset_rows(rows)
+            self._free.extend(rows)
+        return len(rows)
 
     def _classify_risk(self, score):
         """Classify student risk level."""
@@ -0,0 +1,291 @@
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from src.config import (
+    FPS_TARGET, OFFLINE_WORK_DIR, OFFLINE_CHUNK_SECONDS, OFFLINE_FRAME_STRIDE, OFFLINE_WORKERS,
+)
+
+# Libraries that size their own thread pools; one thread each since every core runs a worker
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def probe_video(path):
+    """Frame rate and frame count of a video file."""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    finally:
+        cap.release()
+    if fps <= 0 or frame_count <= 0:
+        raise ValueError(f"{path} has no usable frame rate / frame count")
+    return fps, frame_count
+
+
+def plan_chunks(frame_count, fps, stride, chunk_seconds=OFFLINE_CHUNK_SECONDS):
+    """Split [0, frame_count) into (index, start, end) chunks that start on a sampled frame."""
+    per_chunk = max(1, int(round(chunk_seconds * fps / stride))) * stride
+    return [
+        (index, start, min(start + per_chunk, frame_count))
+        for index, start in enumerate(range(0, frame_count, per_chunk))
+    ]
+
+
+class Recording:
+    """One video to analyze: its chunk plan and the directory of finished chunks.
+
+    The directory name hashes the file identity and the sampling parameters,
+    so re-running the same command resumes from the chunks already written
+    while a changed video or stride starts over.
+    """
+
+    def __init__(self, path, camera_id=None, session_id=None, stride=OFFLINE_FRAME_STRIDE,
+                 chunk_seconds=OFFLINE_CHUNK_SECONDS, start_time=0.0, work_dir=OFFLINE_WORK_DIR):
+        self.path = os.path.abspath(path)
+        self.camera_id = camera_id or os.path.splitext(os.path.basename(path))[0]
+        self.session_id = session_id
+        self.start_time = start_time
+        self.fps, self.frame_count = probe_video(self.path)
+        self.stride = int(stride) or max(1, int(round(self.fps / FPS_TARGET)))
+        self.chunks = plan_chunks(self.frame_count, self.fps, self.stride, chunk_seconds)
+
+        stat = os.stat(self.path)
+        identity = f"{self.path}|{stat.st_size}|{stat.st_mtime_ns}|{self.stride}|{self.chunks[0][2]}|{session_id}"
+        digest = hashlib.sha1(identity.encode()).hexdigest()[:12]
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", self.camera_id)
+        self.dir = os.path.join(work_dir, f"{name}-{digest}")
+
+    @property
+    def duration(self):
+        return self.frame_count / self.fps
+
+    def chunk_path(self, index):
+        return os.path.join(self.dir, f"chunk_{index:05d}.json.gz")
+
+    def prepare(self, restart=False):
+        if restart and os.path.isdir(self.dir):
+            shutil.rmtree(self.dir)
+        os.makedirs(self.dir, exist_ok=True)
+        with open(os.path.join(self.dir, "manifest.json"), "w") as f:
+            json.dump({
+                "video": self.path, "camera_id": self.camera_id, "session_id": self.session_id,
+                "fps": self.fps, "frame_count": self.frame_count, "stride": self.stride,
+                "chunks": len(self.chunks),
+            }, f, indent=2)
+
+    def pending_chunks(self):
+        return [chunk for chunk in self.chunks if not os.path.exists(self.chunk_path(chunk[0]))]
+
+    def load_chunk(self, index):
+        with gzip.open(self.chunk_path(index), "rt") as f:
+            return json.load(f)
+
+
+def _compact(offset, observations):
+    # [video seconds, [[student_id, [labels], gaze, lean_score], ...], [unassigned labels], frame gaze]
+    return [
+        round(offset, 3),
+        [[face["student_id"], [d["label"] for d in face["detections"]], face["gaze"], float(face["lean_score"])]
+         for face in observations["faces"]],
+        [d["label"] for d in observations["unassigned_detections"]],
+        observations.get("frame_gaze", "Unknown"),
+    ]
+
+
+def _expand(frame):
+    """Back to the observations dict score_observations() takes."""
+    _, faces, unassigned, frame_gaze = frame
+    return {
+        "faces": [
+            {"student_id": sid, "detections": [{"label": label} for label in labels], "gaze": gaze, "lean_score": lean}
+            for sid, labels, gaze, lean in faces
+        ],
+        "unassigned_detections": [{"label": label} for label in unassigned],
+        "frame_gaze": frame_gaze,
+    }
+
+
+def _init_worker(adaptive):
+    from src.core import worker_pool
+    cv2.setNumThreads(1)
+    if not adaptive:
+        # Every sampled frame gets every stage; disputes need the full record
+        worker_pool.set_scheduler(None)
+
+
+def analyze_chunk(path, camera_id, session_id, fps, stride, start, end, start_time, out_path):
+    """Analyze frames [start, end) of a video in this worker; writes the observations to out_path."""
+    from src.core.worker_pool import analyze_frame_array, forget_camera
+
+    started = time.perf_counter()
+    # Face tracks and scheduling state are per chunk; chunks of one video may run concurrently.
+    # Without face embeddings the track-based ids ("Student_<camera>#<start>_<track>") are
+    # therefore only valid within the chunk; the report marks them instead of merging them.
+    chunk_camera = f"{camera_id}#{start}"
+    frames = []
+    cap = cv2.VideoCapture(path)
+    try:
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        for index in range(start, end):
+            # Skipped frames are only grabbed, not converted
+            if not cap.grab():
+                break
+            if (index - start) % stride:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            offset = index / fps
+            observations = analyze_frame_array(frame, session_id, chunk_camera, now=start_time + offset)
+            frames.append(_compact(offset, observations))
+    finally:
+        cap.release()
+        forget_camera(chunk_camera)
+
+    tmp_path = out_path + ".tmp"
+    with gzip.open(tmp_path, "wt") as f:
+        json.dump(frames, f, separators=(",", ":"))
+    # Only complete chunks ever carry the final name, so an interrupted run resumes cleanly
+    os.replace(tmp_path, out_path)
+    return {"frames": len(frames), "seconds": time.perf_counter() - started}
+
+
+def run_chunks(recordings, workers=OFFLINE_WORKERS, adaptive=False, progress=print):
+    """Analyze the missing chunks of every recording in a process pool; returns the failed chunks."""
+    jobs = [(rec, chunk) for rec in recordings for chunk in rec.pending_chunks()]
+    total = sum(len(rec.chunks) for rec in recordings)
+    done = total - len(jobs)
+    if done:
+        progress(f"Resuming: {done}/{total} chunks already analyzed")
+    if not jobs:
+        return []
+
+    workers = int(workers) or os.cpu_count() or 1
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, "1")
+    failed = []
+    started = time.perf_counter()
+    # Spawned workers import the models fresh, with the thread limits above
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=context,
+                             initializer=_init_worker, initargs=(adaptive,)) as pool:
+        futures = {
+            pool.submit(analyze_chunk, rec.path, rec.camera_id, rec.session_id, rec.fps, rec.stride,
+                        start, end, rec.start_time, rec.chunk_path(index)): (rec, index)
+            for rec, (index, start, end) in jobs
+        }
+        try:
+            for finished, future in enumerate(as_completed(futures), 1):
+                rec, index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed.append((rec, index))
+                    progress(f"{rec.camera_id} chunk {index} failed: {e}")
+                    continue
+                elapsed = time.perf_counter() - started
+                eta = elapsed / finished * (len(jobs) - finished)
+                progress(f"[{done + finished}/{total}] {rec.camera_id} chunk {index}: "
+                         f"{result['frames']} frames in {result['seconds']:.1f}s (ETA {eta:.0f}s)")
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+    return failed
+
+
+class TimelineReport:
+    """Per-student timeline of one recording, built from the scored frames in time order.
+
+    Enrolled students are merged across chunks by their student id.
+    Unenrolled faces only get track-based ids, which restart in every chunk,
+    so the same person may appear once per chunk; those entries carry
+    "chunk_local": True.
+    """
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.chunk_local_prefix = f"Student_{recording.camera_id}#"
+        self.sample_interval = recording.stride / recording.fps
+        self.students = {}
+        self.frames = 0
+        self.missing_chunks = []
+
+    def add(self, offset, results):
+        self.frames += 1
+        for result in results:
+            student_id = result["student_id"]
+            if student_id == "Unknown":
+                continue
+            score = float(result["score"])
+            risk = result["risk_level"]
+            student = self.students.get(student_id)
+            if student is None:
+                student = self.students[student_id] = {
+                    "first_seen": offset, "last_seen": offset, "frames": 0, "risk_level": None,
+                    "peak_score": score, "peak_at": offset, "seconds_by_level": Counter(),
+                    "detections": Counter(), "transitions": [],
+                    "chunk_local": student_id.startswith(self.chunk_local_prefix),
+                }
+            if risk != student["risk_level"]:
+                student["transitions"].append({"t": offset, "from": student["risk_level"], "to": risk, "score": score})
+                student["risk_level"] = risk
+            if score > student["peak_score"]:
+                student["peak_score"], student["peak_at"] = score, offset
+            student["last_seen"] = offset
+            student["frames"] += 1
+            student["seconds_by_level"][risk] += self.sample_interval
+            student["detections"].update(result["detections"])
+
+    def to_dict(self):
+        rec = self.recording
+        return {
+            "video": rec.path,
+            "camera_id": rec.camera_id,
+            "session_id": rec.session_id,
+            "start_time": rec.start_time,
+            "fps": rec.fps,
+            "duration_s": rec.duration,
+            "stride": rec.stride,
+            "frames_analyzed": self.frames,
+            "missing_chunks": self.missing_chunks,
+            "students": {
+                sid: dict(s, seconds_by_level={k: round(v, 3) for k, v in s["seconds_by_level"].items()},
+                          detections=dict(s["detections"]))
+                for sid, s in sorted(self.students.items())
+            },
+        }
+
+
+def score_recording(recording, engine=None):
+    """Merge a recording's chunks in time order through the temporal engine.
+
+    The engine is driven with the video time (start_time + offset), so the
+    "seconds"/"decay" windows and idle eviction behave as they did live.
+    """
+    from src.core.malpractice_engine import MalpracticeEngine
+    from src.core.frame_pipeline import score_observations
+
+    engine = engine or MalpracticeEngine()
+    report = TimelineReport(recording)
+    for index, _, _ in recording.chunks:
+        if not os.path.exists(recording.chunk_path(index)):
+            report.missing_chunks.append(index)
+            continue
+        for frame in recording.load_chunk(index):
+            offset = frame[0]
+            results = score_observations(engine, _expand(frame), now=recording.start_time + offset)
+            report.add(offset, results)
+    return report
@@ -1,48 +1,160 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import cv2
 import numpy as np
 
-try:
-    import mediapipe.python.solutions.pose as mp_pose
-    import mediapipe.python.solutions.drawing_utils as mp_drawing
-    MEDIAPIPE_AVAILABLE = True
-except ImportError:
-    MEDIAPIPE_AVAILABLE = False
+from src.config import POSE_ROI_MAX_SIDE, POSE_MAX_TRACKED_ROIS, POSE_ROI_MODEL_COMPLEXITY
+from src.core.frame_context import FrameContext
+
+# MediaPipe takes seconds to import; it is imported when the first analyzer is built
+mp_pose = None
+mp_drawing = None
+MEDIAPIPE_AVAILABLE = None
+
+
+def load_mediapipe():
+    global mp_pose, mp_drawing, MEDIAPIPE_AVAILABLE
+    if MEDIAPIPE_AVAILABLE is None:
+        try:
+            import mediapipe.python.solutions.pose as mp_pose
+            import mediapipe.python.solutions.drawing_utils as mp_drawing
+            MEDIAPIPE_AVAILABLE = True
+        except ImportError:
+            MEDIAPIPE_AVAILABLE = False
+    return MEDIAPIPE_AVAILABLE
+
+class _RoiGraph:
+    def __init__(self, pose):
+        self.pose = pose
+        self.lock = threading.Lock()
+        self.closed = False
+
+
+class RoiPoseStore:
+    """Per-student Pose graphs for ROI mode (LRU), shared by every analyzer of a process.
+
+    Keys carry the camera id, so a student always reaches the same graph (and
+    its tracking state) whichever worker thread runs the camera's frame. A
+    graph is used by one thread at a time and only closed when not in use.
+    """
+
+    def __init__(self, capacity=POSE_MAX_TRACKED_ROIS):
+        self.capacity = max(1, int(capacity))
+        self.graphs = OrderedDict()  # key -> _RoiGraph
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.graphs)
+
+    @contextmanager
+    def use(self, key):
+        while True:
+            evicted = None
+            with self._lock:
+                graph = self.graphs.get(key)
+                if graph is None:
+                    graph = self.graphs[key] = _RoiGraph(mp_pose.Pose(
+                        static_image_mode=False, model_complexity=POSE_ROI_MODEL_COMPLEXITY,
+                        min_detection_confidence=0.5, min_tracking_confidence=0.5
+                    ))
+                    if len(self.graphs) > self.capacity:
+                        _, evicted = self.graphs.popitem(last=False)
+                else:
+                    self.graphs.move_to_end(key)
+            if evicted is not None:
+                with evicted.lock:
+                    evicted.closed = True
+                    evicted.pose.close()
+            with graph.lock:
+                # Evicted between the lookup and here: look it up again
+                if not graph.closed:
+                    yield graph.pose
+                    return
+
 
 class BehaviorAnalyzer:
-    def __init__(self):
-        if MEDIAPIPE_AVAILABLE:
+    def __init__(self, roi_store=None):
+        if load_mediapipe():
             self.mp_pose = mp_pose
             self.pose = self.mp_pose.Pose(static_image_mode=False, min_detection_confidence=0.5, min_tracking_confidence=0.5)
             self.mp_draw = mp_drawing
         else:
             print("MediaPipe Pose not available.")
+        # Per-student Pose graphs for ROI mode; workers of one process pass a shared store
+        self.roi_poses = roi_store if roi_store is not None else RoiPoseStore()
         
     def analyze_pose(self, frame):
         """Extract pose landmarks and detect anomalies."""
         if not hasattr(self, "pose"):
             return {}
             
-        results = self.pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        
+        results = self.pose.process(FrameContext.wrap(frame).rgb)
+        return self._pose_features(results.pose_landmarks)
+
+    def analyze_pose_rois(self, frame, rois, keys):
+        """Run pose on per-student regions of one frame.
+
+        `rois` are (x1, y1, x2, y2) boxes and `keys` stable per-student keys.
+        Each ROI is a view of the frame context's shared RGB image, scaled
+        down to at most POSE_ROI_MAX_SIDE, so the cost follows ROI pixels
+        rather than one full-frame pass per student.
+        """
+        if not hasattr(self, "pose"):
+            return [{} for _ in rois]
+
+        ctx = FrameContext.wrap(frame)
+        results = []
+        for roi, key in zip(rois, keys):
+            crop, (x1, y1, x2, y2) = ctx.crop(roi, rgb=True)
+            if crop.size == 0:
+                results.append({})
+                continue
+            scale = POSE_ROI_MAX_SIDE / max(crop.shape[:2])
+            if scale < 1:
+                crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            else:
+                crop = np.ascontiguousarray(crop)
+            with self.roi_poses.use(key) as pose:
+                output = pose.process(crop)
+            pose_data = self._pose_features(output.pose_landmarks)
+            if pose_data:
+                pose_data["roi"] = (x1, y1, x2, y2)
+            results.append(pose_data)
+        return results
+
+    def _pose_features(self, landmarks):
         pose_data = {}
-        if results.pose_landmarks:
-            pose_data["landmarks"] = results.pose_landmarks
+        if landmarks:
+            pose_data["landmarks"] = landmarks
             # Logic for head turning (using nose and ears)
-            nose = results.pose_landmarks.landmark[self.mp_pose.PoseLandmark.NOSE]
-            left_ear = results.pose_landmarks.landmark[self.mp_pose.PoseLandmark.LEFT_EAR]
-            right_ear = results.pose_landmarks.landmark[self.mp_pose.PoseLandmark.RIGHT_EAR]
+            nose = landmarks.landmark[self.mp_pose.PoseLandmark.NOSE]
+            left_ear = landmarks.landmark[self.mp_pose.PoseLandmark.LEFT_EAR]
+            right_ear = landmarks.landmark[self.mp_pose.PoseLandmark.RIGHT_EAR]
             
             # Simple heuristic for head rotation
             head_yaw = (left_ear.x + right_ear.x) / 2 - nose.x
             pose_data["head_yaw"] = head_yaw
             
             # Logic for leaning behavior
-            left_shoulder = results.pose_landmarks.landmark[self.mp_pose.PoseLandmark.LEFT_SHOULDER]
-            right_shoulder = results.pose_landmarks.landmark[self.mp_pose.PoseLandmark.RIGHT_SHOULDER]
+            left_shoulder = landmarks.landmark[self.mp_pose.PoseLandmark.LEFT_SHOULDER]
+            right_shoulder = landmarks.landmark[self.mp_pose.PoseLandmark.RIGHT_SHOULDER]
             pose_data["lean_score"] = abs(left_shoulder.y - right_shoulder.y)
             
         return pose_data
 
+    def pose_anchor(self, pose_data, frame_shape):
+        """Return the nose position of a skeleton in pixel coordinates, if any."""
+        if "landmarks" not in pose_data:
+            return None
+        nose = pose_data["landmarks"].landmark[self.mp_pose.PoseLandmark.NOSE]
+        if "roi" in pose_data:
+            x1, y1, x2, y2 = pose_data["roi"]
+            return x1 + nose.x * (x2 - x1), y1 + nose.y * (y2 - y1)
+        h, w = frame_shape[:2]
+        return nose.x * w, nose.y * h
+
     def estimate_gaze(self, frame, pose_data):
         """Estimate gaze direction based on eye landmarks (simplified)."""
         # In a full implementation, we would extract the eye region and use a pre-trained model
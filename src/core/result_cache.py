@@ -0,0 +1,107 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from src.config import (
+    RESULT_CACHE_TTL_S, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_PHASH_SIZE, MOTION_DOWNSCALE_WIDTH,
+)
+
+
+def content_key(contents):
+    """Hash of the uploaded bytes; identical uploads share it."""
+    return hashlib.blake2b(contents, digest_size=16).digest()
+
+
+def perceptual_hash(ctx, size=RESULT_CACHE_PHASH_SIZE):
+    """Difference hash (size*size bits) of a FrameContext, from the motion gate's downscaled copy."""
+    small = cv2.cvtColor(ctx.downscaled(MOTION_DOWNSCALE_WIDTH), cv2.COLOR_BGR2GRAY)
+    cells = cv2.resize(small, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (cells[:, 1:] > cells[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class ResultCache:
+    """Per-camera LRU of recent analysis results.
+
+    Entries expire `ttl` seconds after they were computed (hits don't extend
+    them), so a static camera is still fully re-analyzed at least once per
+    TTL. With `max_distance` set, keys are perceptual hashes and a lookup
+    returns the newest entry within that many differing bits; otherwise keys
+    must match exactly. Observations depend on the session's roster, so a
+    camera's entries are dropped when it starts sending another session.
+    """
+
+    def __init__(self, ttl=RESULT_CACHE_TTL_S, max_entries=RESULT_CACHE_MAX_ENTRIES, max_distance=None):
+        self.ttl = ttl
+        self.max_entries = max(1, int(max_entries))
+        self.max_distance = max_distance
+        self.cameras = {}  # camera_id -> OrderedDict[key, (stored_at, value)]
+        self.sessions = {}  # camera_id -> session_id its entries were computed for
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+
+    def _find(self, entries, key):
+        if self.max_distance is None:
+            return key if key in entries else None
+        for candidate in reversed(entries):
+            if (candidate ^ key).bit_count() <= self.max_distance:
+                return candidate
+        return None
+
+    def _switch_session(self, camera_id, session_id):
+        if self.sessions.get(camera_id, session_id) != session_id:
+            self.cameras.pop(camera_id, None)
+        self.sessions[camera_id] = session_id
+
+    def get(self, camera_id, key, now=None, session_id=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._switch_session(camera_id, session_id)
+            entries = self.cameras.get(camera_id)
+            found = self._find(entries, key) if entries else None
+            if found is not None and now - entries[found][0] > self.ttl:
+                del entries[found]
+                self.expired += 1
+                found = None
+            if found is None:
+                self.misses += 1
+                return None
+            entries.move_to_end(found)
+            self.hits += 1
+            return entries[found][1]
+
+    def put(self, camera_id, key, value, now=None, session_id=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._switch_session(camera_id, session_id)
+            entries = self.cameras.setdefault(camera_id, OrderedDict())
+            entries[key] = (now, value)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            # Frames that stopped repeating leave only expired entries behind
+            while entries and now - next(iter(entries.values()))[0] > self.ttl:
+                entries.popitem(last=False)
+
+    def drop_camera(self, camera_id):
+        with self._lock:
+            self.cameras.pop(camera_id, None)
+            self.sessions.pop(camera_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "entries": sum(len(e) for e in self.cameras.values()),
+                "cameras": len(self.cameras),
+            }
@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from src.config import (
+    WORKER_POOL_MODE, WORKER_POOL_SIZE, MAX_PENDING_FRAMES_PER_CAMERA, TRACKING_ENABLED,
+    ADAPTIVE_SCHEDULING_ENABLED, RESULT_CACHE_ENABLED, RESULT_CACHE_PERCEPTUAL, RESULT_CACHE_PHASH_MAX_DISTANCE,
+    WARMUP_BARRIER_TIMEOUT_S,
+)
+from src.core.adaptive_scheduler import AdaptiveScheduler
+from src.core.face.face_manager import FaceManager
+from src.core.face.identity_tracker import IdentityTracker
+from src.core.detection.object_detector import ObjectDetector
+from src.core.pose.behavior_analyzer import BehaviorAnalyzer, RoiPoseStore
+from src.core.frame_pipeline import FramePipeline
+from src.core.frame_context import FrameContext
+from src.core.result_cache import ResultCache, perceptual_hash
+
+FACE_DB_REFRESH_INTERVAL = 1.0  # seconds between checks for new enrollments
+WARMUP_FRAME_WIDTH = 640
+WARMUP_FRAME_HEIGHT = 480
+
+logger = logging.getLogger("exam_monitor.workers")
+
+# Worker-local state: one pipeline per worker thread (thread mode) or per process
+_local = threading.local()
+# Optional callable frame -> detections used instead of a worker-local detector
+# (thread mode only; lets workers share the batched detector in the main process)
+_detection_hook = None
+# Face tracks are shared by all workers of a process; a camera only ever has
+# one frame in flight, so its tracks are never updated concurrently
+_tracker = IdentityTracker() if TRACKING_ENABLED else None
+# Per-student pose graphs, shared so a student keeps one graph whichever thread runs the frame
+_roi_poses = RoiPoseStore()
+# Motion gating / stage rates, shared the same way as the tracks
+_scheduler = AdaptiveScheduler() if ADAPTIVE_SCHEDULING_ENABLED else None
+# Observations of recent frames by perceptual hash (exact duplicates are caught before the pool)
+_phash_cache = (
+    ResultCache(max_distance=RESULT_CACHE_PHASH_MAX_DISTANCE)
+    if RESULT_CACHE_ENABLED and RESULT_CACHE_PERCEPTUAL else None
+)
+
+
+class FrameDropped(Exception):
+    """Raised for a pending frame that was replaced by a newer one from the same camera."""
+
+
+def set_detection_hook(hook):
+    global _detection_hook
+    _detection_hook = hook
+
+
+def set_scheduler(scheduler):
+    """Replace this process's adaptive scheduler (None analyzes every stage on every frame)."""
+    global _scheduler
+    _scheduler = scheduler
+
+
+def _worker_pipeline():
+    pipeline = getattr(_local, "pipeline", None)
+    if pipeline is None:
+        # Each worker owns its models; per-student pose graphs come from the
+        # process-wide store, which lends each graph to one thread at a time
+        pipeline = FramePipeline(
+            FaceManager(tracker=_tracker, read_only=True), None, BehaviorAnalyzer(roi_store=_roi_poses),
+            scheduler=_scheduler,
+        )
+        _local.pipeline = pipeline
+        _local.last_refresh = time.monotonic()
+    # Detection goes through the pipeline so the scheduler can skip it too;
+    # a worker-local detector is only loaded when there is no shared one
+    pipeline.scheduler = _scheduler
+    pipeline.detection_hook = _detection_hook
+    if _detection_hook is None and pipeline.obj_det is None:
+        pipeline.obj_det = ObjectDetector()
+    return pipeline
+
+
+def warm_up_worker(run_inference=True, barrier=None):
+    """Load this worker's models and optionally push a blank frame through them.
+
+    With a barrier, the thread is held until every warm-up job is running,
+    so a thread pool can't hand two of them to the same thread.
+    Returns where it ran and how long it took, for the readiness report.
+    """
+    started = time.perf_counter()
+    try:
+        pipeline = _worker_pipeline()
+        pipeline.face_mgr.load_models()
+        if run_inference:
+            # No camera id, so no tracker or scheduler state is created
+            pipeline.observe(np.zeros((WARMUP_FRAME_HEIGHT, WARMUP_FRAME_WIDTH, 3), dtype=np.uint8))
+    except Exception:
+        if barrier is not None:
+            # Don't keep the other threads waiting for this one
+            barrier.abort()
+        raise
+    if barrier is not None:
+        try:
+            barrier.wait(WARMUP_BARRIER_TIMEOUT_S)
+        except threading.BrokenBarrierError:
+            logger.warning("Warm-up of %s stopped waiting for the other threads", threading.current_thread().name)
+    return {
+        "pid": os.getpid(),
+        "thread": threading.current_thread().name,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def analyze_jpeg(contents, session_id=None, camera_id=None, boosted=()):
+    """Decode an uploaded frame and run the per-frame analysis in a worker.
+
+    Returns the observations dict, or None when the image can't be decoded.
+    """
+    started = time.perf_counter()
+    # Decoded straight at reduced scale when the camera exceeds ANALYSIS_MAX_SIDE
+    ctx = FrameContext.from_jpeg(contents)
+    decode_time = time.perf_counter() - started
+    if ctx is None:
+        return None
+    observations = analyze_frame_array(ctx, session_id, camera_id, boosted)
+    observations["timings"]["decode"] = decode_time
+    return observations
+
+
+def analyze_frame_array(frame, session_id=None, camera_id=None, boosted=(), now=None):
+    """Run the per-frame analysis on an already decoded BGR frame (or FrameContext).
+
+    `boosted` lists students currently flagged as suspicious; the scheduler
+    analyzes them on every frame. Locations in the result are in analysis
+    coordinates; "scale" maps camera pixels to them. `now` overrides the
+    frame time used for tracking, scheduling and the perceptual cache (e.g.
+    video time); by default each of them uses the wall clock.
+
+    A frame matching a recent one of the camera by perceptual hash returns
+    that frame's observations, marked with "cached".
+    """
+    pipeline = _worker_pipeline()
+    # Enrollment refresh runs on the worker's own clock, not on the frame time
+    clock = time.monotonic()
+    if clock - _local.last_refresh > FACE_DB_REFRESH_INTERVAL:
+        _local.last_refresh = clock
+        pipeline.face_mgr.refresh_if_changed()
+    ctx = frame if isinstance(frame, FrameContext) else FrameContext.from_array(frame)
+    key = None
+    if _phash_cache is not None and camera_id is not None:
+        started = time.perf_counter()
+        key = perceptual_hash(ctx)
+        cached = _phash_cache.get(camera_id, key, now, session_id)
+        if cached is not None:
+            return dict(cached, timings={"cache": time.perf_counter() - started}, skipped=[], errors=[],
+                        cached="perceptual")
+    observations = pipeline.observe(ctx, session_id=session_id, camera_id=camera_id, boosted=boosted, now=now)
+    observations["scale"] = ctx.scale
+    # A frame whose face stage failed isn't reused for the frames that follow
+    if key is not None and not observations["errors"]:
+        _phash_cache.put(camera_id, key, observations, now, session_id)
+    return observations
+
+
+def forget_camera(camera_id):
+    """Drop this process's face tracks, scheduling state and cached results of a camera."""
+    if _phash_cache is not None:
+        _phash_cache.drop_camera(camera_id)
+    if _tracker is not None:
+        _tracker.drop_camera(camera_id)
+    if _scheduler is not None:
+        _scheduler.drop_camera(camera_id)
+
+
+class _CameraLane:
+    def __init__(self):
+        self.pending = deque()
+        self.busy = False
+
+
+class InferencePool:
+    """Runs blocking CV work off the event loop with per-camera backpressure.
+
+    Each camera has at most one frame in flight; newer frames wait in a short
+    per-camera queue and, once it is full, the oldest pending frame is dropped.
+    In process mode a camera always runs on the same worker process so its
+    face tracks and pose tracking state stay in one place.
+    """
+
+    def __init__(self, mode=WORKER_POOL_MODE, workers=WORKER_POOL_SIZE,
+                 max_pending=MAX_PENDING_FRAMES_PER_CAMERA):
+        self.mode = mode
+        self.workers = workers
+        self.max_pending = max(1, int(max_pending))
+        if mode == "process":
+            self.executors = [
+                ProcessPoolExecutor(max_workers=1)
+                for _ in range(workers)
+            ]
+        elif mode == "thread":
+            self.executors = [ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")]
+        else:
+            raise ValueError(f"Unknown worker pool mode: {mode}")
+        self.lanes = {}
+        self.frames_dropped = Counter()
+        self.frames_failed = Counter()
+        self.frames_done = Counter()
+
+    async def submit(self, camera_id, fn, *args):
+        """Run fn(*args) in the pool; raises FrameDropped if superseded while queued."""
+        lane = self.lanes.setdefault(camera_id, _CameraLane())
+        future = asyncio.get_running_loop().create_future()
+        lane.pending.append((future, fn, args))
+        # Always keep the newest frame; evict the oldest waiting ones
+        while len(lane.pending) > self.max_pending:
+            old_future, _, _ = lane.pending.popleft()
+            self.frames_dropped[camera_id] += 1
+            old_future.set_exception(FrameDropped(camera_id))
+        if not lane.busy:
+            self._dispatch(camera_id, lane)
+        return await future
+
+    def _dispatch(self, camera_id, lane):
+        if not lane.pending:
+            lane.busy = False
+            return
+        lane.busy = True
+        future, fn, args = lane.pending.popleft()
+        loop = asyncio.get_running_loop()
+        executor = self.executors[zlib.crc32(camera_id.encode()) % len(self.executors)]
+        job = loop.run_in_executor(executor, fn, *args)
+
+        def _done(job):
+            if job.cancelled():
+                future.cancel()
+            elif job.exception() is not None:
+                self.frames_failed[camera_id] += 1
+                if not future.done():
+                    future.set_exception(job.exception())
+            else:
+                self.frames_done[camera_id] += 1
+                if not future.done():
+                    future.set_result(job.result())
+            self._dispatch(camera_id, lane)
+
+        job.add_done_callback(_done)
+
+    async def warm_up(self, run_inference=True):
+        """Build the models of every worker (one job per worker) before traffic arrives."""
+        loop = asyncio.get_running_loop()
+        if self.mode == "process":
+            jobs = [loop.run_in_executor(executor, warm_up_worker, run_inference) for executor in self.executors]
+        else:
+            # Thread mode has one executor; its threads each get their own pipeline
+            barrier = threading.Barrier(self.workers)
+            jobs = [
+                loop.run_in_executor(self.executors[0], warm_up_worker, run_inference, barrier)
+                for _ in range(self.workers)
+            ]
+        return await asyncio.gather(*jobs)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_pending_per_camera": self.max_pending,
+            "cameras": {
+                camera_id: {
+                    "busy": lane.busy,
+                    "pending": len(lane.pending),
+                    "done": self.frames_done[camera_id],
+                    "dropped": self.frames_dropped[camera_id],
+                    "failed": self.frames_failed[camera_id],
+                }
+                for camera_id, lane in self.lanes.items()
+            },
+        }
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+from src.core.detection.batch_scheduler import BatchScheduler
+
+
+class _Detector:
+    def detect_prohibited_items_batch(self, frames):
+        return [[] for _ in frames]
+
+
+def test_stop_fails_frames_collected_while_waiting_for_stragglers():
+    async def run():
+        # A long wait keeps the frames in the batch being collected when stop() runs
+        scheduler = BatchScheduler(_Detector(), max_batch_size=8, max_wait_ms=5000)
+        scheduler.start()
+        loop = asyncio.get_running_loop()
+        results = []
+
+        def worker(frame):
+            try:
+                results.append(asyncio.run_coroutine_threadsafe(scheduler.submit(frame), loop).result(5))
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        await asyncio.sleep(0.2)
+        await scheduler.stop()
+        await asyncio.to_thread(lambda: [thread.join(5) for thread in threads])
+        return results, threads
+
+    results, threads = asyncio.run(run())
+    assert not any(thread.is_alive() for thread in threads)
+    assert len(results) == 3
+    assert all(isinstance(r, RuntimeError) and "stopped" in str(r) for r in results)
@@ -0,0 +1,47 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.core.face.face_manager import FaceManager
+
+
+def _assert_index_matches_store(manager):
+    names, matrix = manager.store.load()
+    assert sorted(manager.known_face_names) == sorted(names)
+    assert len(manager.index) == len(names) == manager.db_signature
+    # Each index row still holds the encoding stored for its student
+    rows = {name: row for name, row in zip(names, np.asarray(matrix))}
+    for name, row in zip(manager.known_face_names, manager.index.matrix):
+        assert np.allclose(rows[name], row)
+
+
+def test_concurrent_enrollment_keeps_index_and_store_in_step(tmp_path):
+    manager = FaceManager(db_path=str(tmp_path))
+    add = manager.index.add
+
+    def slow_add(name, encoding):
+        # Widen the window in which another enrollment could interleave
+        time.sleep(0.005)
+        add(name, encoding)
+
+    manager.index.add = slow_add
+    rng = np.random.default_rng(0)
+    workers = 8
+    start = threading.Barrier(workers)
+
+    def enroll(batch):
+        start.wait()
+        manager._append(*batch)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for round_ in range(5):
+            batches = [
+                ([f"S{round_}_{i}_{j}" for j in range(1 + i % 3)],
+                 list(rng.random((1 + i % 3, manager.index.dim), dtype=np.float32)))
+                for i in range(workers)
+            ]
+            list(executor.map(enroll, batches))
+            _assert_index_matches_store(manager)
+    assert len(manager.index) == 5 * sum(1 + i % 3 for i in range(workers))